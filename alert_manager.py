@@ -0,0 +1,132 @@
+"""
+Sentinel-T Alert Manager
+Folds per-frame ANOMALY verdicts into incidents: one incident per
+(bus, CAN ID) attack episode, kept open while anomalies keep arriving and
+closed after a quiet period. Each incident emits a bounded number of
+events (open, a few progress updates, close) however long it lasts, so a
+sustained injection no longer turns into thousands of log lines.
+"""
+
+from collections import deque, namedtuple
+
+from config import ALERT_QUIET_PERIOD_S, ALERT_MAX_EVENTS, ALERT_HISTORY
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Snapshot of an incident when it opens, progresses or closes; kind is
+# "open", "update" or "close". Times are the kernel timestamps of the
+# first and latest anomalous frames.
+IncidentEvent = namedtuple("IncidentEvent", [
+    "kind", "incident_id", "bus", "can_id", "opened_ns", "last_ns",
+    "frames", "peak_residual_us", "peak_drift_ppm",
+])
+
+
+class _Incident:
+    __slots__ = ("incident_id", "bus", "can_id", "opened_ns", "last_ns", "frames",
+                 "peak_residual_us", "peak_drift_ppm", "events", "next_update")
+
+    def __init__(self, incident_id, alert):
+        self.incident_id = incident_id
+        self.bus = alert.bus
+        self.can_id = alert.can_id
+        self.opened_ns = self.last_ns = alert.timestamp_ns
+        self.frames = 0
+        self.peak_residual_us = 0.0
+        self.peak_drift_ppm = 0.0
+        self.events = 0
+        self.next_update = 2
+
+    def event(self, kind):
+        self.events += 1
+        return IncidentEvent(kind, self.incident_id, self.bus, self.can_id, self.opened_ns,
+                             self.last_ns, self.frames, self.peak_residual_us, self.peak_drift_ppm)
+
+
+class AlertManager:
+    """
+    Turns a stream of Alerts (one per anomalous frame) into IncidentEvents.
+
+    observe() updates the open incident for the alert's (bus, CAN ID), or
+    opens one. While it is open, updates are emitted when its frame count
+    reaches 2, 4, 8, ... until max_events - 1 events have gone out; the
+    last event is reserved for the close. expire() closes incidents that
+    have had no anomaly for quiet_period_s, measured on the bus's own
+    kernel timestamps, so a bus that goes silent keeps its incidents open
+    until it is heard from again (or close_all() runs at shutdown).
+
+    Every event is logged once; the last `history` closed incidents stay
+    available in `closed`.
+    """
+    def __init__(self, quiet_period_s=ALERT_QUIET_PERIOD_S, max_events=ALERT_MAX_EVENTS,
+                 history=ALERT_HISTORY):
+        self.quiet_period_ns = int(quiet_period_s * 1e9)
+        self.max_events = max(2, max_events)
+        self.active = {}                    # (bus, can_id) -> _Incident
+        self.closed = deque(maxlen=history)
+        self.incidents_opened = 0
+        self.anomalies = 0
+        self.suppressed = 0                 # anomalies folded into an incident without an event
+
+    def observe(self, alerts):
+        """Fold Alerts into incidents; returns the IncidentEvents they produced."""
+        events = []
+        for alert in alerts:
+            self.anomalies += 1
+            key = (alert.bus, alert.can_id)
+            incident = self.active.get(key)
+            if incident is not None and alert.timestamp_ns - incident.last_ns > self.quiet_period_ns:
+                events.append(self._close(key))
+                incident = None
+
+            if incident is None:
+                self.incidents_opened += 1
+                incident = self.active[key] = _Incident(self.incidents_opened, alert)
+                kind = "open"
+            else:
+                kind = None
+
+            incident.frames += 1
+            incident.last_ns = max(incident.last_ns, alert.timestamp_ns)
+            incident.peak_residual_us = max(incident.peak_residual_us, alert.residual_us)
+            if abs(alert.drift_ppm) > abs(incident.peak_drift_ppm):
+                incident.peak_drift_ppm = alert.drift_ppm
+
+            if kind is None and incident.frames == incident.next_update:
+                incident.next_update *= 2
+                if incident.events < self.max_events - 1:
+                    kind = "update"
+            if kind is None:
+                self.suppressed += 1
+                continue
+            events.append(self._emit(incident.event(kind)))
+        return events
+
+    def expire(self, bus, now_ns):
+        """Close the incidents on `bus` that have been quiet for the quiet period."""
+        stale = [key for key, incident in self.active.items()
+                 if key[0] == bus and now_ns - incident.last_ns > self.quiet_period_ns]
+        return [self._close(key) for key in stale]
+
+    def close_all(self):
+        """Close every open incident, e.g. when the monitor stops."""
+        return [self._close(key) for key in list(self.active)]
+
+    def _close(self, key):
+        incident = self.active.pop(key)
+        self.closed.append(incident)
+        return self._emit(incident.event("close"))
+
+    def _emit(self, event):
+        duration_s = (event.last_ns - event.opened_ns) * 1e-9
+        if event.kind == "open":
+            log.warning("INCIDENT #%d opened  BUS=%s  CAN-ID=0x%03x  residual=%.1f µs",
+                        event.incident_id, event.bus, event.can_id, event.peak_residual_us)
+        else:
+            log.warning("INCIDENT #%d %s  BUS=%s  CAN-ID=0x%03x  frames=%d  peak=%.1f µs  "
+                        "drift=%.2f ppm  duration=%.2f s",
+                        event.incident_id, "closed" if event.kind == "close" else "ongoing",
+                        event.bus, event.can_id, event.frames, event.peak_residual_us,
+                        event.peak_drift_ppm, duration_s)
+        return event
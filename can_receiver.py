@@ -2,6 +2,27 @@ import socket
 import struct
 import os
 import time
+import ctypes
+import ctypes.util
+import errno
+import selectors
+import asyncio
+from collections import namedtuple
+
+import numpy as np
+from config import (
+    CAN_INTERFACES,
+    CAN_FD_FRAMES,
+    CAN_TIMESTAMP_NS,
+    CAN_HW_TIMESTAMPS,
+    RECV_RING_FRAMES,
+    RECV_BATCH_SIZE,
+    ASYNC_PENDING_BATCHES,
+    CAN_RXQ_OVFL,
+    CAN_RCVBUF_BYTES,
+    CAN_FILTER_IDS,
+    CAN_CATCH_UNKNOWN_IDS,
+)
 
 # Linux specific constants for SocketCAN and Timestamping
 PF_CAN = 29
@@ -9,65 +30,668 @@ SOCK_RAW = 3
 CAN_RAW = 1
 SOL_CAN_RAW = 101
 SOL_SOCKET = 1
+SO_RCVBUF = socket.SO_RCVBUF
+# SO_RXQ_OVFL attaches the socket's cumulative drop counter (uint32) to each message
+SO_RXQ_OVFL = 40
+CAN_RAW_FILTER = 1
+CAN_RAW_FD_FRAMES = 5
 # SO_TIMESTAMP is 29 on many architectures, including ARM64/x86_64 Linux
 SO_TIMESTAMP = 29 
 SCM_TIMESTAMP = SO_TIMESTAMP
+# SO_TIMESTAMPNS delivers a struct timespec (nanoseconds) instead of a timeval
+SO_TIMESTAMPNS = 35
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+# SO_TIMESTAMPING delivers struct scm_timestamping: ts[0] software, ts[2] raw hardware
+SO_TIMESTAMPING = 37
+SCM_TIMESTAMPING = SO_TIMESTAMPING
+SOF_TIMESTAMPING_RX_HARDWARE = 1 << 2
+SOF_TIMESTAMPING_RX_SOFTWARE = 1 << 3
+SOF_TIMESTAMPING_SOFTWARE = 1 << 4
+SOF_TIMESTAMPING_RAW_HARDWARE = 1 << 6
+SOF_TIMESTAMPING_RX_FLAGS = (SOF_TIMESTAMPING_RX_HARDWARE | SOF_TIMESTAMPING_RAW_HARDWARE
+                             | SOF_TIMESTAMPING_RX_SOFTWARE | SOF_TIMESTAMPING_SOFTWARE)
+
+# Which clock produced a frame's timestamp
+TS_SOURCE_NONE = 0
+TS_SOURCE_SOFTWARE = 1
+TS_SOURCE_HARDWARE = 2
+TS_SOURCE_NAMES = {TS_SOURCE_NONE: "none", TS_SOURCE_SOFTWARE: "software", TS_SOURCE_HARDWARE: "hardware"}
+
+NS_PER_S = 1_000_000_000
+
+# CAN frame: 4 bytes ID, 1 byte DLC, 3 bytes padding, 8 bytes Data = 16 bytes
+CAN_FRAME = struct.Struct("<IB3x8s")
+# CAN FD frame: 4 bytes ID, 1 byte len, 1 byte flags, 2 reserved, 64 bytes Data = 72 bytes
+CANFD_FRAME = struct.Struct("<IBB2x64s")
+# Frame header only (ID, DLC/len), shared by both layouts, for unpack_from
+CAN_HEADER = struct.Struct("<IB3x")
+# struct timeval / struct timespec: two 64-bit fields on 64-bit Linux
+TIME_PAIR = struct.Struct("qq")
+# Ancillary buffer for one timestamp cmsg: CMSG_SPACE(sizeof(struct timespec))
+TIMESTAMP_CMSG_SPACE = socket.CMSG_SPACE(TIME_PAIR.size)
+# struct scm_timestamping: three struct timespec (software, legacy, raw hardware)
+SCM_TIMESTAMPING_STRUCT = struct.Struct("qqqqqq")
+TIMESTAMPING_CMSG_SPACE = socket.CMSG_SPACE(SCM_TIMESTAMPING_STRUCT.size)
+# SO_RXQ_OVFL payload: __u32 drop counter
+DROP_COUNTER = struct.Struct("I")
+RXQ_OVFL_CMSG_SPACE = socket.CMSG_SPACE(DROP_COUNTER.size)
+
+# struct can_filter: canid_t can_id, canid_t can_mask
+CAN_FILTER = struct.Struct("=II")
+
+
+def can_filters(can_ids, catch_unknown=False):
+    """
+    Pack a CAN_RAW_FILTER list that lets the kernel pass only `can_ids`.
+    IDs above 0x7FF are matched as extended (29-bit) IDs. The masks include
+    the EFF and RTR flags, so an 11-bit rule never matches an extended
+    frame and remote frames are dropped. With catch_unknown=True an extra
+    match-all rule is appended, so frames from unlisted IDs still reach
+    user space (the live monitor reports them as UNKNOWN instead of
+    tracking them).
+    """
+    rules = []
+    for can_id in can_ids:
+        if can_id > socket.CAN_SFF_MASK:
+            rules.append(CAN_FILTER.pack(can_id | socket.CAN_EFF_FLAG,
+                                         socket.CAN_EFF_MASK | socket.CAN_EFF_FLAG | socket.CAN_RTR_FLAG))
+        else:
+            rules.append(CAN_FILTER.pack(can_id,
+                                         socket.CAN_SFF_MASK | socket.CAN_EFF_FLAG | socket.CAN_RTR_FLAG))
+    if catch_unknown:
+        rules.append(CAN_FILTER.pack(0, 0))
+    return b"".join(rules)
+
+
+# ── Batched reception (recvmmsg) ─────────────────────────────────────────────
+# recvmmsg flag: block for the first message only, then take what is queued
+MSG_WAITFORONE = 0x10000
+
+# NumPy views over the recvmmsg frame and control buffers
+CAN_FRAME_DTYPE = np.dtype([("can_id", "<u4"), ("dlc", "u1"), ("pad", "u1", 3), ("data", "u1", 8)])
+CANFD_FRAME_DTYPE = np.dtype([("can_id", "<u4"), ("dlc", "u1"), ("flags", "u1"), ("res", "u1", 2),
+                              ("data", "u1", 64)])
+TIMESTAMP_CMSG_DTYPE = np.dtype([("len", "<u8"), ("level", "<i4"), ("type", "<i4"),
+                                 ("sec", "<i8"), ("frac", "<i8")])
+TIMESTAMPING_CMSG_DTYPE = np.dtype([("len", "<u8"), ("level", "<i4"), ("type", "<i4"),
+                                    ("sw_sec", "<i8"), ("sw_nsec", "<i8"),
+                                    ("legacy_sec", "<i8"), ("legacy_nsec", "<i8"),
+                                    ("hw_sec", "<i8"), ("hw_nsec", "<i8")])
+# The kernel appends the SO_RXQ_OVFL cmsg after the timestamp one
+RXQ_OVFL_CMSG_FIELDS = [("ovfl_len", "<u8"), ("ovfl_level", "<i4"), ("ovfl_type", "<i4"),
+                        ("ovfl_count", "<u4"), ("ovfl_pad", "u1", 4)]
+
+
+def _with_rxq_ovfl(cmsg_dtype):
+    """Extend a timestamp cmsg dtype with the trailing SO_RXQ_OVFL cmsg."""
+    return np.dtype(cmsg_dtype.descr + RXQ_OVFL_CMSG_FIELDS)
+
+# A batch of received frames as parallel arrays; data is (n, 8) uint8, or
+# (n, 64) on an FD socket where is_fd marks the frames that arrived as FD,
+# ts_source holds one TS_SOURCE_* code per frame and dropped the number of
+# frames the kernel dropped on this socket just before each one
+FrameBatch = namedtuple("FrameBatch", ["can_id", "dlc", "data", "timestamp_ns", "ts_source", "is_fd",
+                                       "dropped"])
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(_IOVec)), ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+_recvmmsg = None
+
+
+def _libc_recvmmsg():
+    """Resolve libc's recvmmsg once; returns None where it is unavailable."""
+    global _recvmmsg
+    if _recvmmsg is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fn = libc.recvmmsg
+        except (OSError, AttributeError):
+            _recvmmsg = False
+        else:
+            fn.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                           ctypes.c_int, ctypes.c_void_p]
+            fn.restype = ctypes.c_int
+            _recvmmsg = fn
+    return _recvmmsg or None
+
+
+class _MMsgBuffers:
+    """
+    Preallocated recvmmsg vectors for up to `capacity` frames: one frame
+    slot (laid out as frame_dtype, 16 or 72 bytes) and one timestamp cmsg
+    slot (laid out as cmsg_dtype) per message, each exposed to NumPy as a
+    structured view so a whole batch is decoded without a loop.
+    """
+    def __init__(self, capacity, cmsg_dtype=TIMESTAMP_CMSG_DTYPE, frame_dtype=CAN_FRAME_DTYPE):
+        self.capacity = capacity
+        self.cmsg_space = cmsg_dtype.itemsize
+        frame_size = frame_dtype.itemsize
+        self.frames = (ctypes.c_char * (capacity * frame_size))()
+        self.control = (ctypes.c_char * (capacity * self.cmsg_space))()
+        self.iov = (_IOVec * capacity)()
+        self.msgs = (_MMsgHdr * capacity)()
+
+        frames_addr = ctypes.addressof(self.frames)
+        control_addr = ctypes.addressof(self.control)
+        for i in range(capacity):
+            self.iov[i].iov_base = frames_addr + i * frame_size
+            self.iov[i].iov_len = frame_size
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self.iov[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = control_addr + i * self.cmsg_space
+
+        self.frame_view = np.frombuffer(self.frames, dtype=frame_dtype)
+        self.cmsg_view = np.frombuffer(self.control, dtype=cmsg_dtype)
+        # msg_controllen of every mmsghdr, as a strided uint64 view
+        words = np.frombuffer(self.msgs, dtype=np.uint64).reshape(capacity, -1)
+        self.controllen = words[:, (_MMsgHdr.msg_hdr.offset + _MsgHdr.msg_controllen.offset) // 8]
+        # msg_len (bytes received) of every mmsghdr: CAN_MTU or CANFD_MTU
+        self.msg_len = np.frombuffer(self.msgs, dtype=np.uint32).reshape(capacity, -1)[:, _MMsgHdr.msg_len.offset // 4]
+
+        # Decoded output, reused by every batch
+        self.can_id = np.empty(capacity, dtype=np.uint32)
+        self.timestamp_ns = np.empty(capacity, dtype=np.int64)
+        self.ts_source = np.empty(capacity, dtype=np.uint8)
+        self.is_fd = np.zeros(capacity, dtype=bool)
+        self.dropped = np.zeros(capacity, dtype=np.uint32)
+
+
+class _FrameRing:
+    """
+    Preallocated bytearray ring for recvmsg_into: `size` frame slots of
+    frame_size bytes (16 classic, 72 FD), with the per-slot iovec lists and
+    data memoryviews built once up front so receiving a frame allocates no
+    buffers.
+    """
+    def __init__(self, size, frame_size=CAN_FRAME.size):
+        self.size = size
+        self.next = 0
+        self.frame_size = frame_size
+        self.buf = bytearray(size * frame_size)
+        view = memoryview(self.buf)
+        self.iov = [[view[i * frame_size:(i + 1) * frame_size]] for i in range(size)]
+        self.data = [view[i * frame_size + CAN_HEADER.size:(i + 1) * frame_size]
+                     for i in range(size)]
+
+
+def _kernel_stamp(ancdata):
+    """
+    Kernel timestamp from recvmsg ancillary data as (timestamp_ns, source).
+    For SO_TIMESTAMPING the raw hardware stamp wins and the software stamp
+    is the fallback; (0, TS_SOURCE_NONE) if no timestamp was attached.
+    """
+    for cmsg_level, cmsg_type, cmsg_data in ancdata:
+        if cmsg_level != SOL_SOCKET:
+            continue
+        if cmsg_type == SCM_TIMESTAMPNS:
+            # struct timespec: time_t tv_sec, long tv_nsec
+            seconds, nanoseconds = TIME_PAIR.unpack(cmsg_data)
+            return seconds * NS_PER_S + nanoseconds, TS_SOURCE_SOFTWARE
+        if cmsg_type == SCM_TIMESTAMP:
+            # struct timeval: time_t tv_sec, suseconds_t tv_usec
+            seconds, microseconds = TIME_PAIR.unpack(cmsg_data)
+            return seconds * NS_PER_S + microseconds * 1000, TS_SOURCE_SOFTWARE
+        if cmsg_type == SCM_TIMESTAMPING:
+            sw_sec, sw_nsec, _, _, hw_sec, hw_nsec = SCM_TIMESTAMPING_STRUCT.unpack(cmsg_data)
+            if hw_sec or hw_nsec:
+                return hw_sec * NS_PER_S + hw_nsec, TS_SOURCE_HARDWARE
+            if sw_sec or sw_nsec:
+                return sw_sec * NS_PER_S + sw_nsec, TS_SOURCE_SOFTWARE
+    return 0, TS_SOURCE_NONE
+
+
+def _drop_counter(ancdata):
+    """
+    The socket's cumulative SO_RXQ_OVFL drop counter from recvmsg ancillary
+    data. The kernel only attaches it once something was dropped, so a
+    missing cmsg means 0.
+    """
+    for cmsg_level, cmsg_type, cmsg_data in ancdata:
+        if cmsg_level == SOL_SOCKET and cmsg_type == SO_RXQ_OVFL:
+            return DROP_COUNTER.unpack_from(cmsg_data)[0]
+    return 0
+
 
 class CANReceiver:
     """
     Low-level SocketCAN receiver that extracts Kernel Timestamps (SO_TIMESTAMP)
     using recvmsg for high-precision physical clock analysis.
+
+    With timestamp_ns=True the socket uses SO_TIMESTAMPNS instead, so the
+    kernel hands over a struct timespec and receive_ns() can return exact
+    integer nanoseconds. An already-open socket can be passed in as sock
+    (used by the tests); it is configured but not bound.
+
+    filter_ids installs a kernel CAN_RAW_FILTER so only those IDs reach
+    Python (None receives everything); see can_filters() for catch_unknown.
+
+    hw_timestamps=True switches to SO_TIMESTAMPING: the controller's raw
+    hardware timestamp is used when the driver provides one, the kernel
+    software timestamp otherwise (always the case on vcan). Timestamps are
+    then integer ns regardless of timestamp_ns. Each frame reports which
+    clock was used (last_timestamp_source, FrameBatch.ts_source).
+
+    fd_frames=True enables CAN_RAW_FD_FRAMES. The socket then delivers
+    both 16-byte classic and 72-byte FD frames; every receive path reads
+    into 72-byte slots and returns both kinds the same way, with up to 64
+    data bytes.
+
+    rxq_ovfl=True enables SO_RXQ_OVFL: every frame then carries the number
+    of frames the kernel dropped from the socket queue just before it
+    (last_dropped, FrameBatch.dropped), and kernel_drops is the running
+    total. rcvbuf_bytes requests a socket receive buffer size (SO_RCVBUF);
+    the size the kernel actually granted is kept in rcvbuf.
     """
-    def __init__(self, interface="vcan0"):
+    def __init__(self, interface="vcan0", timestamp_ns=CAN_TIMESTAMP_NS, sock=None,
+                 ring_frames=RECV_RING_FRAMES, filter_ids=CAN_FILTER_IDS,
+                 catch_unknown=CAN_CATCH_UNKNOWN_IDS, hw_timestamps=CAN_HW_TIMESTAMPS,
+                 fd_frames=CAN_FD_FRAMES, rxq_ovfl=CAN_RXQ_OVFL, rcvbuf_bytes=CAN_RCVBUF_BYTES):
         self.interface = interface
-        self.sock = socket.socket(PF_CAN, SOCK_RAW, CAN_RAW)
+        self.timestamp_ns = timestamp_ns or hw_timestamps
+        self.hw_timestamps = hw_timestamps
+        self.fd_frames = fd_frames
+        self.frame_size = CANFD_FRAME.size if fd_frames else CAN_FRAME.size
+        self._frame_dtype = CANFD_FRAME_DTYPE if fd_frames else CAN_FRAME_DTYPE
+        self.last_timestamp_source = TS_SOURCE_NONE
+        self.last_is_fd = False
+        self.rxq_ovfl = rxq_ovfl
+        self.last_dropped = 0
+        self.kernel_drops = 0       # frames dropped by the kernel since the socket opened
+        self._mmsg = None   # recvmmsg buffers, allocated on first receive_batch()
+        self._ring = None   # recvmsg_into ring, allocated on first receive_view()
+        self.ring_frames = ring_frames
+        self.filter_ids = None      # monitored IDs when a kernel filter is set
+        self.catch_unknown = True
+        self.sock = sock if sock is not None else socket.socket(PF_CAN, SOCK_RAW, CAN_RAW)
         
-        # Enable SO_TIMESTAMP to get the kernel-level packet arrival time
+        # Enable SO_TIMESTAMP(NS/ING) to get the kernel-level packet arrival time
+        if hw_timestamps:
+            option, value, name = SO_TIMESTAMPING, SOF_TIMESTAMPING_RX_FLAGS, "SO_TIMESTAMPING"
+            self._cmsg_dtype, self._cmsg_space = TIMESTAMPING_CMSG_DTYPE, TIMESTAMPING_CMSG_SPACE
+        elif timestamp_ns:
+            option, value, name = SO_TIMESTAMPNS, 1, "SO_TIMESTAMPNS"
+            self._cmsg_dtype, self._cmsg_space = TIMESTAMP_CMSG_DTYPE, TIMESTAMP_CMSG_SPACE
+        else:
+            option, value, name = SO_TIMESTAMP, 1, "SO_TIMESTAMP"
+            self._cmsg_dtype, self._cmsg_space = TIMESTAMP_CMSG_DTYPE, TIMESTAMP_CMSG_SPACE
         try:
-            self.sock.setsockopt(SOL_SOCKET, SO_TIMESTAMP, 1)
+            self.sock.setsockopt(SOL_SOCKET, option, value)
         except OSError as e:
-            print(f"[ERROR] Could not enable SO_TIMESTAMP: {e}")
+            print(f"[ERROR] Could not enable {name}: {e}")
             raise
 
+        if rxq_ovfl:
+            try:
+                self.sock.setsockopt(SOL_SOCKET, SO_RXQ_OVFL, 1)
+            except OSError as e:
+                print(f"[ERROR] Could not enable SO_RXQ_OVFL: {e}")
+                raise
+            self._cmsg_dtype = _with_rxq_ovfl(self._cmsg_dtype)
+            self._cmsg_space += RXQ_OVFL_CMSG_SPACE
+
+        if rcvbuf_bytes is not None:
+            try:
+                self.sock.setsockopt(SOL_SOCKET, SO_RCVBUF, rcvbuf_bytes)
+            except OSError as e:
+                print(f"[ERROR] Could not set SO_RCVBUF to {rcvbuf_bytes}: {e}")
+                raise
+        # Linux reports (and grants) twice the requested size, capped by rmem_max
+        self.rcvbuf = self.sock.getsockopt(SOL_SOCKET, SO_RCVBUF)
+
+        if fd_frames:
+            try:
+                self.sock.setsockopt(SOL_CAN_RAW, CAN_RAW_FD_FRAMES, 1)
+            except OSError as e:
+                print(f"[ERROR] Could not enable CAN_RAW_FD_FRAMES: {e}")
+                raise
+
+        if filter_ids is not None:
+            self.set_filters(filter_ids, catch_unknown)
+
+        if sock is not None:
+            return
         try:
             self.sock.bind((interface,))
         except OSError as e:
             print(f"[ERROR] Could not bind to {interface}. Ensure it exists (sudo modprobe vcan && sudo ip link add dev {interface} type vcan && sudo ip link set up {interface}).")
             raise
 
+    def set_filters(self, can_ids, catch_unknown=False):
+        """Replace the kernel CAN_RAW_FILTER list (see can_filters())."""
+        try:
+            self.sock.setsockopt(SOL_CAN_RAW, CAN_RAW_FILTER, can_filters(can_ids, catch_unknown))
+        except OSError as e:
+            print(f"[ERROR] Could not set CAN_RAW_FILTER: {e}")
+            raise
+        self.filter_ids = frozenset(can_ids)
+        self.catch_unknown = catch_unknown
+
+    def receive_ns(self, flags=0):
+        """
+        Receives a CAN frame and its associated kernel timestamp.
+        Returns: (can_id, data, timestamp_ns) with timestamp_ns an int
+        (0 if the kernel attached no timestamp); the clock it came from is
+        left in last_timestamp_source, and last_is_fd tells whether the
+        frame arrived as an FD frame.
+        """
+        # Ancillary data buffer: CMSG_SPACE(sizeof the timestamp payload)
+        msg, ancdata, msg_flags, addr = self.sock.recvmsg(self.frame_size, self._cmsg_space, flags)
+
+        # 1. Parse CAN Frame (classic and FD share the 8-byte header)
+        can_id, dlc = CAN_HEADER.unpack_from(msg)
+        self.last_is_fd = len(msg) == CANFD_FRAME.size
+        # Handle Extended IDs if necessary
+        can_id &= socket.CAN_EFF_MASK if (can_id & socket.CAN_EFF_FLAG) else socket.CAN_SFF_MASK
+
+        # 2. Parse Ancillary Data (Kernel Timestamp, drop counter)
+        kernel_ns, self.last_timestamp_source = _kernel_stamp(ancdata)
+        if self.rxq_ovfl:
+            self._count_drops(_drop_counter(ancdata))
+
+        return can_id, msg[CAN_HEADER.size:CAN_HEADER.size + dlc], kernel_ns
+
+    def _count_drops(self, counter):
+        """Turn the kernel's cumulative (wrapping uint32) counter into last_dropped."""
+        self.last_dropped = (counter - self.kernel_drops) & 0xFFFFFFFF
+        self.kernel_drops += self.last_dropped
+
     def receive(self):
         """
         Receives a CAN frame and its associated kernel timestamp.
         Returns: (can_id, data, timestamp_s)
         """
-        # CAN frame: 4 bytes ID, 1 byte DLC, 3 bytes padding, 8 bytes Data = 16 bytes
-        # Ancillary data buffer: CMSG_SPACE(sizeof(struct timeval))
-        # struct timeval is usually 16 bytes (8s, 8s on 64-bit)
-        can_frame_fmt = "<IB3x8s"
-        cmsg_capacity = socket.CMSG_SPACE(16) 
+        can_id, data, kernel_ns = self.receive_ns()
+        return can_id, data, kernel_ns / NS_PER_S
 
-        msg, ancdata, flags, addr = self.sock.recvmsg(16, cmsg_capacity)
+    def receive_view(self):
+        """
+        Zero-copy variant of receive_ns() built on recvmsg_into.
+        The frame lands in the next slot of a preallocated bytearray ring and
+        is decoded in place. Returns (can_id, dlc, data, timestamp_ns) where
+        data is an 8-byte (64-byte on an FD socket) memoryview into the ring;
+        only the first dlc bytes are meaningful. The view is reused after ring_frames more receptions,
+        so copy it (bytes(data)) if it must outlive that.
+        """
+        ring = self._ring
+        if ring is None:
+            ring = self._ring = _FrameRing(self.ring_frames, self.frame_size)
+        slot = ring.next
+        ring.next = slot + 1 if slot + 1 < ring.size else 0
 
-        # 1. Parse CAN Frame
-        can_id, dlc, data = struct.unpack(can_frame_fmt, msg)
-        # Handle Extended IDs if necessary
+        nbytes, ancdata, msg_flags, addr = self.sock.recvmsg_into(ring.iov[slot], self._cmsg_space)
+
+        can_id, dlc = CAN_HEADER.unpack_from(ring.buf, slot * ring.frame_size)
         can_id &= socket.CAN_EFF_MASK if (can_id & socket.CAN_EFF_FLAG) else socket.CAN_SFF_MASK
+        kernel_ns, self.last_timestamp_source = _kernel_stamp(ancdata)
+        if self.rxq_ovfl:
+            self._count_drops(_drop_counter(ancdata))
+        return can_id, dlc, ring.data[slot], kernel_ns
 
-        # 2. Parse Ancillary Data (Kernel Timestamp)
-        kernel_timestamp = 0.0
-        for cmsg_level, cmsg_type, cmsg_data in ancdata:
-            if cmsg_level == SOL_SOCKET and cmsg_type == SCM_TIMESTAMP:
-                # struct timeval: time_t tv_sec, suseconds_t tv_usec
-                # On 64-bit Linux, these are typically 'q' (long long / 8 bytes)
-                seconds, microseconds = struct.unpack("qq", cmsg_data)
-                kernel_timestamp = seconds + (microseconds / 1000000.0)
+    def receive_batch(self, max_frames=64, copy=True):
+        """
+        Receives up to max_frames CAN frames with a single recvmmsg syscall.
+        Blocks until at least one frame is queued, then drains whatever else
+        is already waiting. Returns a FrameBatch of arrays:
+        can_id (uint32), dlc (uint8), data ((n, 8) or, on an FD socket,
+        (n, 64) uint8), timestamp_ns (int64, 0 where the kernel attached no
+        timestamp), ts_source (TS_SOURCE_*), is_fd (bool) and dropped
+        (uint32, frames the kernel dropped before each one; all 0 unless
+        rxq_ovfl is enabled).
+
+        With copy=False the arrays are views into the receiver's preallocated
+        buffers and are overwritten by the next receive_batch() call.
+        """
+        recvmmsg = _libc_recvmmsg()
+        if recvmmsg is None:
+            return self._receive_batch_fallback(max_frames)
+
+        bufs = self._mmsg
+        if bufs is None or bufs.capacity < max_frames:
+            bufs = self._mmsg = _MMsgBuffers(max_frames, self._cmsg_dtype, self._frame_dtype)
+        # The kernel overwrites msg_controllen with the bytes it used
+        bufs.controllen[:max_frames] = self._cmsg_space
+
+        fd = self.sock.fileno()
+        while True:
+            n = recvmmsg(fd, bufs.msgs, max_frames, MSG_WAITFORONE, None)
+            if n >= 0:
+                break
+            err = ctypes.get_errno()
+            if err != errno.EINTR:
+                raise OSError(err, os.strerror(err))
+
+        # 1. Frame IDs, decoded into the reusable output array
+        frames = bufs.frame_view[:n]
+        raw_id = frames["can_id"]
+        can_id = np.bitwise_and(raw_id, socket.CAN_EFF_MASK, out=bufs.can_id[:n])
+        can_id[raw_id < socket.CAN_EFF_FLAG] &= socket.CAN_SFF_MASK
+
+        # 2. Kernel timestamps and their source
+        cmsg = bufs.cmsg_view[:n]
+        timestamp_ns = bufs.timestamp_ns[:n]
+        ts_source = bufs.ts_source[:n]
+        if self.hw_timestamps:
+            # Raw hardware stamp (ts[2]) preferred, software stamp (ts[0]) as fallback
+            hw_ns = cmsg["hw_sec"] * NS_PER_S + cmsg["hw_nsec"]
+            sw_ns = cmsg["sw_sec"] * NS_PER_S + cmsg["sw_nsec"]
+            has_hw = hw_ns != 0
+            np.copyto(timestamp_ns, np.where(has_hw, hw_ns, sw_ns))
+            np.copyto(ts_source, np.where(has_hw, TS_SOURCE_HARDWARE, TS_SOURCE_SOFTWARE), casting="unsafe")
+            expected = SCM_TIMESTAMPING
+        else:
+            # tv_nsec for SO_TIMESTAMPNS, tv_usec otherwise
+            np.multiply(cmsg["sec"], NS_PER_S, out=timestamp_ns)
+            if self.timestamp_ns:
+                timestamp_ns += cmsg["frac"]
+                expected = SCM_TIMESTAMPNS
+            else:
+                timestamp_ns += cmsg["frac"] * 1000
+                expected = SCM_TIMESTAMP
+            ts_source[:] = TS_SOURCE_SOFTWARE
+        unstamped = ((bufs.controllen[:n] == 0) | (cmsg["level"] != SOL_SOCKET)
+                     | (cmsg["type"] != expected) | (timestamp_ns == 0))
+        timestamp_ns[unstamped] = 0
+        ts_source[unstamped] = TS_SOURCE_NONE
+
+        # 3. Classic vs. FD, from the number of bytes each message carried
+        is_fd = bufs.is_fd[:n]
+        if self.fd_frames:
+            np.equal(bufs.msg_len[:n], CANFD_FRAME.size, out=is_fd)
+
+        # 4. Kernel queue drops, from the cumulative SO_RXQ_OVFL counters
+        #    (timestamps are always on, so that cmsg follows the timestamp one)
+        dropped = bufs.dropped[:n]
+        if self.rxq_ovfl:
+            ovfl_offset = self._cmsg_space - RXQ_OVFL_CMSG_SPACE
+            has_counter = ((bufs.controllen[:n] >= ovfl_offset + socket.CMSG_LEN(DROP_COUNTER.size))
+                           & (cmsg["ovfl_level"] == SOL_SOCKET) & (cmsg["ovfl_type"] == SO_RXQ_OVFL))
+            counters = np.where(has_counter, cmsg["ovfl_count"], 0).astype(np.int64)
+            np.copyto(dropped, np.diff(counters, prepend=self.kernel_drops & 0xFFFFFFFF) & 0xFFFFFFFF,
+                      casting="unsafe")
+            self.kernel_drops += int(dropped.sum())
+            self.last_dropped = int(dropped[-1])
+
+        batch = FrameBatch(can_id, frames["dlc"], frames["data"], timestamp_ns, ts_source, is_fd, dropped)
+        if copy:
+            batch = FrameBatch(*(a.copy() for a in batch))
+        return batch
+
+    def _receive_batch_fallback(self, max_frames):
+        """recvmsg loop used where libc's recvmmsg cannot be loaded."""
+        frames = [self.receive_ns() + (self.last_timestamp_source, self.last_is_fd, self.last_dropped)]
+        while len(frames) < max_frames:
+            try:
+                frames.append(self.receive_ns(socket.MSG_DONTWAIT)
+                              + (self.last_timestamp_source, self.last_is_fd, self.last_dropped))
+            except BlockingIOError:
                 break
 
-        return can_id, data[:dlc], kernel_timestamp
+        n = len(frames)
+        data = np.zeros((n, self.frame_size - CAN_HEADER.size), dtype=np.uint8)
+        for i, (_, payload, _, _, _, _) in enumerate(frames):
+            data[i, :len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        return FrameBatch(
+            np.array([f[0] for f in frames], dtype=np.uint32),
+            np.array([len(f[1]) for f in frames], dtype=np.uint8),
+            data,
+            np.array([f[2] for f in frames], dtype=np.int64),
+            np.array([f[3] for f in frames], dtype=np.uint8),
+            np.array([f[4] for f in frames], dtype=bool),
+            np.array([f[5] for f in frames], dtype=np.uint32),
+        )
 
     def close(self):
         self.sock.close()
 
+class MultiBusReceiver:
+    """
+    Watches several CAN buses from one thread. Every bus gets its own
+    CANReceiver (extra keyword arguments are passed through); the sockets
+    are registered with a selectors.DefaultSelector (epoll on Linux).
+
+    receive_batches() waits until at least one socket is readable and takes
+    one batch from each ready bus, so a saturated bus cannot starve the
+    others: every round, every ready bus gets at most max_frames frames.
+    """
+    def __init__(self, interfaces=CAN_INTERFACES, **receiver_kwargs):
+        self.selector = selectors.DefaultSelector()
+        self.receivers = {}
+        try:
+            for interface in interfaces:
+                self.add(CANReceiver(interface, **receiver_kwargs))
+        except OSError:
+            self.close()
+            raise
+
+    def add(self, receiver):
+        """Register an already configured CANReceiver under its interface name."""
+        if receiver.interface in self.receivers:
+            raise ValueError(f"Interface {receiver.interface!r} is already registered")
+        self.selector.register(receiver.sock, selectors.EVENT_READ, receiver)
+        self.receivers[receiver.interface] = receiver
+
+    def receive_batches(self, max_frames=64, copy=True, timeout=None):
+        """
+        Returns a list of (interface, FrameBatch), one per bus that had
+        frames queued; empty if timeout (seconds) expired first. With
+        copy=False each batch is a view into its own receiver's buffers,
+        valid until the next call.
+        """
+        batches = []
+        for key, _ in self.selector.select(timeout):
+            receiver = key.data
+            batches.append((receiver.interface, receiver.receive_batch(max_frames, copy=copy)))
+        return batches
+
+    def drop_stats(self):
+        """Cumulative kernel drops per interface (needs rxq_ovfl)."""
+        return {interface: receiver.kernel_drops for interface, receiver in self.receivers.items()}
+
+    def close(self):
+        for receiver in self.receivers.values():
+            self.selector.unregister(receiver.sock)
+            receiver.close()
+        self.receivers.clear()
+        self.selector.close()
+
+
+class AsyncFrameSource:
+    """
+    asyncio front end for one or more CANReceivers.
+
+    Each socket is made non-blocking and watched with loop.add_reader();
+    when it turns readable the callback drains one batch with
+    receive_batch() straight into a queue, so reception never waits on
+    whoever consumes the batches. Iterate with `async for interface, batch
+    in source`. Batches are copies, safe to keep across awaits.
+
+    At most max_pending batches are queued; when the consumer falls that
+    far behind, reading pauses (frames wait in the kernel socket buffer)
+    and resumes as soon as a batch is taken.
+
+    A socket error other than EAGAIN/EINTR (e.g. ENETDOWN when the
+    interface goes down) stops reading on every socket and is raised from
+    the iteration once the batches queued before it have been taken.
+    """
+    def __init__(self, receivers, max_frames=RECV_BATCH_SIZE, max_pending=ASYNC_PENDING_BATCHES):
+        if isinstance(receivers, CANReceiver):
+            receivers = [receivers]
+        self.receivers = list(receivers)
+        self.max_frames = max_frames
+        self.queue = asyncio.Queue(max_pending)
+        self.pending_frames = 0     # frames in the queued batches
+        self.paused = False
+        self._loop = None
+
+    def start(self):
+        """Register the sockets with the running event loop (idempotent)."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        for receiver in self.receivers:
+            receiver.sock.setblocking(False)
+        self._add_readers()
+
+    def _add_readers(self):
+        for receiver in self.receivers:
+            self._loop.add_reader(receiver.sock.fileno(), self._on_readable, receiver)
+        self.paused = False
+
+    def _remove_readers(self):
+        for receiver in self.receivers:
+            self._loop.remove_reader(receiver.sock.fileno())
+
+    def _on_readable(self, receiver):
+        try:
+            batch = receiver.receive_batch(self.max_frames)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._remove_readers()
+            self.paused = False
+            self.queue.put_nowait((receiver.interface, e))
+            return
+        self.queue.put_nowait((receiver.interface, batch))
+        self.pending_frames += len(batch.can_id)
+        if self.queue.full():
+            self._remove_readers()
+            self.paused = True
+
+    def __aiter__(self):
+        self.start()
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if isinstance(item[1], OSError):
+            raise item[1]
+        self.pending_frames -= len(item[1].can_id)
+        if self.paused and self._loop is not None:
+            self._add_readers()
+        return item
+
+    def close(self):
+        """Stop watching the sockets; the receivers themselves stay open."""
+        if self._loop is not None:
+            self._remove_readers()
+            self._loop = None
+
+
 if __name__ == "__main__":
     # Quick test if vcan0 is available
     print(f"Listening on vcan0... (Press Ctrl+C to stop)")
@@ -5,23 +5,87 @@ All tunable parameters in one place – no magic numbers scattered across module
 
 # ── CAN Interface ─────────────────────────────────────────────────────────────
 CAN_INTERFACE = "vcan0"
+CAN_INTERFACES = [CAN_INTERFACE]  # buses the live monitor watches from one epoll loop
+CAN_TIMESTAMP_NS = True   # SO_TIMESTAMPNS (integer ns) instead of SO_TIMESTAMP (µs)
+CAN_HW_TIMESTAMPS = False # SO_TIMESTAMPING: controller hardware stamps, software fallback
+CAN_FD_FRAMES    = False  # CAN_RAW_FD_FRAMES: receive 72-byte FD frames alongside classic
+RECV_BATCH_SIZE  = 64     # max frames pulled per recvmmsg() call
+RECV_RING_FRAMES = 256    # frame slots in the zero-copy receive_view() ring
+CAN_RXQ_OVFL     = True   # SO_RXQ_OVFL: per-frame kernel drop counts; trackers skip intervals with a loss
+CAN_RCVBUF_BYTES = None   # SO_RCVBUF request in bytes (e.g. 4 * 1024 * 1024); None keeps the kernel default
+ASYNC_PENDING_BATCHES = 64  # batches queued by AsyncFrameSource before reading pauses
+ALERT_QUEUE_SIZE = 1024     # alerts awaiting the async sinks; newer ones are dropped when full
+RECV_THREAD      = True   # receive on a dedicated thread into a FrameRing (producer/consumer)
+RING_CAPACITY    = 65536  # (id, timestamp) records the FrameRing holds; rounded up to 2**k
+
+# ── Kernel CAN ID filtering (CAN_RAW_FILTER) ─────────────────────────────────
+# IDs the kernel lets through to the monitor; None = no filter (every ID).
+# Set to MONITORED_ECU_IDS (below) to fingerprint only the known ECUs.
+CAN_FILTER_IDS        = None
+CAN_CATCH_UNKNOWN_IDS = False   # also pass unlisted IDs; the monitor reports them as UNKNOWN
 
 # ── Simulation defaults ───────────────────────────────────────────────────────
 DEFAULT_NUM_SAMPLES  = 5000
 DEFAULT_BASE_INTERVAL = 0.010   # seconds  (100 Hz)
 DEFAULT_DURATION_S   = 300      # seconds for dataset generation
+DATASET_CHUNK_S      = 10.0     # seconds of bus time per streamed dataset chunk
 
 # ── Kalman Filter noise matrices ──────────────────────────────────────────────
 KALMAN_Q_NOISE = 1e-12   # Process noise  – trust the physics model
 KALMAN_R_NOISE = 1e-10   # Measurement noise – dampen OS scheduling jitter
+TRACKER_ENGINE = "scalar" # "scalar" (allocation-free floats) | "numpy" (matrix reference)
+KALMAN_STEADY_STATE_TOL = 1e-9  # relative change in P at which the gain counts as converged
+
+# ── Tracker table ─────────────────────────────────────────────────────────────
+# Known ECUs (AUTOMOTIVE_ECUS) always keep their tracker; every other ID
+# shares a bounded, least-recently-seen table so ID fuzzing cannot exhaust memory.
+TRACKER_CAPACITY   = 4096    # trackers for IDs outside AUTOMOTIVE_ECUS
+TRACKER_IDLE_S     = 60.0    # unknown-ID trackers unseen this long are freed
+ID_FLOOD_THRESHOLD = 64      # new unknown IDs per window that raise an ID-flood alert
+ID_FLOOD_WINDOW_S  = 1.0     # seconds
+
+# ── Overload control ──────────────────────────────────────────────────────────
+# When detection falls behind the receive path, non-critical ECUs
+# (critical: False in AUTOMOTIVE_ECUS) are scored at a reduced rate.
+OVERLOAD_ENTER_LAG    = 16384   # consumer lag (frames) that enters degraded mode
+OVERLOAD_EXIT_LAG     = 1024    # lag at or below which full-rate scoring resumes
+OVERLOAD_HOLD_S       = 1.0     # minimum time in degraded mode, so it does not flap
+OVERLOAD_SAMPLE_EVERY = 8       # degraded: non-critical IDs track 2 frames in this many
+# The async monitor buffers at most ASYNC_PENDING_BATCHES * RECV_BATCH_SIZE
+# frames before reading pauses (then the socket buffer fills), so it
+# switches well inside that bound
+OVERLOAD_ASYNC_ENTER_LAG = 2048  # estimated backlog (frames) that enters degraded mode
+OVERLOAD_ASYNC_EXIT_LAG  = 256   # backlog at or below which full-rate scoring resumes
 
 # ── Detection thresholds ──────────────────────────────────────────────────────
 DETECTION_THRESHOLD_US = 200   # microseconds; below → PHYSICAL, above → ANOMALY
 WARMUP_PACKETS         = 10    # packets before filter is considered converged
 
+# ── Alert aggregation ─────────────────────────────────────────────────────────
+ALERT_QUIET_PERIOD_S = 2.0     # an incident closes after this long without an anomaly
+ALERT_MAX_EVENTS     = 8       # events per incident: open + progress updates + close
+ALERT_HISTORY        = 256     # closed incidents kept in memory
+
+# ── Live dashboard ────────────────────────────────────────────────────────────
+DASHBOARD            = False   # per-ID summary table instead of one status line per frame
+DASHBOARD_REFRESH_HZ = 5       # table redraws per second
+DASHBOARD_WINDOW     = 1024    # recent residuals per ID behind the p50/p99 columns
+
+# ── Latency instrumentation ───────────────────────────────────────────────────
+LATENCY_STATS        = False   # per-stage HDR histograms (receive, track, classify, verdict)
+
+# ── Metrics endpoint ──────────────────────────────────────────────────────────
+METRICS_HOST         = "127.0.0.1"
+METRICS_PORT         = None    # Prometheus /metrics port for the live monitor; None = off
+
+# ── Sharded detection ─────────────────────────────────────────────────────────
+SHARD_WORKERS        = 0       # tracker worker processes; 0 = track in the monitor process
+SHARD_RING_CAPACITY  = 65536   # records per worker's shared-memory ring; rounded up to 2**k
+
 # ── Logging ───────────────────────────────────────────────────────────────────
 LOG_FILE   = "sentinel.log"
 LOG_LEVEL  = "INFO"            # DEBUG | INFO | WARNING | ERROR
+LOG_QUEUE_SIZE = 10000         # records awaiting the writer thread; more are dropped and counted
 
 # ── ECU clock-simulation parameters ──────────────────────────────────────────
 ECU_THERMAL_AMPLITUDE = 0.00002   # seconds  (±20 µs sinusoidal drift)
@@ -41,3 +105,8 @@ AUTOMOTIVE_ECUS = [
     {"id": 0x300, "interval": 0.500, "name": "Fuel_Level",       "critical": False},
     {"id": 0x400, "interval": 1.000, "name": "Dashboard_Lights", "critical": False},
 ]
+
+# IDs of the ECUs above, e.g. for CAN_FILTER_IDS
+MONITORED_ECU_IDS = [ecu["id"] for ecu in AUTOMOTIVE_ECUS]
+# IDs that are sampled first when the monitor is overloaded
+NON_CRITICAL_ECU_IDS = [ecu["id"] for ecu in AUTOMOTIVE_ECUS if not ecu["critical"]]
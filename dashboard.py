@@ -0,0 +1,193 @@
+"""
+Sentinel-T Live Dashboard
+Per-ID aggregates for the live monitor, redrawn as one fixed table at a
+bounded rate instead of a print per frame. record() only touches NumPy
+arrays; all formatting and terminal I/O happens in redraw().
+"""
+
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+from config import (
+    DASHBOARD_REFRESH_HZ,
+    DASHBOARD_WINDOW,
+    DETECTION_THRESHOLD_US,
+    MONITORED_ECU_IDS,
+    TRACKER_CAPACITY,
+)
+from detection import STATE_ANOMALY, STATE_PHYSICAL, STATE_RESYNC, STATE_WARMUP
+
+# Last verdict per ID, as stored in Dashboard.state
+STATE_LABELS = {
+    STATE_WARMUP:   "\033[93mWARMUP\033[0m",
+    STATE_PHYSICAL: "\033[92mPHYSICAL\033[0m",
+    STATE_ANOMALY:  "\033[91mANOMALY\033[0m",
+    STATE_RESYNC:   "\033[96mRESYNC\033[0m",
+}
+
+# Cursor home + clear screen: the table is redrawn in place
+_CLEAR = "\033[H\033[J"
+
+
+def _us(value):
+    return f"{value:8.2f}" if value == value else f"{'-':>8}"
+
+
+class Dashboard:
+    """
+    Aggregates per (bus, CAN ID): frame count and rate, last drift, last
+    verdict, anomaly count, and residual p50/p99 over the last `window`
+    scored frames (a fixed ring per ID, so memory stays bounded).
+
+    Like the TrackerTable behind it, the table holds at most max_rows IDs:
+    at the cap, a new ID takes over the row of the least recently seen one,
+    so an ID flood cannot grow it (or the redraw) without bound.
+
+    Call record() for every processed batch and maybe_redraw() as often as
+    convenient; the table is only rendered every 1/refresh_hz seconds.
+    """
+    def __init__(self, refresh_hz=DASHBOARD_REFRESH_HZ, window=DASHBOARD_WINDOW,
+                 stream=None, capacity=64, max_rows=TRACKER_CAPACITY + len(MONITORED_ECU_IDS)):
+        self.interval_s = 1.0 / refresh_hz
+        self.window = window
+        self.stream = stream if stream is not None else sys.stdout
+        self.max_rows = max(1, max_rows)
+        self.slots = OrderedDict()  # (bus, can_id) -> row, least recently seen first
+        self.keys = []              # row -> (bus, can_id)
+        self.evicted = 0
+        self.capacity = capacity = min(capacity, self.max_rows)
+        self.frames = np.zeros(capacity, dtype=np.int64)
+        self.anomalies = np.zeros(capacity, dtype=np.int64)
+        self.drift_ppm = np.zeros(capacity)
+        self.state = np.zeros(capacity, dtype=np.uint8)
+        self.residuals_us = np.full((capacity, window), np.nan, dtype=np.float32)
+        self.res_pos = np.zeros(capacity, dtype=np.int64)
+        self.unknown_frames = 0
+        self._drawn_frames = np.zeros(capacity, dtype=np.int64)
+        self._last_draw = None
+        self._order = None          # rows sorted by key, until a row changes hands
+
+    def _grow(self):
+        n = self.capacity
+        self.capacity = min(2 * n, self.max_rows)
+        for name in ("frames", "anomalies", "drift_ppm", "state", "res_pos", "_drawn_frames"):
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+        residuals = np.full((self.capacity, self.window), np.nan, dtype=np.float32)
+        residuals[:n] = self.residuals_us
+        self.residuals_us = residuals
+
+    def _row(self, key):
+        row = self.slots.get(key)
+        if row is not None:
+            self.slots.move_to_end(key)
+            return row
+        if len(self.keys) < self.max_rows:
+            row = len(self.keys)
+            if row == self.capacity:
+                self._grow()
+            self.keys.append(key)
+        else:
+            _, row = self.slots.popitem(last=False)
+            self.evicted += 1
+            self._clear(row)
+            self.keys[row] = key
+        self.slots[key] = row
+        self._order = None
+        return row
+
+    def _clear(self, row):
+        for name in ("frames", "anomalies", "drift_ppm", "state", "res_pos", "_drawn_frames"):
+            getattr(self, name)[row] = 0
+        self.residuals_us[row] = np.nan
+
+    def record(self, bus, can_ids, residuals_us, drift_ppm, states):
+        """
+        Fold one tracked batch into the aggregates. residuals_us is NaN for
+        frames that were not scored (warm-up priming, resync); states holds
+        one STATE_* code per frame. A batch with more than max_rows distinct
+        IDs only records the first max_rows of them.
+        """
+        if len(can_ids) == 0:
+            return
+        unique, inverse = np.unique(can_ids, return_inverse=True)
+        if len(unique) > self.max_rows:
+            keep = inverse < self.max_rows
+            unique, inverse = unique[:self.max_rows], inverse[keep]
+            residuals_us, drift_ppm, states = residuals_us[keep], drift_ppm[keep], states[keep]
+        rows = np.array([self._row((bus, int(can_id))) for can_id in unique], dtype=np.intp)
+        frame_rows = rows[inverse]
+
+        np.add.at(self.frames, frame_rows, 1)
+        np.add.at(self.anomalies, frame_rows, states == STATE_ANOMALY)
+        # Last value per row wins: fancy assignment keeps the final occurrence
+        self.drift_ppm[frame_rows] = drift_ppm
+        self.state[frame_rows] = states
+
+        scored = ~np.isnan(residuals_us)
+        for i, row in enumerate(rows):
+            values = residuals_us[(inverse == i) & scored][-self.window:]
+            if len(values) == 0:
+                continue
+            pos = self.res_pos[row]
+            idx = (pos + np.arange(len(values))) % self.window
+            self.residuals_us[row, idx] = values
+            self.res_pos[row] = pos + len(values)
+
+    def record_unknown(self, n_frames):
+        self.unknown_frames += n_frames
+
+    def maybe_redraw(self, now=None):
+        """Redraw if the refresh interval has elapsed; returns True if it did."""
+        now = time.monotonic() if now is None else now
+        if self._last_draw is not None and now - self._last_draw < self.interval_s:
+            return False
+        self.redraw(now)
+        return True
+
+    def render(self, now=None):
+        """The dashboard table as one string (no cursor control)."""
+        now = time.monotonic() if now is None else now
+        n = len(self.keys)
+        elapsed = now - self._last_draw if self._last_draw is not None else 0.0
+        if elapsed > 0:
+            rates = (self.frames[:n] - self._drawn_frames[:n]) / elapsed
+        else:
+            rates = np.zeros(n)
+        filled = self.residuals_us[:n]
+        with np.errstate(all="ignore"):
+            has_residuals = ~np.all(np.isnan(filled), axis=1) if n else np.zeros(0, dtype=bool)
+            p50 = np.full(n, np.nan)
+            p99 = np.full(n, np.nan)
+            if has_residuals.any():
+                p50[has_residuals], p99[has_residuals] = np.nanpercentile(
+                    filled[has_residuals], [50, 99], axis=1)
+
+        lines = [
+            f"Sentinel-T Live  |  {n} senders  |  threshold {DETECTION_THRESHOLD_US} µs"
+            f"  |  unknown frames {self.unknown_frames}",
+            f"{'Bus':<6} | {'ID':<10} | {'Frames/s':>8} | {'Drift (ppm)':>11} | {'p50 (us)':>8} | "
+            f"{'p99 (us)':>8} | {'Anomalies':>9} | {'Status':<10}",
+            "-" * 94,
+        ]
+        if self._order is None:
+            self._order = sorted(range(n), key=self.keys.__getitem__)
+        for row in self._order:
+            bus, can_id = self.keys[row]
+            lines.append(
+                f"{bus:<6} | 0x{can_id:<8x} | {rates[row]:8.1f} | {self.drift_ppm[row]:11.2f} | "
+                f"{_us(p50[row])} | {_us(p99[row])} | {self.anomalies[row]:9d} | "
+                f"{STATE_LABELS[int(self.state[row])]}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def redraw(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.stream.write(_CLEAR + self.render(now))
+        self.stream.flush()
+        self._drawn_frames[:] = self.frames
+        self._last_draw = now
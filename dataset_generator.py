@@ -11,10 +11,205 @@ Based on patterns from actual automotive CAN buses:
 """
 
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
-import random
-from config import DEFAULT_DURATION_S, AUTOMOTIVE_ECUS, ECU_OU_THETA, ECU_OU_SIGMA, ECU_THERMAL_AMPLITUDE, SMART_ATTACKER_NOISE_STD, REPLAY_JITTER_STD
+from config import DEFAULT_DURATION_S, DATASET_CHUNK_S, AUTOMOTIVE_ECUS, ECU_OU_THETA, ECU_OU_SIGMA, ECU_THERMAL_AMPLITUDE, SMART_ATTACKER_NOISE_STD, REPLAY_JITTER_STD
+from message_batch import (
+    ATTACK,
+    PAYLOAD_DTYPE,
+    BatchWriter,
+    empty_batch,
+    hex_payloads,
+    make_batch,
+    merge_batches,
+    to_frame,
+)
+
+# Block length of the AR(1) filter: coeff**-block must stay well inside float range
+_AR1_BLOCK = 256
+
+
+def _ar1_filter(noise, coeff, x0=0.0):
+    """
+    Vectorized AR(1) recursion x[k] = coeff * x[k-1] + noise[k], starting
+    from x[-1] = x0 (the O-U jitter update, discretized).
+
+    Within a block, x[i] = coeff**(i+1) * (x_start + cumsum(noise / coeff**(j+1)));
+    only the block-end states are carried in a Python loop.
+    """
+    noise = np.asarray(noise, dtype=np.float64)
+    n = len(noise)
+    if n == 0:
+        return noise.copy()
+    block = min(_AR1_BLOCK, n)
+    n_blocks = -(-n // block)
+    padded = np.zeros(n_blocks * block)
+    padded[:n] = noise
+    powers = coeff ** np.arange(1, block + 1)
+    
+    # Each block filtered from a zero state, then the carried state added
+    local = powers * np.cumsum(padded.reshape(n_blocks, block) / powers, axis=1)
+    starts = np.empty(n_blocks)
+    state = x0
+    for b in range(n_blocks):
+        starts[b] = state
+        state = powers[-1] * state + local[b, -1]
+    return (local + starts[:, None] * powers).ravel()[:n]
+
+
+def _send_times(start, end, interval, jitter_std=0.0):
+    """
+    Send times of a sender that starts at `start` and waits interval (plus
+    Gaussian jitter) between messages, for as long as it is before `end`.
+    Returns (send_times, next_time): the sender's next send time, at or
+    after `end`, carries on in a later call.
+    """
+    parts = []
+    current_time = start
+    while current_time < end:
+        n = int((end - current_time) / interval) + 16
+        steps = np.full(n, interval)
+        if jitter_std:
+            steps += np.random.normal(0, jitter_std, n)
+        times = np.cumsum(np.r_[current_time, steps])
+        parts.append(times[:-1])
+        current_time = times[-1]
+    timestamps = np.concatenate(parts + [[current_time]])
+    cut = int(np.searchsorted(timestamps, end, side="left"))
+    return timestamps[:cut], timestamps[cut]
+
+
+class _ECUStream:
+    """
+    Traffic of one simulated ECU, generated a chunk of bus time at a time.
+    The O-U jitter state, the thermal phase (messages sent so far) and the
+    last send time carry over between chunks, so the chunks join up like
+    one continuous run; messages generated past a chunk's end wait for the
+    next chunk.
+    """
+    def __init__(self, generator, ecu_config, attack_window=None):
+        self.generator = generator
+        self.ecu = ecu_config
+        self.interval = ecu_config["interval"]
+        self.duration = generator.duration
+        self.attack_window = attack_window
+        # Physical clock characteristics: one thermal cycle over the
+        # nominal message count, then none
+        self.n_nominal = int(self.duration / self.interval)
+        self.jitter = 0.0                       # O-U state
+        self.sent = 0                           # messages generated (thermal phase)
+        self.previous = generator.start_time    # last send time
+        self.times = np.empty(0)                # generated, not yet emitted
+        self.labels = np.empty(0, dtype=np.int8)
+
+    @property
+    def finished(self):
+        # A message is sent while the previous one was before the end
+        return self.previous >= self.duration
+
+    @property
+    def exhausted(self):
+        return self.finished and len(self.times) == 0
+
+    def _extend(self, until):
+        # Draw a little more than the expected count; called again if jitter ran short
+        expected = max(0.0, min(until, self.duration) - self.previous) / self.interval
+        n = int(expected) + 16 + int(4 * np.sqrt(expected))
+        jitter = _ar1_filter(ECU_OU_SIGMA * np.random.normal(size=n), 1.0 - ECU_OU_THETA, self.jitter)
+        phase = self.sent + np.arange(n)
+        drift_component = np.where(
+            phase < self.n_nominal,
+            np.sin(2 * np.pi * phase / max(self.n_nominal - 1, 1)) * ECU_THERMAL_AMPLITUDE,
+            0.0,
+        )
+        times = self.previous + np.cumsum(self.interval + jitter + drift_component)
+        count = min(n, int(np.searchsorted(times, self.duration, side="left")) + 1)
+        times = times[:count]
+        
+        # Check if this is during attack window (by the send time of the previous message)
+        labels = np.zeros(count, dtype=np.int8)
+        if self.attack_window:
+            previous = np.r_[self.previous, times[:-1]]
+            labels[(self.attack_window[0] <= previous) & (previous <= self.attack_window[1])] = ATTACK
+        
+        self.times = np.concatenate([self.times, times])
+        self.labels = np.concatenate([self.labels, labels])
+        self.jitter = jitter[count - 1]
+        self.sent += count
+        self.previous = times[-1]
+
+    def chunk(self, until):
+        """Messages with a timestamp before `until` not emitted yet, as a MessageBatch."""
+        while not self.finished and (len(self.times) == 0 or self.times[-1] < until):
+            self._extend(until)
+        cut = int(np.searchsorted(self.times, until, side="left"))
+        timestamps, labels = self.times[:cut], self.labels[:cut]
+        self.times, self.labels = self.times[cut:], self.labels[cut:]
+        
+        # Generate realistic payload based on ECU type
+        payloads = self.generator._generate_payloads(self.ecu["name"], timestamps)
+        return make_batch(timestamps, self.ecu["id"], payloads, self.ecu["name"], labels)
+
+
+class _AttackStream:
+    """Attack traffic (see AutomotiveCANGenerator._inject_attack), a chunk at a time."""
+
+    def __init__(self, can_id, start_time, end_time, attack_type="injection"):
+        self.can_id = can_id
+        self.end_time = end_time
+        self.attack_type = attack_type
+        self.jitter_std = 0.0
+        self.data = b"DEADBEEF"
+        
+        if attack_type == "injection":
+            # Perfect timing attacker (no drift): 10ms perfectly, NO jitter, NO drift
+            self.interval = 0.010
+            self.ecu_name = "ATTACKER"
+        
+        elif attack_type == "smart_injection":
+            # Smart attacker with Gaussian noise (jitter only)
+            self.interval = 0.010
+            self.jitter_std = SMART_ATTACKER_NOISE_STD
+            self.ecu_name = "SMART_ATTACKER"
+        
+        elif attack_type == "replay":
+            # Replay attack: simulates an attacker that re-transmits messages
+            # at the victim ECU's nominal rate but with a fixed propagation
+            # delay (capture-to-replay latency) and a small amount of jitter
+            # from the replayer's own software clock.
+            replay_offset = 0.0015  # 1.5 ms constant capture-to-replay delay
+            start_time += replay_offset
+            self.end_time += replay_offset
+            self.interval = 0.010
+            self.jitter_std = REPLAY_JITTER_STD
+            self.data = b"CAFEBABE"   # replayed payload marker
+            self.ecu_name = "REPLAYER"
+
+        elif attack_type == "fuzzing":
+            # High-rate random data flood: 1ms - very fast
+            self.interval = 0.001
+            self.ecu_name = "FUZZER"
+        
+        else:
+            self.end_time = start_time
+        
+        self.next_time = start_time   # carried over between chunks
+
+    @property
+    def exhausted(self):
+        return self.next_time >= self.end_time
+
+    def chunk(self, until):
+        """Attack messages with a timestamp before `until` not emitted yet, as a MessageBatch."""
+        if self.exhausted:
+            return empty_batch()
+        timestamps, self.next_time = _send_times(self.next_time, min(until, self.end_time), self.interval,
+                                                 self.jitter_std)
+        if self.attack_type == "fuzzing":
+            random_ids = np.random.choice([0x666, 0x777, 0x888], size=len(timestamps))
+            random_data = hex_payloads(np.random.randint(0, 1 << 32, size=len(timestamps), dtype=np.int64))
+            return make_batch(timestamps, random_ids, random_data, self.ecu_name, ATTACK)
+        return make_batch(timestamps, self.can_id, self.data, self.ecu_name, ATTACK)
+
 
 class AutomotiveCANGenerator:
     """Generates realistic multi-ECU CAN traffic with attacks."""
@@ -28,161 +223,47 @@ class AutomotiveCANGenerator:
     
     def _generate_ecu_traffic(self, ecu_config, attack_window=None):
         """Generate traffic for a single ECU with realistic clock drift."""
-        messages = []
-        current_time = self.start_time
-        interval = ecu_config["interval"]
-        
-        # Physical clock characteristics
-        thermal_drift = np.sin(np.linspace(0, 2*np.pi, int(self.duration/interval))) * 0.00002
-        current_jitter = 0.0
-        theta = 0.15
-        sigma = 0.00001
-        
-        msg_count = 0
-        while current_time < self.duration:
-            # Ornstein-Uhlenbeck jitter (mean-reverting)
-            current_jitter += -theta * current_jitter + sigma * np.random.normal()
-            
-            # Add thermal drift if within bounds
-            drift_component = thermal_drift[min(msg_count, len(thermal_drift)-1)] if msg_count < len(thermal_drift) else 0
-            
-            # Check if this is during attack window
-            is_attack = False
-            if attack_window:
-                if attack_window[0] <= current_time <= attack_window[1]:
-                    is_attack = True
-            
-            actual_interval = interval + current_jitter + drift_component
-            current_time += actual_interval
-            
-            # Generate realistic payload based on ECU type
-            data = self._generate_payload(ecu_config["name"], current_time)
-            
-            messages.append({
-                "timestamp": current_time,
-                "can_id": ecu_config["id"],
-                "dlc": 8,
-                "data": data,
-                "ecu_name": ecu_config["name"],
-                "label": "ATTACK" if is_attack else "NORMAL"
-            })
-            
-            msg_count += 1
-        
-        return messages
+        return _ECUStream(self, ecu_config, attack_window).chunk(np.inf)
     
-    def _generate_payload(self, ecu_name, timestamp):
-        """Generate realistic data payloads based on ECU function."""
+    def _generate_payloads(self, ecu_name, timestamps):
+        """Generate realistic data payloads based on ECU function, one per timestamp."""
         if ecu_name == "Steering_Angle":
-            # Steering angle: -180 to +180 degrees
-            angle = int(90 * np.sin(timestamp * 0.5))  # Simulated turning
-            return f"{angle:08X}"
+            # Steering angle: -180 to +180 degrees (32-bit two's complement)
+            angles = np.trunc(90 * np.sin(timestamps * 0.5))  # Simulated turning
+            return hex_payloads(angles)
         
         elif ecu_name == "ABS_Brake":
             # Brake pressure: 0-255
-            pressure = int(50 + 30 * np.sin(timestamp * 0.3))  # Simulated braking
-            return f"{pressure:02X}000000"
+            pressures = np.trunc(50 + 30 * np.sin(timestamps * 0.3))  # Simulated braking
+            return hex_payloads(pressures.astype(np.int64) << 24)
         
         elif ecu_name == "Engine_RPM":
             # RPM: 800-6000
-            rpm = int(1500 + 1000 * np.sin(timestamp * 0.1))
-            return f"{rpm:04X}0000"
+            rpms = np.trunc(1500 + 1000 * np.sin(timestamps * 0.1))
+            return hex_payloads(rpms.astype(np.int64) << 16)
         
         elif ecu_name == "Vehicle_Speed":
             # Speed: 0-200 km/h
-            speed = int(60 + 40 * np.sin(timestamp * 0.05))
-            return f"{speed:02X}000000"
+            speeds = np.trunc(60 + 40 * np.sin(timestamps * 0.05))
+            return hex_payloads(speeds.astype(np.int64) << 24)
         
         elif ecu_name == "Fuel_Level":
             # Fuel: 0-100%
-            fuel = max(0, int(80 - timestamp * 0.01))  # Slowly decreasing
-            return f"{fuel:02X}000000"
+            fuels = np.maximum(0, np.trunc(80 - timestamps * 0.01))  # Slowly decreasing
+            return hex_payloads(fuels.astype(np.int64) << 24)
         
         else:  # Dashboard
             # Status bits
-            return "A5A5A5A5"
+            return np.full(len(timestamps), b"A5A5A5A5", dtype=PAYLOAD_DTYPE)
     
     def _inject_attack(self, can_id, start_time, end_time, attack_type="injection"):
         """Generate attack traffic."""
-        messages = []
-        
-        if attack_type == "injection":
-            # Perfect timing attacker (no drift)
-            current_time = start_time
-            interval = 0.010  # 10ms perfectly
-            
-            while current_time < end_time:
-                messages.append({
-                    "timestamp": current_time,
-                    "can_id": can_id,
-                    "dlc": 8,
-                    "data": "DEADBEEF",
-                    "ecu_name": "ATTACKER",
-                    "label": "ATTACK"
-                })
-                current_time += interval  # NO jitter, NO drift
-        
-        elif attack_type == "smart_injection":
-            # Smart attacker with Gaussian noise
-            current_time = start_time
-            base_interval = 0.010
-            
-            while current_time < end_time:
-                noise = np.random.normal(0, 0.00005)
-                messages.append({
-                    "timestamp": current_time,
-                    "can_id": can_id,
-                    "dlc": 8,
-                    "data": "DEADBEEF",
-                    "ecu_name": "SMART_ATTACKER",
-                    "label": "ATTACK"
-                })
-                current_time += base_interval + noise  # Gaussian jitter only
-        
-        elif attack_type == "replay":
-            # Replay attack: simulates an attacker that re-transmits messages
-            # at the victim ECU's nominal rate but with a fixed propagation
-            # delay (capture-to-replay latency) and a small amount of jitter
-            # from the replayer's own software clock.
-            current_time = start_time
-            base_interval = 0.010
-            replay_offset = 0.0015  # 1.5 ms constant capture-to-replay delay
-
-            while current_time < end_time:
-                jitter = np.random.normal(0, REPLAY_JITTER_STD)
-                messages.append({
-                    "timestamp": current_time + replay_offset,
-                    "can_id": can_id,
-                    "dlc": 8,
-                    "data": "CAFEBABE",   # replayed payload marker
-                    "ecu_name": "REPLAYER",
-                    "label": "ATTACK"
-                })
-                current_time += base_interval + jitter
-
-        elif attack_type == "fuzzing":
-            # High-rate random data flood
-            current_time = start_time
-            interval = 0.001  # 1ms - very fast
-            
-            while current_time < end_time:
-                random_id = random.choice([0x666, 0x777, 0x888])
-                random_data = f"{random.randint(0, 0xFFFFFFFF):08X}"
-                messages.append({
-                    "timestamp": current_time,
-                    "can_id": random_id,
-                    "dlc": 8,
-                    "data": random_data,
-                    "ecu_name": "FUZZER",
-                    "label": "ATTACK"
-                })
-                current_time += interval
-        
-        return messages
+        return _AttackStream(can_id, start_time, end_time, attack_type).chunk(np.inf)
     
-    def generate_dataset(self, attack_scenario=None):
+    def generate_batch(self, attack_scenario=None):
         """
-        Generate complete dataset with optional attack.
+        Generate complete dataset with optional attack, as a time-ordered
+        MessageBatch.
         
         attack_scenario format:
         {
@@ -192,7 +273,12 @@ class AutomotiveCANGenerator:
             "end_time": 150
         }
         """
-        all_messages = []
+        # Each stream is already in time order: merge instead of sorting
+        return merge_batches(self._streams(attack_scenario))
+    
+    def _sources(self, attack_scenario=None):
+        """One stream per ECU, plus the attack traffic if any."""
+        sources = []
         
         # Generate normal traffic from all ECUs
         for ecu in self.ecus:
@@ -200,28 +286,64 @@ class AutomotiveCANGenerator:
             if attack_scenario and ecu["id"] == attack_scenario.get("target_id"):
                 attack_window = (attack_scenario["start_time"], attack_scenario["end_time"])
             
-            ecu_messages = self._generate_ecu_traffic(ecu, attack_window)
-            all_messages.extend(ecu_messages)
+            sources.append(_ECUStream(self, ecu, attack_window))
         
         # Inject attack traffic if specified
         if attack_scenario:
-            attack_messages = self._inject_attack(
+            sources.append(_AttackStream(
                 attack_scenario["target_id"],
                 attack_scenario["start_time"],
                 attack_scenario["end_time"],
                 attack_scenario["type"]
-            )
-            all_messages.extend(attack_messages)
-        
-        # Sort by timestamp
-        all_messages.sort(key=lambda x: x["timestamp"])
+            ))
         
-        # Create DataFrame
-        df = pd.DataFrame(all_messages)
+        return sources
+    
+    def _streams(self, attack_scenario=None):
+        """One time-ordered batch per ECU, plus the attack traffic if any."""
+        return [source.chunk(np.inf) for source in self._sources(attack_scenario)]
+    
+    def iter_chunks(self, attack_scenario=None, chunk_s=DATASET_CHUNK_S):
+        """
+        Generate the dataset as time-ordered MessageBatch chunks, each
+        holding the messages of the next chunk_s seconds of bus time
+        ([start_time + k*chunk_s, start_time + (k+1)*chunk_s); empty chunks
+        are skipped). Every stream carries its state from chunk to chunk,
+        so attack windows may span chunk boundaries and memory stays
+        bounded by one chunk, whatever the duration.
+        """
+        sources = self._sources(attack_scenario)
+        k = 0
+        while sources:
+            k += 1
+            until = self.start_time + k * chunk_s
+            batch = merge_batches([source.chunk(until) for source in sources])
+            sources = [source for source in sources if not source.exhausted]
+            if len(batch.timestamp):
+                yield batch
+    
+    def write_dataset(self, path, attack_scenario=None, chunk_s=DATASET_CHUNK_S):
+        """
+        Generate a dataset straight into a CSV file, chunk_s seconds of bus
+        time at a time (see iter_chunks()). Returns the number of messages
+        written.
+        """
+        with BatchWriter(path) as writer:
+            for batch in self.iter_chunks(attack_scenario, chunk_s):
+                writer.write(batch)
+        return writer.rows
+    
+    def generate_dataset(self, attack_scenario=None):
+        """
+        Generate complete dataset with optional attack, as a DataFrame
+        (see generate_batch()).
+        """
+        batch = self.generate_batch(attack_scenario)
+        df = to_frame(batch)
         
         # Add statistics
-        normal_count = len(df[df["label"] == "NORMAL"])
-        attack_count = len(df[df["label"] == "ATTACK"])
+        attack_count = int(np.count_nonzero(batch.label == ATTACK))
+        normal_count = len(batch.label) - attack_count
         
         print(f"✅ Generated {len(df)} CAN messages:")
         print(f"   - Normal traffic: {normal_count} messages")
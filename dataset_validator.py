@@ -5,95 +5,129 @@ Replays CAN datasets through Sentinel-T for validation testing.
 
 import pandas as pd
 import numpy as np
-from drift_tracker import DriftTracker
-from collections import defaultdict
+from drift_tracker import DriftTrackerBank, make_tracker
+from tracker_table import TrackerTable
+from config import TRACKER_ENGINE, TRACKER_CAPACITY
+from message_batch import ATTACK, ECU_NAMES, LABELS, MessageBatch, from_frame, read_csv
 import time
 
 
 class DatasetValidator:
     """Validates Sentinel-T performance on CAN datasets."""
     
-    def __init__(self, threshold_us=200, q_noise=1e-12, r_noise=1e-10):
+    # Frames per vectorized bank call, so the tracker table can evict between chunks
+    BANK_CHUNK = 4096
+
+    def __init__(self, threshold_us=200, q_noise=1e-12, r_noise=1e-10, engine=TRACKER_ENGINE,
+                 tracker_capacity=TRACKER_CAPACITY):
         self.threshold_us = threshold_us
         self.q_noise = q_noise
         self.r_noise = r_noise
-        self.trackers = {}
+        self.engine = engine
+        # Known ECUs keep their trackers; unknown IDs share tracker_capacity LRU entries
+        self.trackers = TrackerTable(tracker_capacity, pin_batches=engine == "bank")
+        # engine="bank" keeps every CAN ID in one struct-of-arrays bank and
+        # filters the capture in a few large vectorized calls
+        self.bank = (DriftTrackerBank(q_noise=q_noise, r_noise=r_noise, table=self.trackers)
+                     if engine == "bank" else None)
         self.results = []
         
-    def process_dataset(self, csv_file, verbose=True):
+    def process_dataset(self, dataset, verbose=True):
         """
-        Process a CAN dataset CSV file.
+        Process a CAN dataset: a CSV file path, a DataFrame or a MessageBatch.
         
         Expected columns: timestamp, can_id, dlc, data, ecu_name, label
         """
         # Load dataset
-        df = pd.read_csv(csv_file)
+        if isinstance(dataset, MessageBatch):
+            batch = dataset
+        elif isinstance(dataset, pd.DataFrame):
+            batch = from_frame(dataset)
+        else:
+            batch = read_csv(dataset)
         
         if verbose:
             print(f"\n{'='*60}")
-            print(f"Processing: {csv_file}")
+            print(f"Processing: {dataset if isinstance(dataset, str) else type(dataset).__name__}")
             print(f"{'='*60}")
-            print(f"Total messages: {len(df)}")
-            print(f"Unique ECUs: {df['can_id'].nunique()}")
-            print(f"Time span: {df['timestamp'].max():.2f}s")
-            print(f"Attack messages: {len(df[df['label'] == 'ATTACK'])}")
-        
-        # Initialize results tracking
-        predictions = []
-        ground_truth = []
-        
-        # Process each message
-        for idx, row in df.iterrows():
-            can_id = row['can_id']
-            timestamp = row['timestamp']
-            true_label = row['label']
-            
+            print(f"Total messages: {len(batch.timestamp)}")
+            print(f"Unique ECUs: {len(np.unique(batch.can_id))}")
+            print(f"Time span: {batch.timestamp.max() if len(batch.timestamp) else 0.0:.2f}s")
+            print(f"Attack messages: {np.count_nonzero(batch.label == ATTACK)}")
+        
+        # Run every message through its CAN ID's tracker
+        residuals, drifts, update_counts = self._track(batch)
+        
+        # Classification logic; don't classify during warmup (skipped for metrics)
+        scored = update_counts >= 10
+        residual_us = np.abs(residuals[scored]) * 1e6
+        predicted = (residual_us >= self.threshold_us).astype(np.int8)
+        true = batch.label[scored]
+        ecu = batch.ecu[scored]
+        
+        # Store results
+        can_ids, id_codes = np.unique(batch.can_id[scored], return_inverse=True)
+        self.results.append(pd.DataFrame({
+            "timestamp": batch.timestamp[scored],
+            "can_id": pd.Categorical.from_codes(id_codes, [f"0x{can_id:03x}" for can_id in can_ids.tolist()]),
+            "ecu_name": pd.Categorical.from_codes(np.where(ecu < 0, len(ECU_NAMES), ecu), ECU_NAMES + ("Unknown",)),
+            "residual_us": residual_us,
+            "drift_ppm": drifts[scored] * 1e6,
+            "true_label": pd.Categorical.from_codes(true, LABELS),
+            "predicted_label": pd.Categorical.from_codes(predicted, LABELS),
+            "correct": predicted == true,
+        }))
+        
+        # Calculate metrics
+        metrics = self._calculate_metrics(true == ATTACK, predicted == ATTACK)
+        
+        if verbose:
+            self._print_metrics(metrics)
+        
+        return metrics, pd.concat(self.results, ignore_index=True)
+    
+    def _track(self, batch):
+        """Update the trackers in arrival order; returns (residuals, drifts, update_counts)."""
+        can_ids = batch.can_id
+        timestamps = batch.timestamp
+        n = len(timestamps)
+        
+        if self.bank is not None:
+            outputs = []
+            for start in range(0, n, self.BANK_CHUNK):
+                chunk = slice(start, start + self.BANK_CHUNK)
+                slots = self.bank.slots_for(can_ids[chunk], now=timestamps[chunk].max())
+                outputs.append(self.bank.update_batch_from_can_socket(slots, timestamps[chunk]))
+            if not outputs:
+                return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+            return tuple(np.concatenate(parts) for parts in zip(*outputs))
+        
+        residuals = np.empty(n)
+        drifts = np.empty(n)
+        update_counts = np.empty(n, dtype=np.int64)
+        
+        for pos, (can_id, timestamp) in enumerate(zip(can_ids.tolist(), timestamps.tolist())):
             # Initialize tracker for this CAN ID if not exists
-            if can_id not in self.trackers:
-                self.trackers[can_id] = DriftTracker(
+            tracker = self.trackers.lookup(can_id, timestamp)
+            if tracker is None:
+                self.trackers.admit(can_id, timestamp)
+                tracker = make_tracker(
+                    self.engine,
                     q_noise=self.q_noise,
                     r_noise=self.r_noise
                 )
+                self.trackers.put(can_id, tracker, timestamp)
             
             # Update tracker
-            residual, drift = self.trackers[can_id].update_from_can_socket(timestamp)
-            
-            # Classification logic
-            if self.trackers[can_id].update_count < 10:
-                predicted_label = "WARMUP"  # Don't classify during warmup
-            else:
-                res_us = abs(residual) * 1e6
-                predicted_label = "ATTACK" if res_us >= self.threshold_us else "NORMAL"
-            
-            # Store results (skip warmup for metrics)
-            if predicted_label != "WARMUP":
-                predictions.append(predicted_label)
-                ground_truth.append(true_label)
-                
-                self.results.append({
-                    "timestamp": timestamp,
-                    "can_id": f"0x{can_id:03x}",
-                    "ecu_name": row.get('ecu_name', 'Unknown'),
-                    "residual_us": abs(residual) * 1e6,
-                    "drift_ppm": drift * 1e6,
-                    "true_label": true_label,
-                    "predicted_label": predicted_label,
-                    "correct": predicted_label == true_label
-                })
-        
-        # Calculate metrics
-        metrics = self._calculate_metrics(ground_truth, predictions)
-        
-        if verbose:
-            self._print_metrics(metrics)
+            residuals[pos], drifts[pos] = tracker.update_from_can_socket(timestamp)
+            update_counts[pos] = tracker.update_count
         
-        return metrics, pd.DataFrame(self.results)
+        return residuals, drifts, update_counts
     
-    def _calculate_metrics(self, ground_truth, predictions):
-        """Calculate classification metrics."""
-        # Convert to numpy arrays
-        y_true = np.array([1 if label == "ATTACK" else 0 for label in ground_truth])
-        y_pred = np.array([1 if label == "ATTACK" else 0 for label in predictions])
+    def _calculate_metrics(self, y_true, y_pred):
+        """Calculate classification metrics from 0/1 (NORMAL/ATTACK) arrays."""
+        y_true = np.asarray(y_true, dtype=np.int8)
+        y_pred = np.asarray(y_pred, dtype=np.int8)
         
         # Confusion matrix components
         tp = np.sum((y_true == 1) & (y_pred == 1))  # True Positives
@@ -61,13 +61,12 @@ def run_stream(name: str, intervals: np.ndarray, can_id: int) -> dict:
     """Process an interval stream and return classification summary."""
     tracker = DriftTracker(q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE)
     counts = {"PHYSICAL": 0, "ANOMALY": 0, "WARMUP": 0}
-    residuals_us = []
 
-    for interval in intervals:
-        residual, _ = tracker.update(interval)
-        res_us = abs(residual) * 1e6
-        residuals_us.append(res_us)
-        status = classify(res_us, tracker.update_count)
+    residuals, _ = tracker.process_stream(intervals, steady_state=True)
+    residuals_us = np.abs(residuals) * 1e6
+
+    for update_count, res_us in enumerate(residuals_us, start=1):
+        status = classify(res_us, update_count)
         counts[status] += 1
 
     log.info(
@@ -0,0 +1,119 @@
+"""
+Sentinel-T Detection Core
+The tracking and verdict steps shared by the live monitors (live_sentinel)
+and the shard workers (sharding): tracker state bounded by a TrackerTable,
+batch updates keyed by (bus, CAN ID), resync marks for dropped frames and
+vectorized verdicts.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from config import DETECTION_THRESHOLD_US, KALMAN_Q_NOISE, KALMAN_R_NOISE, WARMUP_PACKETS
+from drift_tracker import DriftTrackerBank, make_tracker
+from logger import get_logger
+from tracker_table import TrackerTable
+
+log = get_logger(__name__)
+
+# Per-frame verdicts, as returned by classify()
+STATE_WARMUP = 0
+STATE_PHYSICAL = 1
+STATE_ANOMALY = 2
+STATE_RESYNC = 3
+
+# One ANOMALY verdict, folded into incidents by the AlertManager
+Alert = namedtuple("Alert", ["bus", "can_id", "timestamp_ns", "residual_us", "drift_ppm"])
+
+
+def new_trackers(engine):
+    """
+    Empty tracker state for the engine, bounded by a TrackerTable: one
+    tracker per table entry, or a DriftTrackerBank whose slots it assigns.
+    """
+    if engine == "bank":
+        return DriftTrackerBank(q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE,
+                                table=TrackerTable(pin_batches=True))
+    return TrackerTable()
+
+
+def track_batch(trackers, can_ids, timestamps_ns, engine, bus=None, resync_before_ns=None,
+                ts_sources=None):
+    """
+    Run one received batch through the trackers (see new_trackers()).
+    With bus set, trackers are keyed by (bus, can_id) rather than can_id.
+    resync_before_ns (scalar or per frame): a tracker last updated before
+    it may have lost a frame, so that interval is skipped (resync_ns) and
+    reported with a NaN residual.
+    ts_sources (per frame TS_SOURCE_* codes): an interval whose two stamps
+    come from different clocks (hardware vs. software fallback) is skipped
+    the same way, as its length means nothing.
+    Returns (residuals, drifts, update_counts), aligned with the batch.
+    """
+    if engine == "bank":
+        now = int(timestamps_ns.max()) * 1e-9 if len(timestamps_ns) else None
+        slots = trackers.slots_for(can_ids, bus, now)
+        return trackers.update_batch_from_can_socket_ns(slots, timestamps_ns, resync_before_ns, ts_sources)
+
+    if resync_before_ns is None:
+        marks = [None] * len(can_ids)
+    else:
+        marks = np.broadcast_to(resync_before_ns, can_ids.shape).tolist()
+    sources = [None] * len(can_ids) if ts_sources is None else ts_sources.tolist()
+    residuals, drifts, update_counts = [], [], []
+    for can_id, t_kernel_ns, mark, source in zip(can_ids.tolist(), timestamps_ns.tolist(), marks, sources):
+        key = can_id if bus is None else (bus, can_id)
+        now = t_kernel_ns * 1e-9
+        tracker = trackers.lookup(key, now)
+        if tracker is None:
+            # Unknown IDs may evict the least recently seen unknown ones
+            trackers.admit(key, now)
+            tracker = make_tracker(engine, q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE)
+            trackers.put(key, tracker, now)
+            log.debug("New tracker created for CAN ID 0x%03x on %s", can_id, bus)
+
+        last_ns = getattr(tracker, "last_timestamp_ns", None)
+        last_source = getattr(tracker, "last_ts_source", None)
+        tracker.last_ts_source = source
+        clock_changed = last_source is not None and last_source != source
+        if last_ns is not None and ((mark is not None and last_ns < mark) or clock_changed):
+            # Frames were dropped since this sender was last seen, or its clock changed
+            residual, drift = tracker.resync_ns(t_kernel_ns)
+        else:
+            # Update the specific tracker for this sender
+            residual, drift = tracker.update_from_can_socket_ns(t_kernel_ns)
+        residuals.append(residual)
+        drifts.append(drift)
+        update_counts.append(tracker.update_count)
+    return residuals, drifts, update_counts
+
+
+def resync_marks(bus, batch, drop_marks, log_drops=True):
+    """
+    Per-frame resync thresholds for track_batch(): the latest timestamp on
+    `bus` before which frames are known to have been dropped (kernel queue
+    or receive ring). None while the bus has never lost a frame.
+    """
+    dropped = batch.dropped
+    if not dropped.any():
+        return drop_marks.get(bus)
+    if log_drops:
+        report_drops(bus, dropped)
+    marks = np.maximum.accumulate(np.where(dropped > 0, batch.timestamp_ns, drop_marks.get(bus, 0)))
+    drop_marks[bus] = int(marks[-1])
+    return marks
+
+
+def report_drops(bus, dropped):
+    log.warning("%d frames dropped on %s; the intervals they span are skipped", int(dropped.sum()), bus)
+
+
+def classify(residuals, drifts, update_counts):
+    """Vectorized verdicts: (residual µs, drift ppm, STATE_* code) per frame."""
+    residuals = np.asarray(residuals, dtype=np.float64)
+    res_us = np.abs(residuals) * 1e6
+    drift_ppm = np.asarray(drifts, dtype=np.float64) * 1e8
+    states = np.where(res_us < DETECTION_THRESHOLD_US, STATE_PHYSICAL, STATE_ANOMALY)
+    states[np.asarray(update_counts) < WARMUP_PACKETS] = STATE_WARMUP
+    states[np.isnan(residuals)] = STATE_RESYNC  # interval skipped after dropped frames
+    return res_us, drift_ppm, states
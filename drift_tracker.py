@@ -3,6 +3,8 @@ from config import (
     DEFAULT_BASE_INTERVAL,
     KALMAN_Q_NOISE,
     KALMAN_R_NOISE,
+    KALMAN_STEADY_STATE_TOL,
+    TRACKER_ENGINE,
 )
 
 class DriftTracker:
@@ -71,8 +73,53 @@ class DriftTracker:
         self.last_timestamp = timestamp_s
         return self.update(interval)
 
-    def process_stream(self, intervals):
-        """Processes a sequence of intervals and returns tracking history."""
+    def update_from_can_socket_ns(self, timestamp_ns):
+        """
+        Integer-nanosecond variant for SO_TIMESTAMPNS receivers.
+        The delta is taken in exact integer arithmetic before it is turned
+        into seconds, so no precision is lost to epoch-sized floats.
+        """
+        if not hasattr(self, 'last_timestamp_ns'):
+            self.last_timestamp_ns = timestamp_ns
+            return 0.0, 0.0
+
+        interval_ns = timestamp_ns - self.last_timestamp_ns
+        self.last_timestamp_ns = timestamp_ns
+        return self.update(interval_ns * 1e-9)
+
+    def resync_ns(self, timestamp_ns):
+        """
+        Re-anchor on timestamp_ns without scoring the interval that ends
+        there, e.g. because frames were dropped in between and it would
+        look like a doubled period. The filter state is left untouched.
+        Returns (nan, drift): no residual was scored.
+        """
+        self.last_timestamp_ns = timestamp_ns
+        return np.nan, self.x[1, 0]
+
+    def _state(self):
+        return self.x[0, 0], self.x[1, 0]
+
+    def _covariance(self):
+        return self.P[0, 0], self.P[0, 1], self.P[1, 1]
+
+    def _noise(self):
+        return self.Q[0, 0], self.R[0, 0]
+
+    def _set_state(self, phase, drift):
+        self.x = np.array([[phase], [drift]])
+
+    def process_stream(self, intervals, steady_state=False):
+        """
+        Processes a sequence of intervals and returns tracking history.
+
+        With steady_state=True the filter runs exactly until its gain has
+        converged and the rest of the stream is computed as a vectorized
+        fixed-gain recursion (see steady_state_stream).
+        """
+        if steady_state:
+            return steady_state_stream(self, intervals)
+
         residuals = []
         drifts = []
         
@@ -81,4 +128,465 @@ class DriftTracker:
             residuals.append(res)
             drifts.append(drift)
             
-        return np.array(residuals), np.array(drifts)
\ No newline at end of file
+        return np.array(residuals), np.array(drifts)
+
+
+class ScalarDriftTracker:
+    """
+    Allocation-free drop-in for DriftTracker.
+
+    Same 2-state model (F = [[1, 1], [0, 1]], H = [1, 0], Q = q*I, R = r),
+    but the state and the three unique entries of the symmetric covariance
+    are kept as plain floats and the update is written out in closed form.
+    No NumPy arrays are created per frame, which makes this the engine of
+    choice for the live monitor's hot loop.
+    """
+    __slots__ = (
+        "base_interval", "update_count", "last_timestamp", "last_timestamp_ns", "last_ts_source",
+        "q", "r", "phase", "drift", "p00", "p01", "p11",
+    )
+
+    def __init__(self, base_interval=DEFAULT_BASE_INTERVAL, q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE):
+        self.base_interval = base_interval
+        self.update_count = 0
+        self.last_timestamp = None
+        self.last_timestamp_ns = None
+        self.last_ts_source = None
+        self.q = q_noise
+        self.r = r_noise
+
+        # State: [offset, drift]
+        self.phase = 0.0
+        self.drift = 0.0
+
+        # State Covariance (P = I * 0.1), upper triangle only
+        self.p00 = 0.1
+        self.p01 = 0.0
+        self.p11 = 0.1
+
+    def update(self, observed_interval):
+        """Closed-form equivalent of DriftTracker.update."""
+        self.update_count += 1
+        q = self.q
+
+        # 1. Prediction Step (F x, F P F^T + Q)
+        phase_pred = self.phase + self.drift
+        p11 = self.p11
+        p01 = self.p01 + p11
+        p00 = self.p00 + self.p01 + p01 + q
+        p11 += q
+
+        # 2-3. Measurement and Innovation
+        residual = (observed_interval - self.base_interval) - phase_pred
+
+        # 4. Update Step (S is scalar, so no inversion is needed)
+        s = p00 + self.r
+        k0 = p00 / s
+        k1 = p01 / s
+
+        self.phase = phase_pred + k0 * residual
+        self.drift += k1 * residual
+        self.p00 = (1.0 - k0) * p00
+        self.p01 = (1.0 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+        return residual, self.drift
+
+    def update_from_can_socket(self, timestamp_s):
+        """Same contract as DriftTracker.update_from_can_socket."""
+        last = self.last_timestamp
+        self.last_timestamp = timestamp_s
+        if last is None:
+            return 0.0, 0.0
+        return self.update(timestamp_s - last)
+
+    def update_from_can_socket_ns(self, timestamp_ns):
+        """Same contract as DriftTracker.update_from_can_socket_ns."""
+        last = self.last_timestamp_ns
+        self.last_timestamp_ns = timestamp_ns
+        if last is None:
+            return 0.0, 0.0
+        return self.update((timestamp_ns - last) * 1e-9)
+
+    def resync_ns(self, timestamp_ns):
+        """Same contract as DriftTracker.resync_ns."""
+        self.last_timestamp_ns = timestamp_ns
+        return np.nan, self.drift
+
+    def _state(self):
+        return self.phase, self.drift
+
+    def _covariance(self):
+        return self.p00, self.p01, self.p11
+
+    def _noise(self):
+        return self.q, self.r
+
+    def _set_state(self, phase, drift):
+        self.phase = phase
+        self.drift = drift
+
+    def process_stream(self, intervals, steady_state=False):
+        """Processes a sequence of intervals and returns tracking history."""
+        if steady_state:
+            return steady_state_stream(self, intervals)
+
+        n = len(intervals)
+        residuals = np.empty(n)
+        drifts = np.empty(n)
+        update = self.update
+
+        for i, interval in enumerate(intervals):
+            residuals[i], drifts[i] = update(float(interval))
+
+        return residuals, drifts
+
+
+
+def steady_state_stream(tracker, intervals, tol=KALMAN_STEADY_STATE_TOL):
+    """
+    Steady-state fast path for offline streams.
+
+    With fixed Q and R the Kalman gain converges after a few dozen updates.
+    The tracker is stepped exactly until its covariance stops changing (relative
+    change <= tol), after which the filter is the linear recursion
+
+        x_k = A x_{k-1} + K z_k,   A = (I - K H) F
+
+    That recursion is evaluated over the whole remaining array with a
+    log-step prefix scan (x[s:] += A^s x[:-s] for s = 1, 2, 4, ...), stopping
+    as soon as A^s has decayed below machine precision.
+    Returns (residuals, drifts) exactly like process_stream.
+    """
+    z_all = np.asarray(intervals, dtype=np.float64)
+    n = len(z_all)
+    residuals = np.empty(n)
+    drifts = np.empty(n)
+
+    # 1. Exact transient until the covariance (and thus the gain) settles
+    prev = None
+    i = 0
+    while i < n:
+        residuals[i], drifts[i] = tracker.update(float(z_all[i]))
+        i += 1
+        cov = tracker._covariance()
+        if prev is not None and all(abs(c - p) <= tol * abs(c) for c, p in zip(cov, prev)):
+            break
+        prev = cov
+    if i == n:
+        return residuals, drifts
+
+    # 2. Frozen gain from the converged covariance
+    p00, p01, p11 = (float(c) for c in cov)
+    q, r = tracker._noise()
+    pp00 = p00 + 2.0 * p01 + p11 + q
+    pp01 = p01 + p11
+    k0 = pp00 / (pp00 + r)
+    k1 = pp01 / (pp00 + r)
+    A = np.array([[1.0 - k0, 1.0 - k0],
+                  [-k1,      1.0 - k1]])
+
+    # 3. Vectorized recursion over the tail (row vectors: x_k = x_{k-1} A^T + u_k)
+    z = z_all[i:] - tracker.base_interval
+    x = np.empty((n - i, 2))
+    x[:, 0] = k0 * z
+    x[:, 1] = k1 * z
+    x_start = np.array(tracker._state(), dtype=np.float64)
+    x[0] += A @ x_start
+
+    step = A.T
+    shift = 1
+    while shift < len(x):
+        x[shift:] += x[:-shift] @ step
+        step = step @ step
+        shift *= 2
+        if np.abs(step).max() < np.finfo(np.float64).eps:
+            break
+
+    # residual_k = z_k - H F x_{k-1}
+    prev_phase = np.r_[x_start[0], x[:-1, 0]]
+    prev_drift = np.r_[x_start[1], x[:-1, 1]]
+    residuals[i:] = z - (prev_phase + prev_drift)
+    drifts[i:] = x[:, 1]
+
+    tracker._set_state(x[-1, 0], x[-1, 1])
+    tracker.update_count += n - i
+    return residuals, drifts
+
+
+# Marks a bank slot that has not seen an integer-ns timestamp yet
+_NO_TIMESTAMP_NS = np.iinfo(np.int64).min
+
+
+class DriftTrackerBank:
+    """
+    Struct-of-arrays Kalman state for every CAN ID at once.
+
+    Each ID owns a dense slot; phase, drift, the upper triangle of P, the
+    update counter, the last timestamp (and its clock) and the nominal
+    interval live in contiguous NumPy arrays (73 bytes per ID). F, H, Q and R are shared.
+    update_batch() filters many frames in one vectorized pass; frames that
+    hit the same slot are applied in arrival order.
+
+    With a TrackerTable (pin_batches=True) the number of IDs is bounded:
+    slots of evicted IDs are reset and reused, and a refused ID gets slot
+    -1, whose frames are left untracked (reported like a first frame).
+    """
+    _ARRAYS = ("phase", "drift", "p00", "p01", "p11", "update_count",
+               "last_timestamp", "last_timestamp_ns", "last_ts_source", "intervals")
+    _FILL = {"p00": 0.1, "p11": 0.1, "last_timestamp": np.nan, "last_timestamp_ns": _NO_TIMESTAMP_NS}
+
+    def __init__(self, capacity=64, base_interval=DEFAULT_BASE_INTERVAL, q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE,
+                 table=None):
+        self.base_interval = base_interval
+        self.q = q_noise
+        self.r = r_noise
+        self.slots = {}     # CAN ID (or (bus, CAN ID)) -> slot
+        self.ids = []       # slot -> key (None once freed)
+        self.capacity = max(1, capacity)
+        self.table = table
+        self._free = []     # slots freed by eviction, reused first
+
+        self.phase = np.zeros(self.capacity)
+        self.drift = np.zeros(self.capacity)
+        self.p00 = np.full(self.capacity, 0.1)
+        self.p01 = np.zeros(self.capacity)
+        self.p11 = np.full(self.capacity, 0.1)
+        self.update_count = np.zeros(self.capacity, dtype=np.int64)
+        self.last_timestamp = np.full(self.capacity, np.nan)
+        self.last_timestamp_ns = np.full(self.capacity, _NO_TIMESTAMP_NS, dtype=np.int64)
+        self.last_ts_source = np.zeros(self.capacity, dtype=np.uint8)
+        self.intervals = np.full(self.capacity, base_interval)
+
+    def _grow(self):
+        """Double the capacity, keeping existing slots in place."""
+        n = self.capacity
+        self.capacity *= 2
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            fill = self.base_interval if name == "intervals" else self._FILL.get(name, 0)
+            new = np.full(self.capacity, fill, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, can_id):
+        return can_id in self.slots
+
+    def slot(self, can_id, base_interval=None, now=None):
+        """
+        Return the slot for can_id, assigning a fresh one on first sight.
+        now (seconds) feeds the table's idle eviction; -1 if refused.
+        """
+        if self.table is None:
+            slot = self.slots.get(can_id)
+            if slot is not None:
+                return slot
+        else:
+            slot = self.table.lookup(can_id, now)
+            if slot is not None:
+                return slot
+            evicted = self.table.admit(can_id, now)
+            if evicted is None:
+                return -1
+            for key, old in evicted:
+                self._release(key, old)
+
+        if self._free:
+            slot = self._free.pop()
+            self.ids[slot] = can_id
+        else:
+            slot = len(self.ids)
+            if slot == self.capacity:
+                self._grow()
+            self.ids.append(can_id)
+        if base_interval is not None:
+            self.intervals[slot] = base_interval
+        self.slots[can_id] = slot
+        if self.table is not None:
+            self.table.put(can_id, slot, now)
+        return slot
+
+    def _release(self, key, slot):
+        """Reset an evicted key's slot to the initial state and queue it for reuse."""
+        del self.slots[key]
+        self.ids[slot] = None
+        for name in self._ARRAYS:
+            fill = self.base_interval if name == "intervals" else self._FILL.get(name, 0)
+            getattr(self, name)[slot] = fill
+        self._free.append(slot)
+
+    def slots_for(self, can_ids, bus=None, now=None):
+        """
+        Vectorized slot() over an array of CAN IDs. With bus set, slots are
+        keyed by (bus, can_id) so the same ID on two buses is tracked apart.
+        """
+        if self.table is not None:
+            self.table.begin_batch()
+        unique, inverse = np.unique(np.asarray(can_ids), return_inverse=True)
+        if bus is None:
+            keys = [int(can_id) for can_id in unique]
+        else:
+            keys = [(bus, int(can_id)) for can_id in unique]
+        lookup = np.array([self.slot(key, now=now) for key in keys], dtype=np.intp)
+        return lookup[inverse]
+
+    def _waves(self, slots):
+        """
+        Split a batch into waves of unique slots: the k-th frame of every
+        slot goes into wave k, so each wave can be updated in one shot.
+        Frames without a slot (-1) are left out.
+        """
+        tracked = slots >= 0
+        if not tracked.all():
+            valid = np.flatnonzero(tracked)
+            return [valid[wave] for wave in self._waves(slots[valid])]
+        n = len(slots)
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        counts = np.diff(np.r_[starts, n])
+        rank = np.empty(n, dtype=np.intp)
+        rank[order] = np.arange(n) - np.repeat(starts, counts)
+
+        by_rank = np.argsort(rank, kind="stable")
+        bounds = np.cumsum(np.bincount(rank))
+        return np.split(by_rank, bounds[:-1])
+
+    def _step(self, s, observed):
+        """Closed-form Kalman update of unique slots s (see ScalarDriftTracker)."""
+        q = self.q
+        self.update_count[s] += 1
+
+        phase_pred = self.phase[s] + self.drift[s]
+        p11 = self.p11[s]
+        p01_prev = self.p01[s]
+        p01 = p01_prev + p11
+        p00 = self.p00[s] + p01_prev + p01 + q
+        p11 = p11 + q
+
+        residual = (observed - self.intervals[s]) - phase_pred
+
+        s_cov = p00 + self.r
+        k0 = p00 / s_cov
+        k1 = p01 / s_cov
+
+        self.phase[s] = phase_pred + k0 * residual
+        drift = self.drift[s] + k1 * residual
+        self.drift[s] = drift
+        self.p00[s] = (1.0 - k0) * p00
+        self.p01[s] = (1.0 - k0) * p01
+        self.p11[s] = p11 - k1 * p01
+
+        return residual, drift
+
+    def update_batch(self, slots, observed_intervals):
+        """
+        Batch equivalent of DriftTracker.update.
+        Returns (residuals, drifts, update_counts) aligned with the input.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        observed = np.asarray(observed_intervals, dtype=np.float64)
+        residuals = np.zeros(len(slots))
+        drifts = np.zeros(len(slots))
+        counts = np.zeros(len(slots), dtype=np.int64)
+
+        for idx in self._waves(slots):
+            s = slots[idx]
+            residuals[idx], drifts[idx] = self._step(s, observed[idx])
+            counts[idx] = self.update_count[s]
+
+        return residuals, drifts, counts
+
+    def update_batch_from_can_socket(self, slots, timestamps_s):
+        """
+        Batch equivalent of DriftTracker.update_from_can_socket.
+        The first frame seen on a slot only primes its timestamp and reports
+        (0.0, 0.0) with an update count of 0.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        timestamps = np.asarray(timestamps_s, dtype=np.float64)
+        residuals = np.zeros(len(slots))
+        drifts = np.zeros(len(slots))
+        counts = np.zeros(len(slots), dtype=np.int64)
+
+        for idx in self._waves(slots):
+            s = slots[idx]
+            ts = timestamps[idx]
+            last = self.last_timestamp[s]
+            self.last_timestamp[s] = ts
+
+            primed = ~np.isnan(last)
+            idx, s = idx[primed], s[primed]
+            residuals[idx], drifts[idx] = self._step(s, ts[primed] - last[primed])
+            counts[idx] = self.update_count[s]
+
+        return residuals, drifts, counts
+
+    def update_batch_from_can_socket_ns(self, slots, timestamps_ns, resync_before_ns=None, ts_sources=None):
+        """
+        Integer-nanosecond variant of update_batch_from_can_socket.
+        Deltas are taken in int64 before the conversion to seconds.
+
+        resync_before_ns (scalar or per frame) marks intervals that may hide
+        dropped frames: a frame whose slot was last seen before it is only
+        re-anchored (see DriftTracker.resync_ns) and reports a NaN residual
+        with the slot's current drift and update count. With ts_sources
+        (per-frame clock codes), so is a frame stamped by another clock
+        than the slot's previous one.
+        """
+        slots = np.asarray(slots, dtype=np.intp)
+        timestamps = np.asarray(timestamps_ns, dtype=np.int64)
+        residuals = np.zeros(len(slots))
+        drifts = np.zeros(len(slots))
+        counts = np.zeros(len(slots), dtype=np.int64)
+        if resync_before_ns is not None:
+            resync_before_ns = np.broadcast_to(np.asarray(resync_before_ns, dtype=np.int64), slots.shape)
+        if ts_sources is not None:
+            ts_sources = np.asarray(ts_sources, dtype=np.uint8)
+
+        for idx in self._waves(slots):
+            s = slots[idx]
+            ts = timestamps[idx]
+            last = self.last_timestamp_ns[s]
+            self.last_timestamp_ns[s] = ts
+
+            primed = last != _NO_TIMESTAMP_NS
+            if resync_before_ns is not None or ts_sources is not None:
+                skip = np.zeros(len(idx), dtype=bool)
+                if resync_before_ns is not None:
+                    skip |= last < resync_before_ns[idx]
+                if ts_sources is not None:
+                    skip |= self.last_ts_source[s] != ts_sources[idx]
+                    self.last_ts_source[s] = ts_sources[idx]
+                skip &= primed
+                if skip.any():
+                    residuals[idx[skip]] = np.nan
+                    drifts[idx[skip]] = self.drift[s[skip]]
+                    counts[idx[skip]] = self.update_count[s[skip]]
+                    primed &= ~skip
+            idx, s = idx[primed], s[primed]
+            residuals[idx], drifts[idx] = self._step(s, (ts[primed] - last[primed]) * 1e-9)
+            counts[idx] = self.update_count[s]
+
+        return residuals, drifts, counts
+
+
+# Engine name → tracker class, as accepted by make_tracker()
+TRACKER_ENGINES = {
+    "numpy": DriftTracker,
+    "scalar": ScalarDriftTracker,
+}
+
+
+def make_tracker(engine=TRACKER_ENGINE, **kwargs):
+    """Instantiate a per-ID tracker for the named engine ("numpy" or "scalar")."""
+    try:
+        cls = TRACKER_ENGINES[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown tracker engine '{engine}' (expected one of: {', '.join(TRACKER_ENGINES)})"
+        ) from None
+    return cls(**kwargs)
@@ -0,0 +1,182 @@
+"""
+Sentinel-T Receive Ring
+Decouples the socket from detection: a ReceiverThread drains the CAN
+sockets into a preallocated FrameRing, and the detection loop consumes the
+ring in batches. A slow Kalman update, print or alert no longer stalls the
+socket; if detection falls too far behind, the ring counts the frames it
+had to refuse instead of the kernel dropping them unseen.
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+from config import RING_CAPACITY, RECV_BATCH_SIZE
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Records popped from a FrameRing, as parallel arrays; bus indexes the
+# receiver thread's interface list and dropped counts the frames lost on
+# that bus (kernel queue or ring overrun) just before each record
+RingBatch = namedtuple("RingBatch", ["can_id", "timestamp_ns", "ts_source", "bus", "dropped"])
+
+
+class FrameRing:
+    """
+    Single-producer / single-consumer ring of (bus, can_id, timestamp_ns)
+    records in preallocated NumPy arrays.
+
+    No lock is taken: the producer only advances `head` after the records
+    are written and the consumer only advances `tail` after copying them
+    out, and each counter has exactly one writer. When the ring is full,
+    new records are refused and counted in `overruns` (the unread ones
+    are never overwritten); they are also added to the `dropped` count of
+    the next record stored for that bus, so the consumer sees the gap.
+
+    Counters: high_water (largest fill level seen), overruns (records
+    refused), lag (records written but not yet consumed) and max_lag.
+    """
+    # Record columns, one preallocated array each
+    FIELDS = (("can_id", np.uint32), ("timestamp_ns", np.int64), ("ts_source", np.uint8),
+              ("bus", np.uint16), ("dropped", np.uint32))
+
+    def __init__(self, capacity=RING_CAPACITY):
+        # Round up to a power of two so positions wrap with a mask
+        self.capacity = 1 << max(0, int(capacity) - 1).bit_length()
+        self._mask = self.capacity - 1
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+        self._refused = {}  # bus -> records refused since its last stored record
+        self.head = 0       # records written (producer only)
+        self.tail = 0       # records consumed (consumer only)
+        self.high_water = 0
+        self.overruns = 0
+        self.max_lag = 0
+        self._ready = threading.Event()
+
+    @property
+    def lag(self):
+        return self.head - self.tail
+
+    @property
+    def free(self):
+        return self.capacity - (self.head - self.tail)
+
+    def _span(self, start, n):
+        """Index slices covering n positions from start, split at the wrap."""
+        i = start & self._mask
+        first = min(n, self.capacity - i)
+        return (slice(i, i + first), slice(0, n - first))
+
+    def push(self, can_ids, timestamps_ns, ts_source=0, bus=0, dropped=0):
+        """Append a batch (producer side). Returns how many records were stored."""
+        total = n = len(can_ids)
+        head = self.head
+        free = self.capacity - (head - self.tail)
+        # Records refused earlier are reported on the first one stored now
+        refused = self._refused.pop(bus, 0)
+        if n > free:
+            self.overruns += n - free
+            n = free
+        if n == 0:
+            if refused + total:
+                self._refused[bus] = refused + total
+            return 0
+        if n < total:
+            self._refused[bus] = total - n
+
+        src = 0
+        for dst in self._span(head, n):
+            m = dst.stop - dst.start
+            self.can_id[dst] = can_ids[src:src + m]
+            self.timestamp_ns[dst] = timestamps_ns[src:src + m]
+            self.ts_source[dst] = ts_source[src:src + m] if np.ndim(ts_source) else ts_source
+            self.bus[dst] = bus
+            self.dropped[dst] = dropped[src:src + m] if np.ndim(dropped) else dropped
+            src += m
+        if refused:
+            self.dropped[head & self._mask] += refused
+
+        self.head = head + n
+        fill = self.head - self.tail
+        if fill > self.high_water:
+            self.high_water = fill
+        self._ready.set()
+        return n
+
+    def pop(self, max_records=None):
+        """Take up to max_records of the oldest records (consumer side) as a RingBatch of copies."""
+        tail = self.tail
+        available = self.head - tail
+        if available > self.max_lag:
+            self.max_lag = available
+        n = available if max_records is None else min(available, max_records)
+
+        parts = [s for s in self._span(tail, n) if s.stop > s.start]
+        batch = RingBatch(*(np.concatenate([a[s] for s in parts]) if parts else a[:0].copy()
+                            for a in (getattr(self, name) for name, _ in self.FIELDS)))
+        self.tail = tail + n
+        return batch
+
+    def wait(self, timeout=None):
+        """Block until records are available (or timeout); returns True if there are any."""
+        if self.head != self.tail:
+            return True
+        self._ready.clear()
+        # Re-check after clearing so a push in between is not missed
+        if self.head != self.tail:
+            return True
+        self._ready.wait(timeout)
+        return self.head != self.tail
+
+    def wake(self):
+        """Release a consumer blocked in wait(), e.g. when the producer dies."""
+        self._ready.set()
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "written": self.head,
+            "consumed": self.tail,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "high_water": self.high_water,
+            "overruns": self.overruns,
+        }
+
+
+class ReceiverThread(threading.Thread):
+    """
+    Producer thread: drains a MultiBusReceiver into a FrameRing, one
+    receive_batches() round at a time. Unstamped frames are kept; the
+    consumer filters them like any other batch. interfaces[bus] maps the
+    ring's bus index back to the interface name.
+    """
+    def __init__(self, receiver, ring, batch_size=RECV_BATCH_SIZE, poll_s=0.1):
+        super().__init__(name="sentinel-rx", daemon=True)
+        self.receiver = receiver
+        self.ring = ring
+        self.batch_size = batch_size
+        self.poll_s = poll_s
+        self.interfaces = list(receiver.receivers)
+        self._bus_index = {name: i for i, name in enumerate(self.interfaces)}
+        self._stop_event = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                # poll_s bounds how long stop() waits on idle buses
+                for interface, batch in self.receiver.receive_batches(self.batch_size, copy=False,
+                                                                      timeout=self.poll_s):
+                    self.ring.push(batch.can_id, batch.timestamp_ns, batch.ts_source,
+                                   self._bus_index[interface], batch.dropped)
+        except Exception as e:
+            self.error = e
+            log.error("Receiver thread stopped: %s", e)
+            self.ring.wake()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
@@ -0,0 +1,140 @@
+"""
+Sentinel-T Latency Instrumentation
+Per-stage timings of the detection pipeline in fixed-bucket, HDR-style
+histograms: constant memory, O(1) recording, percentiles within ~1.6 %.
+
+Stages, all in nanoseconds:
+- receive:  kernel timestamp -> batch handed to detection (per frame)
+- track:    Kalman updates of one batch (monotonic_ns)
+- classify: verdicts of one batch (monotonic_ns)
+- verdict:  kernel timestamp -> verdict, end to end (per frame)
+
+The receive and verdict stages compare the kernel's software timestamp
+(CLOCK_REALTIME) with time.time_ns(); frames with hardware timestamps run
+on the controller's clock and are left out of those two stages.
+"""
+
+import time
+
+import numpy as np
+
+# Sub-buckets per power of two: 2**_SUB_BITS, so a bucket is at most 1/64 wide
+_SUB_BITS = 6
+_SUB = 1 << _SUB_BITS
+# Values up to 2**_MAX_BITS ns (~18 minutes); larger ones land in the last bucket
+_MAX_BITS = 40
+_BUCKETS = (_MAX_BITS - _SUB_BITS) * _SUB + 2 * _SUB
+
+
+def _bucket(value_ns):
+    """Bucket index of one value: exact below 2*_SUB, then _SUB buckets per octave."""
+    if value_ns < 2 * _SUB:
+        return max(0, value_ns)
+    shift = value_ns.bit_length() - _SUB_BITS - 1
+    return min(_BUCKETS - 1, shift * _SUB + (value_ns >> shift))
+
+
+def _buckets(values_ns):
+    """Vectorized _bucket() over an int64 array."""
+    values = np.maximum(np.asarray(values_ns, dtype=np.int64), 0)
+    # frexp's exponent is the bit length (exact for values below 2**53)
+    shift = np.maximum(np.frexp(values.astype(np.float64))[1] - _SUB_BITS - 1, 0)
+    return np.minimum(shift * _SUB + (values >> shift), _BUCKETS - 1)
+
+
+def _upper_bound(index):
+    """Largest value that falls into bucket index."""
+    if index < 2 * _SUB:
+        return index
+    shift = index // _SUB - 1
+    return ((index - shift * _SUB + 1) << shift) - 1
+
+
+_UPPER_BOUNDS = np.array([_upper_bound(i) for i in range(_BUCKETS)], dtype=np.int64)
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond values with a fixed bucket array."""
+
+    def __init__(self):
+        self.counts = np.zeros(_BUCKETS, dtype=np.int64)
+        self.total = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record(self, value_ns, count=1):
+        self.counts[_bucket(value_ns)] += count
+        self.total += count
+        self.sum_ns += value_ns * count
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def record_many(self, values_ns):
+        if len(values_ns) == 0:
+            return
+        np.add.at(self.counts, _buckets(values_ns), 1)
+        self.total += len(values_ns)
+        self.sum_ns += int(np.sum(values_ns))
+        self.max_ns = max(self.max_ns, int(np.max(values_ns)))
+
+    def percentile(self, q):
+        """Value (ns) at or below which q percent of the recordings fall; 0 when empty."""
+        if self.total == 0:
+            return 0
+        rank = max(1, int(np.ceil(q / 100.0 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(_upper_bound(index), self.max_ns)
+
+    def cumulative(self, bounds_ns):
+        """Recordings at or below each bound (ns), for coarse exported buckets."""
+        cum = np.cumsum(self.counts)
+        return [int(cum[i - 1]) if i else 0 for i in np.searchsorted(_UPPER_BOUNDS, bounds_ns, side="right")]
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+
+class LatencyStats:
+    """
+    One LatencyHistogram per pipeline stage. The monitor holds None instead
+    of a LatencyStats when instrumentation is off, so the disabled cost is
+    one `is not None` check per stage and batch.
+    """
+    STAGES = ("receive", "track", "classify", "verdict")
+
+    def __init__(self, stages=STAGES):
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+
+    def since_kernel(self, stage, timestamps_ns, now_ns=None):
+        """Record the age of every frame (software kernel timestamps, ns) at this stage."""
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        self.histograms[stage].record_many(now_ns - np.asarray(timestamps_ns, dtype=np.int64))
+
+    def elapsed(self, stage, start_ns, frames=1):
+        """Record monotonic_ns() - start_ns once per frame of the batch; returns the end time."""
+        end_ns = time.monotonic_ns()
+        if frames:
+            self.histograms[stage].record(end_ns - start_ns, frames)
+        return end_ns
+
+    def summary(self):
+        """{stage: {count, p50_us, p99_us, p999_us, max_us}}."""
+        return {
+            stage: {
+                "count": h.total,
+                "p50_us": h.percentile(50) / 1e3,
+                "p99_us": h.percentile(99) / 1e3,
+                "p999_us": h.percentile(99.9) / 1e3,
+                "max_us": h.max_ns / 1e3,
+            }
+            for stage, h in self.histograms.items()
+        }
+
+    def report(self, log):
+        for stage, s in self.summary().items():
+            if s["count"]:
+                log.info("Latency %-8s n=%d  p50=%.1f µs  p99=%.1f µs  p99.9=%.1f µs  max=%.1f µs",
+                         stage, s["count"], s["p50_us"], s["p99_us"], s["p999_us"], s["max_us"])
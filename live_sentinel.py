@@ -1,75 +1,467 @@
 import time
-from can_receiver import CANReceiver
-from drift_tracker import DriftTracker
+import asyncio
+import inspect
+import numpy as np
+from can_receiver import AsyncFrameSource, MultiBusReceiver, TS_SOURCE_NAMES, TS_SOURCE_SOFTWARE
+from alert_manager import AlertManager
+from dashboard import Dashboard, STATE_LABELS
+from detection import (
+    STATE_ANOMALY,
+    STATE_PHYSICAL,
+    STATE_RESYNC,
+    Alert,
+    classify,
+    new_trackers,
+    report_drops,
+    resync_marks,
+    track_batch,
+)
+from frame_ring import FrameRing, ReceiverThread, RingBatch
+from latency import LatencyStats
+from metrics import FrameCounters, MetricsServer, render_metrics
+from overload import BacklogEstimator, OverloadController
+from sharding import ShardedDetector
 from logger import get_logger
 from config import (
-    CAN_INTERFACE,
+    CAN_INTERFACES,
     KALMAN_Q_NOISE,
     KALMAN_R_NOISE,
     DETECTION_THRESHOLD_US,
     WARMUP_PACKETS,
+    TRACKER_ENGINE,
+    RECV_BATCH_SIZE,
+    CAN_FILTER_IDS,
+    CAN_CATCH_UNKNOWN_IDS,
+    CAN_HW_TIMESTAMPS,
+    CAN_FD_FRAMES,
+    ALERT_QUEUE_SIZE,
+    RECV_THREAD,
+    DASHBOARD,
+    SHARD_WORKERS,
+    LATENCY_STATS,
+    METRICS_PORT,
+    OVERLOAD_ASYNC_ENTER_LAG,
+    OVERLOAD_ASYNC_EXIT_LAG,
 )
 
 log = get_logger(__name__)
 
-def run_live_monitor(interface=CAN_INTERFACE):
+
+def _report_unknown(bus, can_ids, unknown_seen, dashboard=None):
+    """Frames from IDs outside the monitored list: reported, never tracked."""
+    for can_id in np.unique(can_ids).tolist():
+        if (bus, can_id) not in unknown_seen:
+            unknown_seen.add((bus, can_id))
+            log.warning("UNKNOWN CAN-ID=0x%03x on %s is not in the monitored ID list", can_id, bus)
+    if dashboard is not None:
+        dashboard.record_unknown(len(can_ids))
+        return
+    for can_id in can_ids.tolist():
+        print(f"{bus:<6} | 0x{can_id:03x} | {'-':>10} | {'-':>8} | \033[95mUNKNOWN\033[0m")
+
+
+class _Monitor:
+    """Detection state shared by the blocking, threaded and async monitors."""
+
+    def __init__(self, engine, filter_ids, catch_unknown, dashboard=None, latency=None):
+        self.engine = engine
+        # We initialize trackers per (bus, CAN ID) dynamically, in a bounded table
+        self.trackers = new_trackers(engine)
+        # With catch_unknown the kernel also passes unlisted IDs; split them off
+        self.monitored = (np.array(sorted(filter_ids), dtype=np.uint32)
+                          if filter_ids is not None and catch_unknown else None)
+        self.dashboard = dashboard
+        self.alerts = AlertManager()
+        self.unknown_seen = set()
+        self.ts_sources = {}
+        self.drop_marks = {}
+        # Fed the consumer lag by the threaded and async loops
+        self.overload = OverloadController()
+        # Per-stage timings (a LatencyStats), or None when not instrumented
+        self.latency = latency
+        # Frames per (bus, ID) for the metrics endpoint, or None when it is off
+        self.counters = None
+
+    def process(self, bus, batch):
+        """
+        Track and report one FrameBatch received on `bus`. Anomalies go
+        through the AlertManager; returns the IncidentEvents they caused.
+        """
+        latency = self.latency
+        if self.counters is not None:
+            self.counters.count(bus, batch.can_id)
+        can_ids, timestamps_ns, ts_sources = batch.can_id, batch.timestamp_ns, batch.ts_source
+        resync = resync_marks(bus, batch, self.drop_marks)
+        per_frame = resync is not None and np.ndim(resync) > 0
+
+        # Drop frames the kernel did not timestamp and IDs outside the monitored list
+        keep = self._stamped_known(bus, batch)
+        if not keep.all():
+            can_ids, timestamps_ns, ts_sources = can_ids[keep], timestamps_ns[keep], ts_sources[keep]
+            if per_frame:
+                resync = resync[keep]
+
+        # Under overload, non-critical IDs are only sampled
+        sampled, sample_marks = self.overload.sample(bus, can_ids, timestamps_ns)
+        if sampled is not None:
+            if resync is not None:
+                sample_marks = np.maximum(sample_marks, resync)
+            can_ids, timestamps_ns, resync = can_ids[sampled], timestamps_ns[sampled], sample_marks[sampled]
+            ts_sources = ts_sources[sampled]
+
+        # Kernel-to-verdict ages only make sense on the kernel's software clock
+        wall_clock = latency is not None and (ts_sources == TS_SOURCE_SOFTWARE).any()
+        if wall_clock:
+            software_ns = timestamps_ns[ts_sources == TS_SOURCE_SOFTWARE]
+            latency.since_kernel("receive", software_ns)
+        if latency is not None:
+            start_ns = time.monotonic_ns()
+
+        residuals, drifts, update_counts = track_batch(
+            self.trackers, can_ids, timestamps_ns, self.engine, bus, resync, ts_sources)
+        if latency is not None:
+            start_ns = latency.elapsed("track", start_ns, len(can_ids))
+        res_us, drift_ppm, states = classify(residuals, drifts, update_counts)
+        if latency is not None:
+            latency.elapsed("classify", start_ns, len(can_ids))
+        if wall_clock:
+            latency.since_kernel("verdict", software_ns)
+
+        alerts = [Alert(bus, int(can_ids[i]), int(timestamps_ns[i]), float(res_us[i]), float(drift_ppm[i]))
+                  for i in np.flatnonzero(states == STATE_ANOMALY).tolist()]
+        events = self.alerts.observe(alerts)
+        if len(timestamps_ns):
+            events += self.alerts.expire(bus, int(timestamps_ns.max()))
+
+        if self.dashboard is not None:
+            scored = (states == STATE_PHYSICAL) | (states == STATE_ANOMALY)
+            self.dashboard.record(bus, can_ids, np.where(scored, res_us, np.nan), drift_ppm, states)
+            self.dashboard.maybe_redraw()
+            return events
+
+        # Log to console
+        for can_id, drift, res, state in zip(can_ids.tolist(), drift_ppm.tolist(), res_us.tolist(),
+                                             states.tolist()):
+            error = "-" if state == STATE_RESYNC else f"{res:.2f}"
+            print(f"{bus:<6} | 0x{can_id:03x} | {drift:10.2f} | {error:>8} | {STATE_LABELS[state]}")
+        return events
+
+    def _stamped_known(self, bus, batch):
+        """
+        Report the timestamp clock (hardware vs. software fallback) of each
+        frame on change and unknown IDs; returns the mask of stamped,
+        monitored frames.
+        """
+        if len(batch.can_id) == 0:
+            return np.ones(0, dtype=bool)
+        sources = batch.ts_source
+        changes = int(np.count_nonzero(sources[1:] != sources[:-1]))
+        changes += int(sources[0]) != self.ts_sources.get(bus)
+        if changes:
+            source = self.ts_sources[bus] = int(sources[-1])
+            if changes == 1:
+                log.info("Timestamp source on %s: %s", bus, TS_SOURCE_NAMES[source])
+            else:
+                log.info("Timestamp source on %s switched %d times in one batch, now %s",
+                         bus, changes, TS_SOURCE_NAMES[source])
+        keep = batch.timestamp_ns != 0
+        if self.monitored is not None:
+            unknown = keep & ~np.isin(batch.can_id, self.monitored)
+            if unknown.any():
+                _report_unknown(bus, batch.can_id[unknown], self.unknown_seen, self.dashboard)
+                keep &= ~unknown
+        return keep
+
+    def close(self):
+        """Close the open incidents and log the alert and tracker-table totals."""
+        self.alerts.close_all()
+        self._log_totals()
+        table = self.trackers.table if self.engine == "bank" else self.trackers
+        log.info("Tracker table: %s", ", ".join(f"{k}={v}" for k, v in table.stats().items()))
+        log.info("Overload control: %s", ", ".join(f"{k}={v}" for k, v in self.overload.stats().items()))
+        if self.latency is not None:
+            self.latency.report(log)
+
+    def _log_totals(self):
+        log.info("Alerts: %d anomalous frames in %d incidents (%d folded without an event)",
+                 self.alerts.anomalies, self.alerts.incidents_opened, self.alerts.suppressed)
+
+
+class _ShardedMonitor(_Monitor):
     """
-    Real-time monitoring engine using Kernel Timestamps and 
-    State Space Modeling to detect clock drift.
+    _Monitor that hands tracking to a ShardedDetector: this process only
+    filters frames and merges alerts, the workers own the trackers. There
+    are no per-frame verdicts here, so nothing is printed per frame; the
+    incidents are logged by the AlertManager.
     """
-    log.info("Sentinel-T Live Monitor starting on interface: %s", interface)
-    log.info("Model: Kalman Filter  Q=%.0e  R=%.0e", KALMAN_Q_NOISE, KALMAN_R_NOISE)
+
+    def __init__(self, interfaces, shards, engine, filter_ids, catch_unknown):
+        super().__init__(engine, filter_ids, catch_unknown)
+        self.trackers = None
+        # Workers are fed through rings of their own; their lag is not sampled here
+        self.overload = None
+        self.detector = ShardedDetector(interfaces, shards, engine, alert_manager=self.alerts).start()
+
+    def process(self, bus, batch):
+        if self.counters is not None:
+            self.counters.count(bus, batch.can_id)
+        if batch.dropped.any():
+            report_drops(bus, batch.dropped)
+        keep = self._stamped_known(bus, batch)
+        return self.detector.submit(bus, batch.can_id, batch.timestamp_ns, batch.dropped, keep,
+                                    ts_source=batch.ts_source)
+
+    def close(self):
+        self.detector.close()
+        for worker, stats in enumerate(self.detector.ring_stats):
+            log.info("Shard %d: %s", worker, ", ".join(f"{k}={v}" for k, v in stats.items()))
+        self._log_totals()
+
+
+def _log_rcvbuf(receivers):
+    for receiver in receivers:
+        log.info("%s: receive buffer %d bytes  |  drop counters: %s", receiver.interface,
+                 receiver.rcvbuf, "on" if receiver.rxq_ovfl else "off")
+
+
+def _start_monitor(interfaces, engine, filter_ids, catch_unknown, dashboard, shards=0, latency=False):
+    """
+    Log the monitor settings and print the table header (unless the
+    dashboard draws its own). Returns the _Monitor that processes batches,
+    or a _ShardedMonitor when shards > 0.
+    """
+    stats = LatencyStats() if latency else None
+    log.info("Sentinel-T Live Monitor starting on interfaces: %s", ", ".join(interfaces))
+    log.info("Model: Kalman Filter  Q=%.0e  R=%.0e  engine=%s", KALMAN_Q_NOISE, KALMAN_R_NOISE, engine)
     log.info("Detection threshold: %d µs  |  Warmup: %d packets",
              DETECTION_THRESHOLD_US, WARMUP_PACKETS)
-    print(f"{'ID':<6} | {'Drift (ppm)':<12} | {'Error (us)':<10} | {'Status':<10}")
-    print("-" * 50)
+    if filter_ids is not None:
+        log.info("Kernel ID filter: %d monitored IDs  |  catch unknown: %s",
+                 len(filter_ids), "on" if catch_unknown else "off")
+    if shards > 0:
+        log.info("Sharded detection: %d worker processes  |  per-frame output off", shards)
+        if dashboard:
+            log.warning("The dashboard needs per-frame verdicts and is disabled in sharded mode")
+        return _ShardedMonitor(interfaces, shards, engine, filter_ids, catch_unknown)
+    if dashboard:
+        return _Monitor(engine, filter_ids, catch_unknown, Dashboard(), stats)
+    print(f"{'Bus':<6} | {'ID':<5} | {'Drift (ppm)':<10} | {'Error (us)':<8} | {'Status':<10}")
+    print("-" * 59)
+    return _Monitor(engine, filter_ids, catch_unknown, latency=stats)
+
+
+def _split_by_bus(records, interfaces):
+    """Yield (interface, RingBatch) for each bus present in a popped RingBatch."""
+    buses = np.unique(records.bus)
+    if len(buses) == 1:
+        yield interfaces[buses[0]], records
+        return
+    for bus in buses:
+        sel = records.bus == bus
+        yield interfaces[bus], RingBatch(*(a[sel] for a in records))
+
+
+def _report_ring(ring, reported_overruns):
+    """Warn when the receive ring refused frames since the last report."""
+    if ring.overruns > reported_overruns:
+        log.warning("Receive ring overrun: %d frames dropped in total  (high-water %d/%d, lag %d)",
+                    ring.overruns, ring.high_water, ring.capacity, ring.lag)
+    return ring.overruns
 
+
+def _consume_ring(receiver, batch_size, process, overload=None, ring=None):
+    """
+    Threaded receive loop: a ReceiverThread fills a FrameRing and this
+    thread feeds process(bus, batch) from it. Ring overruns are reported
+    at most once a second. The ring lag left after each pop is fed to the
+    overload controller, if any.
+    """
+    ring = FrameRing() if ring is None else ring
+    rx_thread = ReceiverThread(receiver, ring, batch_size)
+    rx_thread.start()
+    reported_overruns, next_report = 0, time.monotonic() + 1.0
     try:
-        receiver = CANReceiver(interface)
-        # We initialize trackers per CAN ID dynamically
-        trackers = {}
-        
         while True:
-            can_id, data, t_kernel = receiver.receive()
-            
-            if t_kernel == 0.0:
-                continue
-
-            if can_id not in trackers:
-                trackers[can_id] = DriftTracker(q_noise=KALMAN_Q_NOISE, r_noise=KALMAN_R_NOISE)
-                log.debug("New tracker created for CAN ID 0x%03x", can_id)
-            
-            # Update the specific tracker for this sender
-            residual, drift = trackers[can_id].update_from_can_socket(t_kernel)
-            
-            # Metrics
-            drift_ppm = drift * 1e8
-            res_us = abs(residual) * 1e6
-            
-            # Thresholding Logic
-            if trackers[can_id].update_count < WARMUP_PACKETS:
-                status = "\033[93mWARMUP\033[0m"   # Yellow
-            elif res_us < DETECTION_THRESHOLD_US:
-                status = "\033[92mPHYSICAL\033[0m" # Green
-            else:
-                status = "\033[91mANOMALY\033[0m"  # Red
-                log.warning("ANOMALY detected  CAN-ID=0x%03x  residual=%.1f µs", can_id, res_us)
+            if ring.wait(0.5):
+                records = ring.pop(batch_size)
+                if overload is not None:
+                    overload.update(ring.lag)
+                for bus, batch in _split_by_bus(records, rx_thread.interfaces):
+                    process(bus, batch)
+            elif rx_thread.error is not None:
+                raise rx_thread.error
+
+            now = time.monotonic()
+            if now >= next_report:
+                reported_overruns, next_report = _report_ring(ring, reported_overruns), now + 1.0
+    finally:
+        rx_thread.stop(1.0)
+        log.info("Receive ring: %s", ", ".join(f"{k}={v}" for k, v in ring.stats().items()))
+
+
+def run_live_monitor(interfaces=CAN_INTERFACES, engine=TRACKER_ENGINE, batch_size=RECV_BATCH_SIZE,
+                     filter_ids=CAN_FILTER_IDS, catch_unknown=CAN_CATCH_UNKNOWN_IDS,
+                     hw_timestamps=CAN_HW_TIMESTAMPS, fd_frames=CAN_FD_FRAMES,
+                     threaded=RECV_THREAD, dashboard=DASHBOARD, shards=SHARD_WORKERS,
+                     latency=LATENCY_STATS, metrics_port=METRICS_PORT):
+    """
+    Real-time monitoring engine using Kernel Timestamps and 
+    State Space Modeling to detect clock drift.
+
+    interfaces is one bus name or a list of them. All buses are watched from
+    one epoll loop (MultiBusReceiver) and each ECU is tracked per bus, keyed
+    by (interface, CAN ID).
+
+    engine selects the tracker implementation: "scalar" or "numpy" keep one
+    tracker per CAN ID, "bank" filters every ID in one DriftTrackerBank.
+    Frames are pulled batch_size at a time with a single recvmmsg call.
+
+    filter_ids (e.g. config.MONITORED_ECU_IDS) makes the kernel drop every
+    other ID; with catch_unknown those IDs still arrive and are reported as
+    UNKNOWN instead of getting a tracker.
+
+    hw_timestamps requests controller hardware timestamps (SO_TIMESTAMPING);
+    the clock actually in use is logged whenever it changes. fd_frames
+    also accepts CAN FD frames, which are fingerprinted like classic ones.
+
+    threaded moves reception onto a ReceiverThread that fills a FrameRing,
+    so slow detection or printing never stalls the sockets; ring overruns
+    are logged and the ring counters are reported on exit. The ring lag
+    also drives the OverloadController: past OVERLOAD_ENTER_LAG frames,
+    non-critical ECUs are only sampled until detection catches up.
+
+    dashboard replaces the per-frame status lines with a per-ID summary
+    table (see dashboard.Dashboard) redrawn at DASHBOARD_REFRESH_HZ.
 
-            # Log to console
-            print(f"0x{can_id:03x} | {drift_ppm:10.2f} | {res_us:8.2f} | {status}")
+    shards > 0 spreads the trackers over that many worker processes
+    (see sharding.ShardedDetector); only incidents are reported then.
+
+    latency records per-stage timings (see latency.LatencyStats) and logs
+    their p50/p99/p99.9 on exit.
+
+    metrics_port serves Prometheus metrics on METRICS_HOST:metrics_port
+    (see metrics.render_metrics); None disables the endpoint.
+    """
+    if isinstance(interfaces, str):
+        interfaces = [interfaces]
+    monitor = _start_monitor(interfaces, engine, filter_ids, catch_unknown, dashboard, shards, latency)
+
+    try:
+        receiver = MultiBusReceiver(interfaces, filter_ids=filter_ids, catch_unknown=catch_unknown,
+                                    hw_timestamps=hw_timestamps, fd_frames=fd_frames)
+        _log_rcvbuf(receiver.receivers.values())
+        ring = FrameRing() if threaded else None
+        if metrics_port is not None:
+            monitor.counters = FrameCounters()
+            server = MetricsServer(lambda: render_metrics(monitor, receiver, ring), port=metrics_port).start()
+
+        if threaded:
+            _consume_ring(receiver, batch_size, monitor.process, monitor.overload, ring)
+        else:
+            while True:
+                # One batch per ready bus; views into each receiver's buffers
+                for bus, batch in receiver.receive_batches(batch_size, copy=False):
+                    monitor.process(bus, batch)
 
     except KeyboardInterrupt:
         log.info("Monitor stopped by user.")
     except Exception as e:
         log.error("Fatal error: %s", e)
     finally:
+        if 'server' in locals():
+            server.stop()
+        monitor.close()
         if 'receiver' in locals():
+            log.info("Kernel drops: %s", receiver.drop_stats())
             receiver.close()
-            log.info("CAN socket closed.")
+            log.info("CAN sockets closed.")
+
+
+async def _dispatch_alerts(alerts, sinks):
+    """Feed queued IncidentEvents to every sink; sinks may be plain or async callables."""
+    while True:
+        alert = await alerts.get()
+        for sink in sinks:
+            try:
+                result = sink(alert)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                log.error("Alert sink %r failed: %s", sink, e)
+        alerts.task_done()
+
+
+async def run_live_monitor_async(interfaces=CAN_INTERFACES, engine=TRACKER_ENGINE,
+                                 batch_size=RECV_BATCH_SIZE, alert_sinks=(),
+                                 filter_ids=CAN_FILTER_IDS, catch_unknown=CAN_CATCH_UNKNOWN_IDS,
+                                 hw_timestamps=CAN_HW_TIMESTAMPS, fd_frames=CAN_FD_FRAMES,
+                                 receivers=None, alert_queue_size=ALERT_QUEUE_SIZE, dashboard=DASHBOARD,
+                                 latency=LATENCY_STATS, stats=None):
+    """
+    asyncio version of run_live_monitor(), for embedding in an event loop
+    next to other I/O. Frames come from an AsyncFrameSource and are tracked
+    exactly as in the blocking monitor.
+
+    Each IncidentEvent from the AlertManager is put on a bounded queue
+    drained by a separate task that calls alert_sinks (plain or async
+    callables taking one event). A slow sink therefore never holds up
+    reception; if the sinks fall alert_queue_size events behind, new
+    events are dropped and counted.
+
+    receivers replaces the CAN sockets with already open CANReceivers
+    (used by the tests). Runs until cancelled; the cancellation propagates
+    to the caller once the sockets are closed. stats, if given, is a dict
+    kept up to date with the number of "dropped_events".
+    """
+    if isinstance(interfaces, str):
+        interfaces = [interfaces]
+    if receivers is not None:
+        interfaces = [receiver.interface for receiver in receivers]
+    monitor = _start_monitor(interfaces, engine, filter_ids, catch_unknown, dashboard, latency=latency)
+    # The queue bounds what the loop can buffer; the rest waits in the kernel
+    monitor.overload = OverloadController(OVERLOAD_ASYNC_ENTER_LAG, OVERLOAD_ASYNC_EXIT_LAG)
+    backlog = BacklogEstimator()
+    alerts = asyncio.Queue(alert_queue_size)
+    stats = {} if stats is None else stats
+    stats["dropped_events"] = 0
+
+    owned = None
+    if receivers is None:
+        owned = MultiBusReceiver(interfaces, filter_ids=filter_ids, catch_unknown=catch_unknown,
+                                 hw_timestamps=hw_timestamps, fd_frames=fd_frames)
+        receivers = list(owned.receivers.values())
+    _log_rcvbuf(receivers)
+    source = AsyncFrameSource(receivers, batch_size)
+    dispatcher = asyncio.create_task(_dispatch_alerts(alerts, list(alert_sinks)))
+    try:
+        async for bus, batch in source:
+            # Frames queued behind this batch, or the estimated backlog including
+            # the socket buffer (software kernel timestamps only)
+            stamped = batch.timestamp_ns[batch.ts_source == TS_SOURCE_SOFTWARE]
+            monitor.overload.update(max(source.pending_frames, backlog.update(stamped)))
+            for event in monitor.process(bus, batch):
+                try:
+                    alerts.put_nowait(event)
+                except asyncio.QueueFull:
+                    stats["dropped_events"] += 1
+                    dropped = stats["dropped_events"]
+                    if dropped == 1 or dropped % 1000 == 0:
+                        log.warning("Alert sinks are behind; %d events dropped", dropped)
+    except asyncio.CancelledError:
+        log.info("Monitor stopped.")
+        raise
+    finally:
+        source.close()
+        dispatcher.cancel()
+        monitor.close()
+        log.info("Kernel drops: %s", {r.interface: r.kernel_drops for r in receivers})
+        if owned is not None:
+            owned.close()
+            log.info("CAN sockets closed.")
 
 if __name__ == "__main__":
     # Note: Requires vcan0 to be set up:
     # sudo modprobe vcan
     # sudo ip link add dev vcan0 type vcan
     # sudo ip link set up vcan0
-    run_live_monitor(CAN_INTERFACE)
+    run_live_monitor(CAN_INTERFACES)
@@ -2,12 +2,21 @@
 Sentinel-T Structured Logger
 Writes both to the console (coloured) and to a rotating log file.
 Import this module and call get_logger(__name__) in any module.
+
+Loggers only put records on a bounded queue; one background QueueListener
+thread formats them and does the console and file I/O (including
+rollover), so a burst of alerts never stalls the detection loop. When the
+queue is full, records are dropped and counted instead of blocking.
 """
 
+import atexit
 import logging
 import logging.handlers
+import os
+import queue
 import sys
-from config import LOG_FILE, LOG_LEVEL
+import time
+from config import LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE
 
 _LEVEL_MAP = {
     "DEBUG":   logging.DEBUG,
@@ -16,6 +25,9 @@ _LEVEL_MAP = {
     "ERROR":   logging.ERROR,
 }
 
+_FMT = "%(asctime)s [%(name)s] %(levelname)s %(message)s"
+_DATEFMT = "%Y-%m-%dT%H:%M:%S"
+
 
 class _ColourFormatter(logging.Formatter):
     """ANSI-coloured console formatter."""
@@ -28,14 +40,118 @@ class _ColourFormatter(logging.Formatter):
     _RESET = "\033[0m"
 
     def format(self, record: logging.LogRecord) -> str:
+        # Colour a copy: the file handler formats the same record
+        record = logging.makeLogRecord(record.__dict__)
         colour = self._COLOURS.get(record.levelno, "")
         record.levelname = f"{colour}{record.levelname}{self._RESET}"
         return super().format(record)
 
 
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts records it cannot enqueue instead of blocking or raising."""
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    """Writer thread: also reports how many records were dropped since the last report."""
+
+    def __init__(self, log_queue, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self._reported = 0
+
+    def handle(self, record):
+        super().handle(record)
+        dropped = _dropped
+        if dropped > self._reported and self.queue.empty():
+            super().handle(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "Log queue full: %d records dropped so far", "args": (dropped,),
+            }))
+            self._reported = dropped
+
+    def enqueue_sentinel(self):
+        # Wait for room: the stop marker must not be dropped
+        self.queue.put(self._sentinel)
+
+
+_queue = None       # bounded record queue shared by every logger
+_listener = None    # background writer
+_sinks = []         # console and file handlers, driven by the listener
+_handlers = []      # one _DroppingQueueHandler per logger
+_dropped = 0        # records refused by a full queue
+
+
+def _start_listener(level):
+    global _queue, _listener
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+
+    # Console handler
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(level)
+    ch.setFormatter(_ColourFormatter(_FMT, _DATEFMT))
+    _sinks.append(ch)
+
+    # Rotating file handler
+    error = None
+    try:
+        fh = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=1_048_576, backupCount=3, encoding="utf-8"
+        )
+        fh.setLevel(level)
+        fh.setFormatter(logging.Formatter(_FMT, _DATEFMT))
+        _sinks.append(fh)
+    except OSError as e:
+        error = e
+
+    _listener = _Listener(_queue, *_sinks)
+    _listener.start()
+    atexit.register(_stop_listener)
+    return error
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _restart_in_child():
+    """A forked process has no writer thread: give it a fresh queue and listener."""
+    global _queue, _listener
+    if _listener is None:
+        return
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    for handler in _handlers:
+        handler.queue = _queue
+    _listener = _Listener(_queue, *_sinks)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def log_stats():
+    """Records waiting for the writer thread and records dropped on a full queue."""
+    return {"queued": _queue.qsize() if _queue is not None else 0, "dropped": _dropped}
+
+
+def flush_logs(timeout=1.0):
+    """Wait (up to timeout seconds) until the writer thread has emitted every queued record."""
+    deadline = time.monotonic() + timeout
+    while _queue is not None and _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
 def get_logger(name: str) -> logging.Logger:
     """
-    Return a named logger configured with:
+    Return a named logger whose records go through the shared queue to:
     - A coloured StreamHandler (stdout)
     - A RotatingFileHandler writing to LOG_FILE (max 1 MB, 3 backups)
     """
@@ -48,24 +164,13 @@ def get_logger(name: str) -> logging.Logger:
     level = _LEVEL_MAP.get(LOG_LEVEL.upper(), logging.INFO)
     logger.setLevel(level)
 
-    fmt = "%(asctime)s [%(name)s] %(levelname)s %(message)s"
-    datefmt = "%Y-%m-%dT%H:%M:%S"
-
-    # Console handler
-    ch = logging.StreamHandler(sys.stdout)
-    ch.setLevel(level)
-    ch.setFormatter(_ColourFormatter(fmt, datefmt))
-    logger.addHandler(ch)
+    error = _start_listener(level) if _listener is None else None
+    handler = _DroppingQueueHandler(_queue)
+    handler.setLevel(level)
+    _handlers.append(handler)
+    logger.addHandler(handler)
 
-    # Rotating file handler
-    try:
-        fh = logging.handlers.RotatingFileHandler(
-            LOG_FILE, maxBytes=1_048_576, backupCount=3, encoding="utf-8"
-        )
-        fh.setLevel(level)
-        fh.setFormatter(logging.Formatter(fmt, datefmt))
-        logger.addHandler(fh)
-    except OSError:
+    if error is not None:
         logger.warning("Could not open log file '%s'; file logging disabled.", LOG_FILE)
 
     return logger
@@ -0,0 +1,145 @@
+"""
+Columnar CAN Message Batches
+Generated and replayed datasets as parallel NumPy arrays instead of one
+dict per message: a float64 timestamp, uint32 CAN ID, uint8 DLC, a
+fixed-width payload and small integer codes for the label and ECU name:
+24 bytes per message, against several hundred as dicts.
+
+Labels and ECU names are categorical: the batch stores an index into
+LABELS / ECU_NAMES (-1 for a name not in the table), and to_frame() turns
+them back into pandas categoricals.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from config import AUTOMOTIVE_ECUS
+
+# Label categories; the code of "ATTACK" is 1, so label == 1 is the ground truth
+LABELS = ("NORMAL", "ATTACK")
+NORMAL, ATTACK = 0, 1
+
+# ECU-name categories: the simulated ECUs, then the attack generators
+ECU_NAMES = tuple(ecu["name"] for ecu in AUTOMOTIVE_ECUS) + ("ATTACKER", "SMART_ATTACKER", "REPLAYER", "FUZZER")
+ECU_CODES = {name: code for code, name in enumerate(ECU_NAMES)}
+
+# Payloads are 8 hex digits (32 bits) of fixed-width ASCII
+PAYLOAD_DTYPE = np.dtype("S8")
+
+# One time-ordered run of messages as parallel arrays; ecu and label are
+# codes into ECU_NAMES and LABELS
+MessageBatch = namedtuple("MessageBatch", ["timestamp", "can_id", "dlc", "data", "ecu", "label"])
+
+_HEX_BYTES = np.array([f"{i:02X}" for i in range(256)], dtype="S2")
+
+
+def hex_payloads(values):
+    """Fixed-width payloads of 32-bit values, as 8 upper-case hex digits (two's complement)."""
+    raw = np.asarray(values, dtype=np.int64).astype(np.uint32).astype(">u4")
+    return _HEX_BYTES[raw.view(np.uint8).reshape(-1, 4)].view(PAYLOAD_DTYPE).ravel()
+
+
+def make_batch(timestamp, can_id, data, ecu, label, dlc=8):
+    """MessageBatch over the given timestamps; scalar columns are broadcast."""
+    timestamp = np.asarray(timestamp, dtype=np.float64)
+    n = len(timestamp)
+
+    def column(value, dtype):
+        return np.broadcast_to(np.asarray(value, dtype=dtype), (n,)).copy()
+
+    ecu = ECU_CODES.get(ecu, -1) if isinstance(ecu, str) else ecu
+    label = LABELS.index(label) if isinstance(label, str) else label
+    return MessageBatch(timestamp, column(can_id, np.uint32), column(dlc, np.uint8),
+                        column(data, PAYLOAD_DTYPE), column(ecu, np.int16), column(label, np.int8))
+
+
+def empty_batch():
+    return make_batch(np.empty(0), 0, b"", -1, NORMAL)
+
+
+def take(batch, index):
+    """Rows of batch selected by an index array or mask."""
+    return MessageBatch(*(column[index] for column in batch))
+
+
+def merge_batches(batches):
+    """
+    K-way merge of time-ordered batches into one; equal timestamps keep
+    the order of batches. NumPy's stable argsort is a timsort, which finds
+    the k sorted runs of the concatenation and only merges them: O(n log k)
+    instead of sorting n messages from scratch.
+    """
+    batches = list(batches)
+    if not batches:
+        return empty_batch()
+    if len(batches) == 1:
+        return batches[0]
+    columns = [np.concatenate(column) for column in zip(*batches)]
+    order = np.argsort(columns[0], kind="stable")
+    return MessageBatch(*(column[order] for column in columns))
+
+
+class BatchWriter:
+    """
+    Appends batches to a dataset CSV file (same columns as to_frame()),
+    converting at most chunk_rows messages to a DataFrame at a time.
+    """
+    def __init__(self, path, chunk_rows=100_000):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._file = open(path, "w", newline="", encoding="utf-8")
+
+    def write(self, batch):
+        for start in range(0, len(batch.timestamp), self.chunk_rows):
+            chunk = take(batch, slice(start, start + self.chunk_rows))
+            to_frame(chunk).to_csv(self._file, header=self.rows == 0, index=False)
+            self.rows += len(chunk.timestamp)
+
+    def close(self):
+        if self.rows == 0:
+            to_frame(empty_batch()).to_csv(self._file, index=False)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def to_frame(batch):
+    """DataFrame with the dataset CSV columns: timestamp, can_id, dlc, data, ecu_name, label."""
+    return pd.DataFrame({
+        "timestamp": batch.timestamp,
+        "can_id": batch.can_id,
+        "dlc": batch.dlc,
+        "data": np.char.decode(batch.data, "ascii"),
+        "ecu_name": pd.Categorical.from_codes(batch.ecu, ECU_NAMES),
+        "label": pd.Categorical.from_codes(batch.label, LABELS),
+    })
+
+
+def from_frame(df):
+    """MessageBatch of a dataset DataFrame; missing dlc/data/ecu_name columns get defaults."""
+    n = len(df)
+
+    def codes(name, categories, default):
+        if name not in df:
+            return np.full(n, default, dtype=np.int16)
+        return pd.Categorical(df[name], categories=categories).codes.astype(np.int16)
+
+    return MessageBatch(
+        df["timestamp"].to_numpy(dtype=np.float64),
+        df["can_id"].to_numpy(dtype=np.uint32),
+        df["dlc"].to_numpy(dtype=np.uint8) if "dlc" in df else np.full(n, 8, dtype=np.uint8),
+        df["data"].astype(str).to_numpy(dtype=PAYLOAD_DTYPE) if "data" in df else np.zeros(n, PAYLOAD_DTYPE),
+        codes("ecu_name", ECU_NAMES, -1),
+        codes("label", LABELS, NORMAL).astype(np.int8),
+    )
+
+
+def read_csv(path):
+    """MessageBatch of a dataset CSV file."""
+    return from_frame(pd.read_csv(path, dtype={"data": str}))
@@ -0,0 +1,184 @@
+"""
+Sentinel-T Metrics Endpoint
+Serves the live monitor's state in the Prometheus text format
+(GET /metrics) from a background thread, for headless deployments.
+
+The detection loop only bumps plain counters (FrameCounters, and the
+counters the monitor already keeps); the HTTP thread reads them without
+taking a lock. A scrape may see one batch half-counted, never a blocked
+detection loop. Rates such as frames/s per ID and per bus come from
+rate() over the *_total counters.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from config import METRICS_HOST, METRICS_PORT
+from logger import get_logger, log_stats
+
+log = get_logger(__name__)
+
+# Standard (11-bit) CAN IDs are counted per ID; extended IDs are lumped
+# together so an ID fuzzer cannot grow the label set
+_STANDARD_IDS = 0x800
+
+# Exported latency bucket bounds, seconds
+LATENCY_BUCKETS_S = (10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3,
+                     10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0)
+
+
+class FrameCounters:
+    """Frames received per (bus, CAN ID): one fixed int64 array per bus."""
+
+    def __init__(self):
+        self.per_id = {}        # bus -> counts indexed by standard CAN ID
+        self.extended = {}      # bus -> frames with an extended ID
+
+    def count(self, bus, can_ids):
+        counts = self.per_id.get(bus)
+        if counts is None:
+            counts = self.per_id[bus] = np.zeros(_STANDARD_IDS, dtype=np.int64)
+            self.extended[bus] = 0
+        # Only the IDs present in the batch are touched
+        ids, frames = np.unique(can_ids, return_counts=True)
+        standard = ids < _STANDARD_IDS
+        counts[ids[standard]] += frames[standard]
+        if not standard.all():
+            self.extended[bus] += int(frames[~standard].sum())
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+class _Exposition:
+    """Builds one scrape: HELP/TYPE once per metric, then its samples."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(**labels)} {value}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(monitor, receiver=None, ring=None):
+    """Prometheus text exposition of a live monitor (and its receiver and ring)."""
+    out = _Exposition()
+
+    counters = getattr(monitor, "counters", None)
+    if counters is not None:
+        per_id, per_bus = [], []
+        for bus, counts in list(counters.per_id.items()):
+            counts = counts.copy()
+            extended = counters.extended.get(bus, 0)
+            for can_id in np.flatnonzero(counts).tolist():
+                per_id.append(({"bus": bus, "can_id": f"0x{can_id:03x}"}, int(counts[can_id])))
+            if extended:
+                per_id.append(({"bus": bus, "can_id": "extended"}, extended))
+            per_bus.append(({"bus": bus}, int(counts.sum()) + extended))
+        out.metric("sentinel_frames_total", "counter", "Frames received per bus and CAN ID.", per_id)
+        out.metric("sentinel_bus_frames_total", "counter", "Frames received per bus.", per_bus)
+
+    trackers = monitor.trackers
+    table = getattr(trackers, "table", trackers)
+    if table is not None:
+        stats = table.stats()
+        out.metric("sentinel_trackers", "gauge", "Kalman trackers in the tracker table.",
+                   [({"kind": "protected"}, stats["protected"]), ({"kind": "unknown"}, stats["tracked"])])
+        out.metric("sentinel_tracker_evictions_total", "counter", "Trackers evicted from the table.",
+                   [({}, stats["evicted"])])
+        out.metric("sentinel_id_floods_total", "counter", "Unknown-ID floods detected.", [({}, stats["floods"])])
+
+    alerts = monitor.alerts
+    out.metric("sentinel_anomalies_total", "counter", "Frames classified ANOMALY.", [({}, alerts.anomalies)])
+    out.metric("sentinel_incidents_total", "counter", "Incidents opened.", [({}, alerts.incidents_opened)])
+    out.metric("sentinel_incidents_open", "gauge", "Incidents currently open.", [({}, len(alerts.active))])
+    out.metric("sentinel_unknown_ids", "gauge", "Distinct unmonitored (bus, CAN ID) pairs seen.",
+               [({}, len(monitor.unknown_seen))])
+
+    latency = monitor.latency
+    if latency is not None:
+        name = "sentinel_stage_latency_seconds"
+        out.lines += [f"# HELP {name} Pipeline latency per stage.", f"# TYPE {name} histogram"]
+        for stage, h in latency.histograms.items():
+            bounds = [int(b * 1e9) for b in LATENCY_BUCKETS_S]
+            for le, count in zip(LATENCY_BUCKETS_S, h.cumulative(bounds)):
+                out.lines.append(f'{name}_bucket{_labels(stage=stage, le=repr(le))} {count}')
+            out.lines.append(f'{name}_bucket{_labels(stage=stage, le="+Inf")} {h.total}')
+            out.lines.append(f"{name}_sum{_labels(stage=stage)} {h.sum_ns / 1e9}")
+            out.lines.append(f"{name}_count{_labels(stage=stage)} {h.total}")
+        out.metric("sentinel_stage_latency_quantile_seconds", "gauge",
+                   "Latency percentiles per stage, from the full-resolution histograms.",
+                   [({"stage": stage, "quantile": q}, h.percentile(q * 100) / 1e9)
+                    for stage, h in latency.histograms.items() for q in (0.5, 0.99, 0.999)])
+
+    if receiver is not None:
+        out.metric("sentinel_kernel_drops_total", "counter", "Frames dropped by the kernel socket queue.",
+                   [({"bus": bus}, drops) for bus, drops in receiver.drop_stats().items()])
+
+    if ring is not None:
+        out.metric("sentinel_ring_lag", "gauge", "Frames received but not yet processed.", [({}, ring.lag)])
+        out.metric("sentinel_ring_max_lag", "gauge", "Largest lag seen.", [({}, ring.max_lag)])
+        out.metric("sentinel_ring_overruns_total", "counter", "Frames refused by the full receive ring.",
+                   [({}, ring.overruns)])
+
+    overload = monitor.overload
+    if overload is not None:
+        out.metric("sentinel_degraded", "gauge", "1 while non-critical IDs are sampled.",
+                   [({}, int(overload.degraded))])
+        out.metric("sentinel_overload_skipped_frames_total", "counter",
+                   "Non-critical frames not tracked in degraded mode.", [({}, overload.skipped_frames)])
+
+    out.metric("sentinel_log_dropped_total", "counter", "Log records dropped on a full log queue.",
+               [({}, log_stats()["dropped"])])
+    return out.text()
+
+
+class MetricsServer:
+    """
+    GET /metrics on host:port from a daemon thread; `render` is called per
+    scrape and returns the exposition text. port=0 picks a free port
+    (see .port).
+    """
+    def __init__(self, render, host=METRICS_HOST, port=METRICS_PORT):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = render().encode()
+                except Exception as e:
+                    log.error("Metrics rendering failed: %s", e)
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="sentinel-metrics",
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+        log.info("Metrics endpoint: http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
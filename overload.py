@@ -0,0 +1,154 @@
+"""
+Sentinel-T Overload Control
+Keeps detection bounded when frames arrive faster than they can be
+scored. The controller watches the consumer lag (frames received but not
+yet processed); above OVERLOAD_ENTER_LAG it enters degraded mode, in which
+non-critical ECUs are only sampled while critical ones (steering, ABS)
+keep full fidelity. It leaves once the lag is back under
+OVERLOAD_EXIT_LAG. Both transitions are logged.
+"""
+
+import time
+
+import numpy as np
+from config import (
+    NON_CRITICAL_ECU_IDS,
+    OVERLOAD_ENTER_LAG,
+    OVERLOAD_EXIT_LAG,
+    OVERLOAD_HOLD_S,
+    OVERLOAD_SAMPLE_EVERY,
+)
+from logger import get_logger
+
+log = get_logger(__name__)
+
+
+class OverloadController:
+    """
+    Lag-driven switch between full-rate and degraded scoring.
+
+    update(lag) is fed the consumer lag after each batch; it enters
+    degraded mode at enter_lag and leaves at exit_lag, but not before
+    hold_s has passed, so a lag hovering around a threshold does not flap.
+
+    sample() picks the frames to track. In degraded mode each low-priority
+    (bus, CAN ID) keeps 2 consecutive frames out of every sample_every: the
+    first re-anchors its tracker (like a dropped frame, via the resync
+    marks) and the second is scored, so the drift estimate carries on at a
+    fraction of the cost. The first frame after leaving degraded mode is
+    re-anchored the same way.
+    """
+    def __init__(self, enter_lag=OVERLOAD_ENTER_LAG, exit_lag=OVERLOAD_EXIT_LAG, hold_s=OVERLOAD_HOLD_S,
+                 sample_every=OVERLOAD_SAMPLE_EVERY, low_priority=NON_CRITICAL_ECU_IDS):
+        self.enter_lag = enter_lag
+        self.exit_lag = exit_lag
+        self.hold_s = hold_s
+        self.sample_every = max(2, sample_every)
+        self.low_priority = np.array(sorted(low_priority), dtype=np.uint32)
+        self.degraded = False
+        self.episodes = 0
+        self.skipped_frames = 0
+        self.max_lag = 0
+        self._since = None
+        self._episode_skipped = 0
+        self._seen = {}         # (bus, can_id) -> frames seen while degraded
+        self._skipped = set()   # (bus, can_id) whose last frame was not tracked
+
+    def update(self, lag, now=None):
+        """Feed the current consumer lag (frames); returns True while degraded."""
+        now = time.monotonic() if now is None else now
+        self.max_lag = max(self.max_lag, lag)
+        if not self.degraded and lag >= self.enter_lag:
+            self.degraded = True
+            self.episodes += 1
+            self._since = now
+            self._episode_skipped = self.skipped_frames
+            log.warning("OVERLOAD: consumer lag %d frames; non-critical IDs (%s) now tracked "
+                        "2 frames in %d, critical IDs at full rate", lag,
+                        ", ".join(f"0x{can_id:03x}" for can_id in self.low_priority.tolist()),
+                        self.sample_every)
+        elif self.degraded and lag <= self.exit_lag and now - self._since >= self.hold_s:
+            self.degraded = False
+            self._seen.clear()
+            log.warning("Overload cleared after %.1f s (lag %d frames): %d non-critical frames "
+                        "skipped; full-rate scoring resumed", now - self._since, lag,
+                        self.skipped_frames - self._episode_skipped)
+        return self.degraded
+
+    def sample(self, bus, can_ids, timestamps_ns):
+        """
+        Frames of one batch to track. Returns (keep, resync_marks): a mask
+        and per-frame resync thresholds for track_batch() (0 = none), or
+        (None, None) when every frame is tracked as usual.
+        """
+        if not self.degraded and not self._skipped:
+            return None, None
+        low = np.isin(can_ids, self.low_priority)
+        if not low.any():
+            return None, None
+
+        keep = np.ones(len(can_ids), dtype=bool)
+        marks = np.zeros(len(can_ids), dtype=np.int64)
+        for can_id in np.unique(can_ids[low]).tolist():
+            pos = np.flatnonzero(can_ids == can_id)
+            key = (bus, can_id)
+            if self.degraded:
+                k = self._seen.get(key, 0) + np.arange(len(pos))
+                kept = k % self.sample_every < 2
+                self._seen[key] = int(k[-1]) + 1
+            else:
+                kept = np.ones(len(pos), dtype=bool)
+            # A tracked frame right after an untracked one only re-anchors
+            resync = kept & np.r_[key in self._skipped, ~kept[:-1]]
+            marks[pos[resync]] = timestamps_ns[pos[resync]]
+            keep[pos] = kept
+            if kept[-1]:
+                self._skipped.discard(key)
+            else:
+                self._skipped.add(key)
+            self.skipped_frames += int(len(pos) - kept.sum())
+        return keep, marks
+
+    def stats(self):
+        return {
+            "degraded": self.degraded,
+            "episodes": self.episodes,
+            "skipped_frames": self.skipped_frames,
+            "max_lag": self.max_lag,
+        }
+
+
+class BacklogEstimator:
+    """
+    Consumer lag, in frames, for a loop that cannot count its backlog
+    directly, such as the async monitor: once its queue is full, frames wait
+    in the kernel socket buffer. By Little's law the frames received after
+    the oldest one of the batch now being processed are its age (software
+    kernel timestamp against time.time_ns()) times the arrival rate, so the
+    estimate covers the socket buffer too. The rate is a moving average
+    over the kernel timestamps of successive batches.
+    """
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.rate = None        # frames per ns
+        self._newest = None     # newest timestamp the rate was measured to
+        self._frames = 0        # frames since then
+
+    def update(self, timestamps_ns, now_ns=None):
+        """Feed the software kernel timestamps (ns) of one batch; returns the estimated backlog."""
+        if len(timestamps_ns) == 0:
+            return 0
+        newest = int(np.max(timestamps_ns))
+        if self._newest is None:
+            self._newest = newest
+        elif newest > self._newest:
+            rate = (self._frames + len(timestamps_ns)) / (newest - self._newest)
+            self.rate = rate if self.rate is None else self.rate + self.smoothing * (rate - self.rate)
+            self._newest = newest
+            self._frames = 0
+        else:
+            self._frames += len(timestamps_ns)
+        if self.rate is None:
+            return 0
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        return int(max(0, now_ns - int(np.min(timestamps_ns))) * self.rate)
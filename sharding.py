@@ -0,0 +1,349 @@
+"""
+Sentinel-T Sharded Detection
+Spreads the Kalman trackers over worker processes so detection is not
+capped by one core. The reader (parent) hashes every frame's (bus, CAN ID)
+to one of N workers and appends it to that worker's SharedFrameRing, a
+FrameRing laid out in shared memory. Each worker owns the trackers of its
+IDs outright, so no tracker state is shared or locked, and sends only its
+anomalous frames back; the parent merges them in one AlertManager.
+
+Works the same for live buses (run_live_monitor(shards=N)) and for
+offline replay: feed ShardedDetector.submit() recorded timestamps with
+block=True and it applies backpressure instead of dropping.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from alert_manager import AlertManager
+from config import RECV_BATCH_SIZE, SHARD_RING_CAPACITY, SHARD_WORKERS, TRACKER_ENGINE
+from detection import STATE_ANOMALY, Alert, classify, new_trackers, resync_marks, track_batch
+from frame_ring import FrameRing
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Ring counters kept in shared memory, ahead of the record arrays
+_COUNTERS = ("head", "tail", "high_water", "overruns", "max_lag")
+
+# Anomalous frames as shipped from a worker to the parent
+_ANOMALY_DTYPE = np.dtype([("bus", "<u2"), ("can_id", "<u4"), ("timestamp_ns", "<i8"),
+                           ("residual_us", "<f8"), ("drift_ppm", "<f8")])
+
+# Fibonacci hashing multiplier (2**64 / golden ratio)
+_HASH_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _shared_counter(index):
+    def get(self):
+        return int(self._counters[index])
+
+    def set(self, value):
+        self._counters[index] = value
+    return property(get, set)
+
+
+def _published_counter(index):
+    """
+    Like _shared_counter, but every load and store goes through the ring's
+    multiprocessing lock: taking and releasing it are full memory barriers,
+    so the records written before `head` (or read before `tail`) is
+    published are visible to the other process before the new counter is,
+    on weakly ordered CPUs (ARM64) as well as x86.
+    """
+    def get(self):
+        with self._sync:
+            return int(self._counters[index])
+
+    def set(self, value):
+        with self._sync:
+            self._counters[index] = value
+    return property(get, set)
+
+
+def _open_shared_memory(name):
+    """Attach to an existing block without handing it to this process's resource tracker."""
+    shm = shared_memory.SharedMemory(name=name)
+    # Only the creating process may unlink it (Python < 3.13 has no track=False)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _attach_ring(name, capacity, event, sync):
+    ring = SharedFrameRing.__new__(SharedFrameRing)
+    ring._setup(_open_shared_memory(name), capacity, event, sync, owner=False)
+    return ring
+
+
+class SharedFrameRing(FrameRing):
+    """
+    FrameRing whose record arrays and counters live in one SharedMemory
+    block, so a producer and a consumer in different processes can use it.
+    The single-writer rule per counter still holds, but plain stores into
+    shared memory carry no ordering guarantee across processes, so `head`
+    and `tail` are published and read under a multiprocessing.Lock (a
+    memory barrier; the lock is held only for the counter access). The
+    wake-up event is a multiprocessing.Event. Passing the ring to a child
+    process re-attaches it by name; only the creator unlinks it.
+    """
+    head = _published_counter(0)
+    tail = _published_counter(1)
+    high_water = _shared_counter(2)
+    overruns = _shared_counter(3)
+    max_lag = _shared_counter(4)
+
+    def __init__(self, capacity=SHARD_RING_CAPACITY, ctx=None):
+        capacity = 1 << max(0, int(capacity) - 1).bit_length()
+        shm = shared_memory.SharedMemory(create=True, size=self._size(capacity))
+        ctx = ctx or mp
+        self._setup(shm, capacity, ctx.Event(), ctx.Lock(), owner=True)
+        self._counters[:] = 0
+
+    @classmethod
+    def _size(cls, capacity):
+        size = 8 * len(_COUNTERS)
+        for _, dtype in cls.FIELDS:
+            size += -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+        return size
+
+    def _setup(self, shm, capacity, event, sync, owner):
+        self._shm = shm
+        self._owner = owner
+        self._ready = event
+        self._sync = sync
+        self._refused = {}
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._counters = np.ndarray(len(_COUNTERS), dtype=np.int64, buffer=shm.buf)
+        offset = 8 * len(_COUNTERS)
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.ndarray(capacity, dtype=dtype, buffer=shm.buf, offset=offset))
+            offset += -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+
+    def __reduce__(self):
+        return _attach_ring, (self._shm.name, self.capacity, self._ready, self._sync)
+
+    def detach(self):
+        """Drop the views and unmap the block, leaving it in place for other processes."""
+        self._counters = None
+        for name, _ in self.FIELDS:
+            setattr(self, name, None)
+        self._shm.close()
+
+    def close(self):
+        """Detach; the creating process also unlinks the block."""
+        self.detach()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _split_drops(dropped, positions, carry):
+    """
+    Re-attribute a batch's per-frame drop counts to a subset of its frames.
+    A selected frame gets every drop reported since the previous selected
+    one (starting with `carry`); returns (counts for `positions`, drops
+    after the last selected frame, to carry into the next batch).
+    """
+    cum = np.cumsum(dropped, dtype=np.int64)
+    total = int(cum[-1]) if len(cum) else 0
+    if len(positions) == 0:
+        return np.zeros(0, dtype=np.uint32), carry + total
+    at = cum[positions]
+    counts = np.diff(at, prepend=0)
+    counts[0] += carry
+    return counts.astype(np.uint32), total - int(at[-1])
+
+
+def _shard_worker(index, ring, results, stop, interfaces, engine, batch_size):
+    """Worker process: track every frame its ring receives, report anomalies."""
+    trackers = new_trackers(engine)
+    drop_marks = {}
+    try:
+        while True:
+            if not ring.wait(0.05):
+                if stop.is_set():
+                    break
+                continue
+            records = ring.pop(batch_size)
+            for bus_index in np.unique(records.bus).tolist():
+                sel = records.bus == bus_index
+                can_ids, timestamps_ns = records.can_id[sel], records.timestamp_ns[sel]
+                bus = interfaces[bus_index]
+                resync = resync_marks(bus, records._replace(dropped=records.dropped[sel],
+                                                            timestamp_ns=timestamps_ns),
+                                      drop_marks, log_drops=False)
+                residuals, drifts, counts = track_batch(trackers, can_ids, timestamps_ns,
+                                                        engine, bus, resync, records.ts_source[sel])
+                res_us, drift_ppm, states = classify(residuals, drifts, counts)
+                hit = np.flatnonzero(states == STATE_ANOMALY)
+                if len(hit):
+                    anomalies = np.empty(len(hit), dtype=_ANOMALY_DTYPE)
+                    anomalies["bus"] = bus_index
+                    anomalies["can_id"] = can_ids[hit]
+                    anomalies["timestamp_ns"] = timestamps_ns[hit]
+                    anomalies["residual_us"] = res_us[hit]
+                    anomalies["drift_ppm"] = drift_ppm[hit]
+                    results.put(("anomalies", index, anomalies))
+        results.put(("done", index, None))
+    except Exception as e:
+        results.put(("error", index, repr(e)))
+    finally:
+        # A forked worker holds the creator's object, so never unlink here
+        ring.detach()
+
+
+class ShardedDetector:
+    """
+    Parent side of sharded detection: N worker processes, one
+    SharedFrameRing each. submit() hashes frames to workers and returns
+    the IncidentEvents produced by the anomalies merged so far; close()
+    drains the workers and returns the rest.
+
+    Frames of one (bus, CAN ID) always go to the same worker, in order, so
+    every tracker sees its full stream. Drops reported on a bus (kernel
+    queue, receive ring, or a full worker ring) are forwarded to every
+    worker, which skips the intervals they may have split, exactly as the
+    single-process monitor does.
+    """
+    def __init__(self, interfaces, workers=SHARD_WORKERS, engine=TRACKER_ENGINE,
+                 ring_capacity=SHARD_RING_CAPACITY, batch_size=RECV_BATCH_SIZE,
+                 alert_manager=None, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.interfaces = list(interfaces)
+        self._bus_index = {name: i for i, name in enumerate(self.interfaces)}
+        self.workers = max(1, workers)
+        self.alerts = alert_manager if alert_manager is not None else AlertManager()
+        self.rings = [SharedFrameRing(ring_capacity, ctx) for _ in range(self.workers)]
+        self.results = ctx.Queue()
+        self._stop = ctx.Event()
+        self._carry = {}        # (worker, bus index) -> drops not yet forwarded
+        self._running = set()
+        self.errors = []
+        self.processes = [
+            ctx.Process(target=_shard_worker, name=f"sentinel-shard-{i}", daemon=True,
+                        args=(i, ring, self.results, self._stop, self.interfaces, engine, batch_size))
+            for i, ring in enumerate(self.rings)
+        ]
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        self._running = set(range(self.workers))
+        return self
+
+    def shard_of(self, bus_index, can_ids):
+        """Worker index for each frame: a Fibonacci hash of (bus, CAN ID)."""
+        keys = np.asarray(can_ids, dtype=np.uint64) | np.uint64(bus_index << 32)
+        return ((keys * _HASH_MULT) >> np.uint64(32)) % np.uint64(self.workers)
+
+    def submit(self, bus, can_ids, timestamps_ns, dropped=None, keep=None, block=False, ts_source=None):
+        """
+        Dispatch one batch received on `bus`. keep masks out frames that
+        should not be tracked (their drop counts are still forwarded);
+        ts_source gives each frame's timestamp clock (TS_SOURCE_*).
+        With block=True, a full worker ring is waited on (offline replay);
+        otherwise the overflow is refused and counted as dropped frames.
+        Returns the IncidentEvents merged since the last call, including
+        those merged while waiting on a full ring.
+        """
+        events = []
+        bus_index = self._bus_index[bus]
+        shard = self.shard_of(bus_index, can_ids)
+        if keep is not None:
+            shard = np.where(keep, shard, np.uint64(self.workers))
+        for worker, ring in enumerate(self.rings):
+            positions = np.flatnonzero(shard == worker)
+            carry = self._carry.get((worker, bus_index), 0)
+            if dropped is not None:
+                worker_drops, self._carry[(worker, bus_index)] = _split_drops(dropped, positions, carry)
+            else:
+                worker_drops = 0
+            if len(positions) == 0:
+                continue
+            ids, stamps = can_ids[positions], timestamps_ns[positions]
+            sources = ts_source[positions] if ts_source is not None else 0
+            if not block:
+                ring.push(ids, stamps, sources, bus_index, worker_drops)
+                continue
+            drops = np.broadcast_to(worker_drops, ids.shape)
+            sources = np.broadcast_to(sources, ids.shape)
+            start = 0
+            while start < len(ids):
+                n = min(ring.free, len(ids) - start)
+                if n:
+                    ring.push(ids[start:start + n], stamps[start:start + n], sources[start:start + n],
+                              bus_index, drops[start:start + n])
+                    start += n
+                else:
+                    time.sleep(0.0005)
+                    events += self._check_workers()
+
+        events += self.poll()
+        if len(timestamps_ns):
+            events += self.alerts.expire(bus, int(np.max(timestamps_ns)))
+        return events
+
+    def poll(self):
+        """Merge the anomalies the workers have reported so far."""
+        events = []
+        while True:
+            try:
+                kind, worker, payload = self.results.get_nowait()
+            except queue.Empty:
+                return events
+            events += self._handle(kind, worker, payload)
+
+    def _handle(self, kind, worker, payload):
+        if kind == "anomalies":
+            return self.alerts.observe(
+                [Alert(self.interfaces[a["bus"]], int(a["can_id"]), int(a["timestamp_ns"]),
+                       float(a["residual_us"]), float(a["drift_ppm"])) for a in payload])
+        self._running.discard(worker)
+        if kind == "error":
+            self.errors.append((worker, payload))
+            log.error("Shard worker %d failed: %s", worker, payload)
+        return []
+
+    def _check_workers(self):
+        """poll(), raising if a worker has failed; returns the merged IncidentEvents."""
+        events = self.poll()
+        if self.errors:
+            raise RuntimeError(f"Shard worker {self.errors[0][0]} failed: {self.errors[0][1]}")
+        return events
+
+    def stats(self):
+        """Per-worker ring counters (consumed = frames tracked by that worker)."""
+        return [ring.stats() for ring in self.rings]
+
+    def close(self, timeout=10.0):
+        """
+        Let the workers finish what is queued, stop them and release the
+        rings. Returns the remaining IncidentEvents, including the close of
+        every incident still open.
+        """
+        self._stop.set()
+        for ring in self.rings:
+            ring.wake()
+        events = []
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            try:
+                kind, worker, payload = self.results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            events += self._handle(kind, worker, payload)
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        stats = self.stats()
+        for ring in self.rings:
+            ring.close()
+        self.ring_stats = stats
+        return events + self.alerts.close_all()
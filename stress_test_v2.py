@@ -26,8 +26,8 @@ print(f"2. Running Kalman Filters (Receiver Noise = {RECEIVER_JITTER_STD*1e6:.0f
 tracker_attacker = DriftTracker()
 tracker_physical = DriftTracker()
 
-_, drift_attacker = tracker_attacker.process_stream(attacker_data)
-_, drift_physical = tracker_physical.process_stream(physical_data)
+_, drift_attacker = tracker_attacker.process_stream(attacker_data, steady_state=True)
+_, drift_physical = tracker_physical.process_stream(physical_data, steady_state=True)
 
 # --- METRIC: RESIDUAL ERROR (How confused is the filter?) ---
 # We calculate the standard deviation of the drift estimate.
@@ -4,17 +4,59 @@ Pytest unit-test suite for Sentinel-T
 Run with:
     pytest tests/ -v
 """
+import asyncio
+import io
 import numpy as np
 import pytest
+import pandas as pd
+import select
+import socket
+import struct
 import sys
 import os
 
 # Make sure the repo root is on the path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from drift_tracker import DriftTracker
+from drift_tracker import DriftTracker, DriftTrackerBank, ScalarDriftTracker, make_tracker
 from sentinel_generator import SentinelGenerator
+from frame_ring import FrameRing, ReceiverThread
+from alert_manager import AlertManager
+from tracker_table import TrackerTable
+from message_batch import (
+    ATTACK,
+    ECU_NAMES,
+    LABELS,
+    PAYLOAD_DTYPE,
+    BatchWriter,
+    from_frame,
+    hex_payloads,
+    merge_batches,
+    read_csv,
+    take,
+    to_frame,
+)
+from dashboard import Dashboard, STATE_ANOMALY, STATE_PHYSICAL, STATE_RESYNC, STATE_WARMUP
+import can_receiver
+from can_receiver import (
+    CANReceiver,
+    CAN_FRAME,
+    CANFD_FRAME,
+    CAN_FILTER,
+    SOL_CAN_RAW,
+    MultiBusReceiver,
+    AsyncFrameSource,
+    SCM_TIMESTAMPING,
+    SCM_TIMESTAMPING_STRUCT,
+    SOL_SOCKET,
+    TS_SOURCE_HARDWARE,
+    TS_SOURCE_NONE,
+    TS_SOURCE_SOFTWARE,
+    _kernel_stamp,
+    can_filters,
+)
 from config import (
+    MONITORED_ECU_IDS,
     DEFAULT_BASE_INTERVAL,
     KALMAN_Q_NOISE,
     KALMAN_R_NOISE,
@@ -100,6 +142,34 @@ class TestDriftTrackerUpdate:
         assert len(drifts) == 100
 
 
+class TestSteadyStateStream:
+    """The fixed-gain fast path must agree with the exact per-sample filter."""
+
+    @pytest.mark.parametrize("engine", ["numpy", "scalar"])
+    def test_matches_exact_stream(self, engine):
+        intervals = SentinelGenerator(num_samples=5000).generate_real_ecu(receiver_jitter=5e-5)
+        ref_res, ref_drift = make_tracker(engine).process_stream(intervals)
+        res, drift = make_tracker(engine).process_stream(intervals, steady_state=True)
+        assert np.allclose(res, ref_res, rtol=1e-6, atol=1e-10)
+        assert np.allclose(drift, ref_drift, rtol=1e-6, atol=1e-10)
+
+    def test_final_state_matches_exact_stream(self):
+        intervals = SentinelGenerator(num_samples=2000).generate_smart_attacker()
+        ref, fast = DriftTracker(), DriftTracker()
+        ref.process_stream(intervals)
+        fast.process_stream(intervals, steady_state=True)
+        assert fast.update_count == ref.update_count == 2000
+        assert np.allclose(fast.x, ref.x, rtol=1e-6, atol=1e-12)
+        # ... and the tracker keeps filtering correctly afterwards
+        assert np.isclose(fast.update(0.011)[0], ref.update(0.011)[0], rtol=1e-6, atol=1e-10)
+
+    def test_short_stream_stays_exact(self):
+        intervals = np.full(5, DEFAULT_BASE_INTERVAL)
+        ref_res, _ = ScalarDriftTracker().process_stream(intervals)
+        res, _ = ScalarDriftTracker().process_stream(intervals, steady_state=True)
+        assert np.array_equal(res, ref_res)
+
+
 class TestDriftTrackerSocketUpdate:
     def test_first_call_returns_zero(self):
         dt = DriftTracker()
@@ -125,6 +195,1206 @@ class TestDriftTrackerSocketUpdate:
         assert abs(residual) * 1e6 > DETECTION_THRESHOLD_US
 
 
+class TestScalarDriftTracker:
+    """The closed-form engine must track the NumPy reference implementation."""
+
+    def test_matches_numpy_engine_on_real_ecu(self):
+        intervals = SentinelGenerator(num_samples=1000).generate_real_ecu(receiver_jitter=5e-5)
+        ref_res, ref_drift = DriftTracker().process_stream(intervals)
+        res, drift = ScalarDriftTracker().process_stream(intervals)
+        assert np.allclose(res, ref_res, rtol=1e-6, atol=1e-10)
+        assert np.allclose(drift, ref_drift, rtol=1e-6, atol=1e-10)
+
+    def test_covariance_matches_numpy_engine(self):
+        ref, fast = DriftTracker(), ScalarDriftTracker()
+        for interval in SentinelGenerator(num_samples=50).generate_smart_attacker():
+            ref.update(interval)
+            fast.update(interval)
+        assert np.isclose(fast.p00, ref.P[0, 0], rtol=1e-9)
+        assert np.isclose(fast.p01, ref.P[0, 1], rtol=1e-9)
+        assert np.isclose(fast.p11, ref.P[1, 1], rtol=1e-9)
+        assert np.isclose(fast.phase, ref.x[0, 0], rtol=1e-9, atol=1e-18)
+
+    def test_socket_update_matches_numpy_engine(self):
+        ref, fast = DriftTracker(), ScalarDriftTracker()
+        assert fast.update_from_can_socket(1000.0) == (0.0, 0.0)
+        ref.update_from_can_socket(1000.0)
+        ts = 1000.0
+        for _ in range(WARMUP_PACKETS):
+            ts += DEFAULT_BASE_INTERVAL
+            ref_res, _ = ref.update_from_can_socket(ts)
+            res, _ = fast.update_from_can_socket(ts)
+            assert np.isclose(res, ref_res, rtol=1e-6, atol=1e-10)
+        assert fast.update_count == ref.update_count == WARMUP_PACKETS
+
+    def test_has_no_instance_dict(self):
+        assert not hasattr(ScalarDriftTracker(), "__dict__")
+
+    def test_make_tracker_selects_engine(self):
+        assert isinstance(make_tracker("numpy"), DriftTracker)
+        assert isinstance(make_tracker("scalar", r_noise=1e-9), ScalarDriftTracker)
+        with pytest.raises(ValueError):
+            make_tracker("cuda")
+
+
+class TestDriftTrackerBank:
+    """The struct-of-arrays bank must reproduce one tracker per CAN ID."""
+
+    def _interleaved_capture(self, n=3000):
+        rng = np.random.default_rng(7)
+        can_ids = rng.choice([0x100, 0x101, 0x200, 0x300, 0x400], size=n)
+        timestamps = 1000.0 + np.cumsum(rng.normal(0.002, 1e-5, n))
+        return can_ids, timestamps
+
+    def test_slots_are_dense_and_stable(self):
+        bank = DriftTrackerBank(capacity=2)
+        assert [bank.slot(i) for i in (0x300, 0x100, 0x200, 0x100)] == [0, 1, 2, 1]
+        assert len(bank) == 3
+        assert bank.capacity >= 3
+        assert 0x200 in bank and 0x666 not in bank
+
+    def test_batch_matches_per_id_trackers(self):
+        can_ids, timestamps = self._interleaved_capture()
+        bank = DriftTrackerBank(capacity=1)
+        residuals, drifts, counts = bank.update_batch_from_can_socket(
+            bank.slots_for(can_ids), timestamps)
+
+        trackers = {}
+        for i, (can_id, ts) in enumerate(zip(can_ids, timestamps)):
+            tracker = trackers.setdefault(can_id, DriftTracker())
+            ref_res, ref_drift = tracker.update_from_can_socket(ts)
+            assert np.isclose(residuals[i], ref_res, rtol=1e-6, atol=1e-10)
+            assert np.isclose(drifts[i], ref_drift, rtol=1e-6, atol=1e-10)
+            assert counts[i] == tracker.update_count
+
+    def test_split_batches_equal_single_batch(self):
+        can_ids, timestamps = self._interleaved_capture()
+        whole = DriftTrackerBank()
+        expected, _, _ = whole.update_batch_from_can_socket(whole.slots_for(can_ids), timestamps)
+
+        split = DriftTrackerBank()
+        slots = split.slots_for(can_ids)
+        parts = [split.update_batch_from_can_socket(slots[a:b], timestamps[a:b])[0]
+                 for a, b in ((0, 1), (1, 999), (999, len(slots)))]
+        assert np.array_equal(np.concatenate(parts), expected)
+
+    def test_first_frame_primes_slot(self):
+        bank = DriftTrackerBank()
+        slot = bank.slot(0x100)
+        residuals, drifts, counts = bank.update_batch_from_can_socket([slot], [1000.0])
+        assert residuals[0] == 0.0 and drifts[0] == 0.0 and counts[0] == 0
+
+    def test_interval_batch_matches_scalar_engine(self):
+        intervals = SentinelGenerator(num_samples=300).generate_real_ecu()
+        bank = DriftTrackerBank()
+        slot = bank.slot(0x100)
+        residuals, _, counts = bank.update_batch(np.full(len(intervals), slot), intervals)
+        ref, _ = ScalarDriftTracker().process_stream(intervals)
+        assert np.array_equal(residuals, ref)
+        assert counts[-1] == len(intervals)
+
+
+class TestNanosecondTimestamps:
+    EPOCH_NS = 1_712_591_234_567_891_234
+
+    @pytest.mark.parametrize("engine", ["numpy", "scalar"])
+    def test_ns_path_resolves_sub_microsecond_deltas(self, engine):
+        """A 1 ns interval change is lost in epoch-sized floats but not in ints."""
+        tracker = make_tracker(engine)
+        assert tracker.update_from_can_socket_ns(self.EPOCH_NS) == (0.0, 0.0)
+        residual, _ = tracker.update_from_can_socket_ns(self.EPOCH_NS + 10_000_001)
+        assert np.isclose(residual, 10_000_001e-9 - DEFAULT_BASE_INTERVAL, rtol=1e-6)
+
+    def test_ns_path_matches_seconds_path(self):
+        ts_ns = 5_000_000_000 + np.cumsum(np.full(200, 10_000_000) + np.arange(200) % 7)
+        ref, fast = DriftTracker(), ScalarDriftTracker()
+        for t in ts_ns.tolist():
+            ref_res, _ = ref.update_from_can_socket(t / 1e9)
+            res, _ = fast.update_from_can_socket_ns(t)
+            assert np.isclose(res, ref_res, rtol=1e-6, atol=1e-10)
+
+    def test_bank_ns_matches_scalar_ns(self):
+        rng = np.random.default_rng(3)
+        can_ids = rng.choice([0x100, 0x200], size=500)
+        ts_ns = self.EPOCH_NS + np.cumsum(rng.integers(4_990_000, 5_010_000, size=500))
+        bank = DriftTrackerBank()
+        residuals, _, _ = bank.update_batch_from_can_socket_ns(bank.slots_for(can_ids), ts_ns)
+
+        trackers = {}
+        for i, (can_id, t) in enumerate(zip(can_ids.tolist(), ts_ns.tolist())):
+            ref_res, _ = trackers.setdefault(can_id, ScalarDriftTracker()).update_from_can_socket_ns(t)
+            assert residuals[i] == ref_res
+
+
+class TestCANReceiver:
+    """CANReceiver parsing, exercised over an AF_UNIX datagram socketpair."""
+
+    def _pair(self, **kwargs):
+        tx, rx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        return tx, CANReceiver("test0", sock=rx, **kwargs)
+
+    @pytest.mark.parametrize("timestamp_ns", [True, False])
+    def test_receive_ns_returns_integer_kernel_time(self, timestamp_ns):
+        tx, rx = self._pair(timestamp_ns=timestamp_ns)
+        try:
+            tx.send(CAN_FRAME.pack(0x100, 4, b"\xde\xad\xbe\xef"))
+            can_id, data, t_ns = rx.receive_ns()
+        finally:
+            tx.close()
+            rx.close()
+        assert can_id == 0x100
+        assert data == b"\xde\xad\xbe\xef"
+        assert isinstance(t_ns, int) and t_ns > 0
+        if not timestamp_ns:
+            assert t_ns % 1000 == 0
+
+    def test_receive_returns_seconds(self):
+        tx, rx = self._pair()
+        try:
+            tx.send(CAN_FRAME.pack(0x80000123 | socket.CAN_EFF_FLAG, 8, b"12345678"))
+            can_id, data, t_s = rx.receive()
+        finally:
+            tx.close()
+            rx.close()
+        assert can_id == 0x123
+        assert data == b"12345678"
+        assert isinstance(t_s, float) and t_s > 1e9
+
+
+class TestCANReceiverBatch:
+    """receive_batch() must decode recvmmsg batches like receive_ns() does."""
+
+    def _send_frames(self, tx, n):
+        for i in range(n):
+            tx.send(CAN_FRAME.pack(0x100 + i, i % 9, bytes(range(1, 9))))
+
+    @pytest.mark.parametrize("use_recvmmsg", [True, False])
+    def test_batch_decodes_frames_and_timestamps(self, use_recvmmsg, monkeypatch):
+        if not use_recvmmsg:
+            monkeypatch.setattr(can_receiver, "_recvmmsg", False)
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        rx = CANReceiver("test0", sock=rx_sock)
+        try:
+            self._send_frames(tx, 10)
+            first = rx.receive_batch(4)
+            rest = rx.receive_batch(64)
+        finally:
+            tx.close()
+            rx.close()
+
+        assert first.can_id.tolist() == [0x100, 0x101, 0x102, 0x103]
+        assert rest.can_id.tolist() == list(range(0x104, 0x10a))
+        assert rest.dlc.tolist() == [4, 5, 6, 7, 8, 0]
+        assert rest.data.shape == (6, 8)
+        assert rest.data[0, :4].tolist() == [1, 2, 3, 4]
+        stamps = np.concatenate([first.timestamp_ns, rest.timestamp_ns])
+        assert stamps.dtype == np.int64
+        assert np.all(stamps > 0) and np.all(np.diff(stamps) >= 0)
+
+    def test_extended_ids_are_masked(self):
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        rx = CANReceiver("test0", sock=rx_sock)
+        try:
+            tx.send(CAN_FRAME.pack(0x1abcdef0 | socket.CAN_EFF_FLAG, 8, b"12345678"))
+            tx.send(CAN_FRAME.pack(0x7ff, 8, b"12345678"))
+            batch = rx.receive_batch(8)
+        finally:
+            tx.close()
+            rx.close()
+        assert batch.can_id.tolist() == [0x1abcdef0, 0x7ff]
+
+
+class TestCANReceiverZeroCopy:
+    def _pair(self, **kwargs):
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        return tx, CANReceiver("test0", sock=rx_sock, **kwargs)
+
+    def test_receive_view_decodes_in_place(self):
+        tx, rx = self._pair(ring_frames=2)
+        try:
+            for i in range(3):
+                tx.send(CAN_FRAME.pack(0x200 + i, 3, bytes([i] * 8)))
+            frames = [rx.receive_view() for _ in range(3)]
+        finally:
+            tx.close()
+            rx.close()
+
+        can_id, dlc, data, t_ns = frames[1]
+        assert (can_id, dlc) == (0x201, 3)
+        assert isinstance(data, memoryview) and len(data) == 8
+        assert bytes(data[:dlc]) == b"\x01\x01\x01"
+        assert t_ns > 0
+        # A 2-slot ring hands slot 0 out again on the third frame
+        assert bytes(frames[0][2]) == bytes([2] * 8)
+
+    def test_batch_views_are_reused(self):
+        tx, rx = self._pair()
+        try:
+            tx.send(CAN_FRAME.pack(0x300, 8, b"AAAAAAAA"))
+            first = rx.receive_batch(8, copy=False)
+            tx.send(CAN_FRAME.pack(0x301, 8, b"BBBBBBBB"))
+            second = rx.receive_batch(8, copy=False)
+        finally:
+            tx.close()
+            rx.close()
+        assert second.can_id.tolist() == [0x301]
+        assert np.shares_memory(first.data, second.data)
+        assert first.can_id.tolist() == [0x301]
+
+
+class TestHardwareTimestamps:
+    """SO_TIMESTAMPING path; UDP loopback delivers software stamps like vcan."""
+
+    def _udp_pair(self):
+        rx_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rx_sock.bind(("127.0.0.1", 0))
+        tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tx.connect(rx_sock.getsockname())
+        return tx, CANReceiver("test0", sock=rx_sock, hw_timestamps=True)
+
+    def test_hardware_stamp_preferred(self):
+        payload = SCM_TIMESTAMPING_STRUCT.pack(100, 5, 0, 0, 7, 9)
+        assert _kernel_stamp([(SOL_SOCKET, SCM_TIMESTAMPING, payload)]) == (7_000_000_009, TS_SOURCE_HARDWARE)
+
+    def test_software_stamp_fallback(self):
+        payload = SCM_TIMESTAMPING_STRUCT.pack(100, 5, 0, 0, 0, 0)
+        assert _kernel_stamp([(SOL_SOCKET, SCM_TIMESTAMPING, payload)]) == (100_000_000_005, TS_SOURCE_SOFTWARE)
+        assert _kernel_stamp([]) == (0, TS_SOURCE_NONE)
+
+    def test_receive_ns_reports_software_source(self):
+        tx, rx = self._udp_pair()
+        try:
+            tx.send(CAN_FRAME.pack(0x100, 8, b"12345678"))
+            can_id, _, t_ns = rx.receive_ns()
+        finally:
+            tx.close()
+            rx.close()
+        assert can_id == 0x100 and t_ns > 0
+        assert rx.last_timestamp_source == TS_SOURCE_SOFTWARE
+
+    @pytest.mark.parametrize("use_recvmmsg", [True, False])
+    def test_batch_reports_source_per_frame(self, use_recvmmsg, monkeypatch):
+        if not use_recvmmsg:
+            monkeypatch.setattr(can_receiver, "_recvmmsg", False)
+        tx, rx = self._udp_pair()
+        try:
+            for i in range(5):
+                tx.send(CAN_FRAME.pack(0x100 + i, 8, b"12345678"))
+            batch = rx.receive_batch(16)
+        finally:
+            tx.close()
+            rx.close()
+        assert batch.can_id.tolist() == list(range(0x100, 0x105))
+        assert np.all(batch.timestamp_ns > 0)
+        assert np.all(batch.ts_source == TS_SOURCE_SOFTWARE)
+
+
+class _NoCanRawSocket:
+    """Wraps an AF_UNIX socket and accepts the SOL_CAN_RAW options vcan would."""
+
+    def __init__(self, sock):
+        self._sock = sock
+
+    def setsockopt(self, level, option, value):
+        if level != SOL_CAN_RAW:
+            self._sock.setsockopt(level, option, value)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class TestCANFDFrames:
+    def _pair(self):
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        return tx, CANReceiver("test0", sock=_NoCanRawSocket(rx_sock), fd_frames=True)
+
+    def _send_mixed(self, tx):
+        tx.send(CAN_FRAME.pack(0x100, 8, b"classic!"))
+        tx.send(CANFD_FRAME.pack(0x200, 64, 0x01, bytes(range(64))))
+        tx.send(CANFD_FRAME.pack(0x300, 12, 0x01, b"twelve bytes"))
+
+    def test_receive_ns_handles_classic_and_fd(self):
+        tx, rx = self._pair()
+        try:
+            self._send_mixed(tx)
+            frames = [rx.receive_ns() + (rx.last_is_fd,) for _ in range(3)]
+        finally:
+            tx.close()
+            rx.close()
+        assert [(f[0], f[1], f[3]) for f in frames] == [
+            (0x100, b"classic!", False),
+            (0x200, bytes(range(64)), True),
+            (0x300, b"twelve bytes", True),
+        ]
+
+    def test_receive_view_exposes_fd_payload(self):
+        tx, rx = self._pair()
+        try:
+            self._send_mixed(tx)
+            rx.receive_view()
+            can_id, dlc, data, t_ns = rx.receive_view()
+        finally:
+            tx.close()
+            rx.close()
+        assert (can_id, dlc, len(data)) == (0x200, 64, 64)
+        assert bytes(data) == bytes(range(64))
+
+    @pytest.mark.parametrize("use_recvmmsg", [True, False])
+    def test_batch_mixes_classic_and_fd(self, use_recvmmsg, monkeypatch):
+        if not use_recvmmsg:
+            monkeypatch.setattr(can_receiver, "_recvmmsg", False)
+        tx, rx = self._pair()
+        try:
+            self._send_mixed(tx)
+            batch = rx.receive_batch(8)
+        finally:
+            tx.close()
+            rx.close()
+        assert batch.can_id.tolist() == [0x100, 0x200, 0x300]
+        assert batch.dlc.tolist() == [8, 64, 12]
+        assert batch.is_fd.tolist() == [False, True, True]
+        assert batch.data.shape == (3, 64)
+        assert bytes(batch.data[2, :12]) == b"twelve bytes"
+        assert np.all(batch.timestamp_ns > 0)
+
+
+class TestMultiBusReceiver:
+    def _buses(self, names):
+        multi = MultiBusReceiver([])
+        senders = {}
+        for name in names:
+            tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            multi.add(CANReceiver(name, sock=rx_sock))
+            senders[name] = tx
+        return multi, senders
+
+    def test_busy_bus_does_not_starve_the_others(self):
+        multi, tx = self._buses(["can0", "can1", "can2"])
+        try:
+            for i in range(200):
+                tx["can0"].send(CAN_FRAME.pack(0x100, 8, b"floodbus"))
+            tx["can2"].send(CAN_FRAME.pack(0x200, 8, b"quietbus"))
+            batches = dict(multi.receive_batches(16))
+            leftover = dict(multi.receive_batches(16, timeout=0))
+        finally:
+            for sock in tx.values():
+                sock.close()
+            multi.close()
+        assert sorted(batches) == ["can0", "can2"]
+        assert len(batches["can0"].can_id) == 16
+        assert batches["can2"].can_id.tolist() == [0x200]
+        assert sorted(leftover) == ["can0"]
+
+    def test_timeout_with_no_traffic(self):
+        multi, tx = self._buses(["can0"])
+        try:
+            assert multi.receive_batches(timeout=0) == []
+        finally:
+            tx["can0"].close()
+            multi.close()
+
+    def test_duplicate_interface_rejected(self):
+        multi, tx = self._buses(["can0"])
+        extra_tx, extra_rx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dup = CANReceiver("can0", sock=extra_rx)
+        try:
+            with pytest.raises(ValueError):
+                multi.add(dup)
+        finally:
+            dup.close()
+            extra_tx.close()
+            tx["can0"].close()
+            multi.close()
+
+
+class TestAsyncFrameSource:
+    async def _collect(self, source, n_frames):
+        got = []
+        async for interface, batch in source:
+            got.append((interface, batch.can_id.tolist()))
+            if sum(len(ids) for _, ids in got) >= n_frames:
+                break
+        source.close()
+        return got
+
+    def test_async_for_yields_batches_from_every_bus(self):
+        socks = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(2)]
+        receivers = [CANReceiver(f"can{i}", sock=rx) for i, (_, rx) in enumerate(socks)]
+        try:
+            socks[0][0].send(CAN_FRAME.pack(0x100, 8, b"bus zero"))
+            socks[1][0].send(CAN_FRAME.pack(0x200, 8, b"bus one!"))
+            got = asyncio.run(asyncio.wait_for(self._collect(AsyncFrameSource(receivers), 2), 5))
+        finally:
+            for (tx, _), receiver in zip(socks, receivers):
+                tx.close()
+                receiver.close()
+        assert sorted(got) == [("can0", [0x100]), ("can1", [0x200])]
+
+    def test_reading_pauses_when_consumer_lags(self):
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver = CANReceiver("can0", sock=rx_sock)
+
+        async def lagging_consumer():
+            source = AsyncFrameSource(receiver, max_frames=2, max_pending=1)
+            source.start()
+            await asyncio.sleep(0.05)
+            assert source.paused and source.queue.full()
+            return await self._collect(source, 10)
+
+        try:
+            for i in range(10):
+                tx.send(CAN_FRAME.pack(0x100 + i, 8, b"12345678"))
+            got = asyncio.run(asyncio.wait_for(lagging_consumer(), 5))
+        finally:
+            tx.close()
+            receiver.close()
+        assert [can_id for _, ids in got for can_id in ids] == list(range(0x100, 0x10a))
+
+    def test_socket_error_ends_iteration(self, monkeypatch):
+        import errno
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver = CANReceiver("can0", sock=rx_sock)
+        calls = []
+
+        def interface_down(max_frames, copy=True):
+            calls.append(max_frames)
+            raise OSError(errno.ENETDOWN, "Network is down")
+
+        monkeypatch.setattr(receiver, "receive_batch", interface_down)
+
+        async def consume():
+            source = AsyncFrameSource(receiver)
+            try:
+                with pytest.raises(OSError) as raised:
+                    async for _ in source:
+                        pass
+                # The reader was removed: the socket is still readable but never read again
+                await asyncio.sleep(0.05)
+            finally:
+                source.close()
+            return raised.value
+
+        try:
+            tx.send(CAN_FRAME.pack(0x100, 8, b"12345678"))
+            error = asyncio.run(asyncio.wait_for(consume(), 5))
+        finally:
+            tx.close()
+            receiver.close()
+        assert error.errno == errno.ENETDOWN and len(calls) == 1
+
+
+class TestAsyncLiveMonitor:
+    def test_slow_sink_does_not_block_reception(self, monkeypatch, capsys):
+        import detection
+        import live_sentinel
+        # Every frame is an anomaly
+        monkeypatch.setattr(detection, "WARMUP_PACKETS", 0)
+        monkeypatch.setattr(detection, "DETECTION_THRESHOLD_US", -1)
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver = CANReceiver("can0", sock=rx_sock)
+        delivered = []
+        stats = {}
+
+        async def stuck_sink(alert):
+            delivered.append(alert)
+            await asyncio.sleep(3600)
+
+        async def run():
+            monitor = asyncio.create_task(live_sentinel.run_live_monitor_async(
+                receivers=[receiver], alert_sinks=[stuck_sink], alert_queue_size=2, stats=stats))
+            await asyncio.sleep(0.1)
+            monitor.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await monitor
+            return monitor.cancelled()
+
+        try:
+            for _ in range(20):
+                tx.send(CAN_FRAME.pack(0x100, 8, b"12345678"))
+            assert asyncio.run(asyncio.wait_for(run(), 5))
+        finally:
+            tx.close()
+            receiver.close()
+
+        assert capsys.readouterr().out.count("\033[91mANOMALY") == 20
+        assert len(delivered) == 1
+        assert delivered[0].kind == "open" and delivered[0].can_id == 0x100
+        # 20 anomalies make one incident: open + updates at 2, 4, 8 and 16
+        # frames. Two of those five events fit the queue, the rest are dropped
+        assert stats["dropped_events"] == 3
+
+    def test_timeout_propagates_through_the_monitor(self, capsys):
+        import live_sentinel
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver = CANReceiver("can0", sock=rx_sock)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(asyncio.wait_for(live_sentinel.run_live_monitor_async(receivers=[receiver]), 0.1))
+        finally:
+            tx.close()
+            receiver.close()
+        capsys.readouterr()
+
+    def test_backlog_in_socket_buffer_enters_degraded_mode(self, monkeypatch, capsys):
+        import time
+        import live_sentinel
+        monitors = []
+        start_monitor = live_sentinel._start_monitor
+        monkeypatch.setattr(live_sentinel, "_start_monitor",
+                            lambda *args, **kwargs: monitors.append(start_monitor(*args, **kwargs)) or monitors[-1])
+        tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        tx.setblocking(False)
+        receiver = CANReceiver("can0", sock=rx_sock)
+
+        async def run():
+            monitor = asyncio.create_task(live_sentinel.run_live_monitor_async(receivers=[receiver]))
+            await asyncio.sleep(0.2)
+            monitor.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await monitor
+
+        sent = 0
+        try:
+            # A burst that waits in the socket buffer, beyond the async queue's view
+            for i in range(4000):
+                try:
+                    tx.send(CAN_FRAME.pack(0x200 + i % 2, 8, b"12345678"))
+                except BlockingIOError:
+                    break
+                sent += 1
+            time.sleep(0.3)
+            asyncio.run(asyncio.wait_for(run(), 5))
+        finally:
+            tx.close()
+            receiver.close()
+        capsys.readouterr()
+
+        overload = monitors[0].overload
+        assert sent >= 100
+        assert overload.episodes == 1 and overload.max_lag >= live_sentinel.OVERLOAD_ASYNC_ENTER_LAG
+        assert overload.skipped_frames > 0
+
+
+class TestFrameRing:
+    def test_push_pop_wraps_around(self):
+        ring = FrameRing(8)
+        ring.push(np.arange(6, dtype=np.uint32), np.arange(6) * 10)
+        assert ring.pop(4).can_id.tolist() == [0, 1, 2, 3]
+        ring.push(np.arange(6, 12, dtype=np.uint32), np.arange(6, 12) * 10, bus=3)
+        batch = ring.pop()
+        assert batch.can_id.tolist() == list(range(4, 12))
+        assert batch.timestamp_ns.tolist() == list(range(40, 120, 10))
+        assert batch.bus.tolist() == [0, 0, 3, 3, 3, 3, 3, 3]
+        assert ring.lag == 0 and len(ring.pop().can_id) == 0
+
+    def test_full_ring_refuses_new_records(self):
+        ring = FrameRing(5)
+        assert ring.capacity == 8
+        assert ring.push(np.arange(6, dtype=np.uint32), np.ones(6, dtype=np.int64)) == 6
+        assert ring.push(np.arange(6, 10, dtype=np.uint32), np.ones(4, dtype=np.int64)) == 2
+        stats = ring.stats()
+        assert (stats["overruns"], stats["high_water"], stats["lag"]) == (2, 8, 8)
+        # Unread records are kept, the refused ones are not
+        assert ring.pop().can_id.tolist() == list(range(8))
+        assert ring.max_lag == 8
+
+    def test_receiver_thread_fills_ring(self):
+        multi = MultiBusReceiver([])
+        senders = []
+        for name in ("can0", "can1"):
+            tx, rx_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            multi.add(CANReceiver(name, sock=rx_sock))
+            senders.append(tx)
+        ring = FrameRing(64)
+        thread = ReceiverThread(multi, ring, poll_s=0.01)
+        thread.start()
+        try:
+            for i in range(10):
+                senders[i % 2].send(CAN_FRAME.pack(0x100 + i, 8, b"12345678"))
+            records = []
+            while len(records) < 10 and ring.wait(2.0):
+                batch = ring.pop()
+                records += zip(batch.bus.tolist(), batch.can_id.tolist(), batch.timestamp_ns.tolist())
+        finally:
+            thread.stop(2.0)
+            for tx in senders:
+                tx.close()
+            multi.close()
+        assert not thread.is_alive() and thread.error is None
+        assert sorted((bus, can_id) for bus, can_id, _ in records) == sorted(
+            (i % 2, 0x100 + i) for i in range(10))
+        assert all(t_ns > 0 for _, _, t_ns in records)
+        assert thread.interfaces == ["can0", "can1"]
+
+
+class TestKernelDropCounters:
+    """
+    SO_RXQ_OVFL over UDP loopback, where a tiny SO_RCVBUF forces real drops.
+    The kernel reports the counter on frames queued after the loss, so the
+    socket is flooded, drained, and then sent a few more frames.
+    """
+
+    def _receiver(self, **kwargs):
+        rx_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        rx_sock.bind(("127.0.0.1", 0))
+        tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tx.connect(rx_sock.getsockname())
+        return tx, CANReceiver("test0", sock=rx_sock, rcvbuf_bytes=4096, rxq_ovfl=True, **kwargs)
+
+    def _drain(self, rx, read):
+        frames = []
+        while select.select([rx.sock], [], [], 0)[0]:
+            frames += read()
+        return frames
+
+    def _flood_and_drain(self, tx, rx, read):
+        for i in range(400):
+            tx.send(CAN_FRAME.pack(0x100 + i % 4, 8, b"12345678"))
+        flooded = self._drain(rx, read)
+        for i in range(3):
+            tx.send(CAN_FRAME.pack(0x100, 8, b"12345678"))
+        return flooded, self._drain(rx, read)
+
+    @pytest.mark.parametrize("use_recvmmsg", [True, False])
+    @pytest.mark.parametrize("hw_timestamps", [False, True])
+    def test_batch_reports_kernel_drops(self, use_recvmmsg, hw_timestamps, monkeypatch):
+        if not use_recvmmsg:
+            monkeypatch.setattr(can_receiver, "_recvmmsg", False)
+        tx, rx = self._receiver(hw_timestamps=hw_timestamps)
+
+        def read():
+            batch = rx.receive_batch(32)
+            return list(zip(batch.dropped.tolist(), batch.timestamp_ns.tolist()))
+
+        try:
+            assert 4096 <= rx.rcvbuf <= 2 * 4096
+            flooded, after = self._flood_and_drain(tx, rx, read)
+        finally:
+            tx.close()
+            rx.close()
+        assert all(dropped == 0 for dropped, _ in flooded)
+        assert [dropped > 0 for dropped, _ in after] == [True, False, False]
+        assert len(flooded) + after[0][0] == 400
+        assert rx.kernel_drops == after[0][0]
+        assert all(t_ns > 0 for _, t_ns in after)
+
+    def test_receive_ns_reports_last_dropped(self):
+        tx, rx = self._receiver()
+
+        def read():
+            rx.receive_ns()
+            return [rx.last_dropped]
+
+        try:
+            flooded, after = self._flood_and_drain(tx, rx, read)
+        finally:
+            tx.close()
+            rx.close()
+        assert sum(flooded) == 0 and after[1:] == [0, 0]
+        assert after[0] == rx.kernel_drops == 400 - len(flooded)
+
+    def test_ring_overruns_surface_as_dropped(self):
+        ring = FrameRing(4)
+        ring.push(np.arange(6, dtype=np.uint32), np.arange(6, dtype=np.int64), bus=1)
+        ring.pop()
+        ring.push(np.array([9], dtype=np.uint32), np.array([9]), bus=1, dropped=np.array([3]))
+        assert ring.pop().dropped.tolist() == [5]
+
+    @pytest.mark.parametrize("engine", ["bank", "scalar", "numpy"])
+    def test_interval_spanning_a_drop_is_skipped(self, engine):
+        from detection import track_batch
+        trackers = DriftTrackerBank() if engine == "bank" else TrackerTable()
+        ids = np.array([0x100, 0x200] * 6, dtype=np.uint32)
+        ts = 10**18 + np.repeat(np.arange(6, dtype=np.int64), 2) * 10_000_000 + np.tile([0, 5_000], 6)
+        track_batch(trackers, ids[:8], ts[:8], engine, "can0")
+        # Frames went missing between t[8] and t[9]: every interval spanning
+        # that gap is skipped once, for whichever sender it belongs to
+        marks = np.array([0, ts[9], ts[9], ts[9]])
+        residuals, drifts, counts = track_batch(trackers, ids[8:], ts[8:], engine, "can0",
+                                                 resync_before_ns=marks)
+        assert np.isnan(residuals).tolist() == [False, True, True, False]
+        assert list(counts) == [4, 3, 4, 4]
+        assert np.all(np.isfinite(drifts))
+
+
+class TestDashboard:
+    def test_aggregates_per_bus_and_id(self):
+        board = Dashboard(window=4, stream=io.StringIO())
+        ids = np.array([0x100, 0x200, 0x100, 0x100, 0x100, 0x100], dtype=np.uint32)
+        residuals = np.array([np.nan, 5.0, 1.0, 2.0, 3.0, 400.0])
+        states = np.array([STATE_WARMUP, STATE_PHYSICAL, STATE_PHYSICAL, STATE_PHYSICAL,
+                           STATE_PHYSICAL, STATE_ANOMALY])
+        board.record("can0", ids, residuals, np.arange(6.0), states)
+        board.record("can1", ids[:1], np.array([7.0]), np.array([9.0]), states[1:2])
+
+        row = board.slots[("can0", 0x100)]
+        assert board.frames[row] == 5 and board.anomalies[row] == 1
+        assert board.drift_ppm[row] == 5.0 and board.state[row] == STATE_ANOMALY
+        # Window of 4 keeps the latest scored residuals only
+        assert sorted(board.residuals_us[row].tolist()) == [1.0, 2.0, 3.0, 400.0]
+        assert board.frames[board.slots[("can1", 0x100)]] == 1
+
+    def test_redraw_is_rate_limited(self):
+        out = io.StringIO()
+        board = Dashboard(refresh_hz=5, stream=out)
+        ids = np.full(50, 0x100, dtype=np.uint32)
+        board.record("can0", ids, np.full(50, 10.0), np.zeros(50), np.full(50, STATE_PHYSICAL))
+        assert board.maybe_redraw(now=100.0)
+        board.record("can0", ids, np.full(50, 10.0), np.zeros(50), np.full(50, STATE_PHYSICAL))
+        assert not board.maybe_redraw(now=100.1)
+        assert out.getvalue().count("\033[H") == 1
+        table = board.render(now=100.5)
+        line = next(l for l in table.splitlines() if l.startswith("can0"))
+        # 50 frames in the 0.5 s since the last redraw; p50 = p99 = 10 µs
+        assert "100.0" in line and "10.00" in line
+        assert board.maybe_redraw(now=100.5)
+
+    def test_id_flood_keeps_rows_bounded(self):
+        board = Dashboard(stream=io.StringIO(), max_rows=32)
+        rng = np.random.default_rng(3)
+        board.record("can0", np.array([0x100], dtype=np.uint32), np.array([1.0]), np.zeros(1),
+                     np.array([STATE_PHYSICAL]))
+        for _ in range(50):
+            ids = rng.integers(0x200, 1 << 29, 40).astype(np.uint32)
+            n = len(ids)
+            board.record("can0", ids, np.full(n, 2.0), np.zeros(n), np.full(n, STATE_PHYSICAL))
+        assert len(board.slots) == len(board.keys) == 32
+        assert board.capacity == 32 and board.residuals_us.shape[0] == 32
+        assert board.evicted > 0 and ("can0", 0x100) not in board.slots
+        # Recycled rows start from scratch
+        assert board.frames.sum() == 32
+        assert board.render(now=1.0).count("\ncan0") == 32
+
+    def test_classify_states(self):
+        from detection import classify
+        res_us, drift_ppm, states = classify(
+            [0.0, 1e-6, 1e-3, np.nan], [1e-8, 0.0, 0.0, 0.0], [0, 50, 50, 50])
+        assert states.tolist() == [STATE_WARMUP, STATE_PHYSICAL, STATE_ANOMALY, STATE_RESYNC]
+        assert drift_ppm[0] == pytest.approx(1.0) and res_us[2] == pytest.approx(1000.0)
+
+
+class TestAlertManager:
+    def _alert(self, t_s, residual_us=500.0, can_id=0x100, bus="can0"):
+        from detection import Alert
+        return Alert(bus, can_id, int(t_s * 1e9), residual_us, 1.0)
+
+    def test_sustained_attack_is_one_bounded_incident(self):
+        manager = AlertManager(quiet_period_s=1.0, max_events=5)
+        # 3000 anomalies at 100 Hz: a 30 s injection
+        events = manager.observe([self._alert(i * 0.01, residual_us=500.0 + i % 7) for i in range(3000)])
+        events += manager.expire("can0", int(31.0 * 1e9))
+        assert [e.kind for e in events] == ["open", "update", "update", "update", "close"]
+        assert [e.frames for e in events[1:4]] == [2, 4, 8]
+        close = events[-1]
+        assert close.frames == 3000 and close.peak_residual_us == 506.0
+        assert (close.last_ns - close.opened_ns) == int(29.99 * 1e9)
+        assert not manager.active and len(manager.closed) == 1
+        assert manager.suppressed == 3000 - 4
+
+    def test_quiet_period_separates_episodes_and_ids(self):
+        manager = AlertManager(quiet_period_s=1.0, max_events=8)
+        events = manager.observe([self._alert(0.0), self._alert(0.5),
+                                  self._alert(0.6, can_id=0x200), self._alert(5.0)])
+        assert [(e.kind, e.incident_id, e.can_id) for e in events] == [
+            ("open", 1, 0x100), ("update", 1, 0x100), ("open", 2, 0x200),
+            ("close", 1, 0x100), ("open", 3, 0x100)]
+        # Another bus's clock does not close can0 incidents
+        assert manager.expire("can1", int(60 * 1e9)) == []
+        assert sorted(e.incident_id for e in manager.close_all()) == [2, 3]
+
+
+class TestTrackerTable:
+    def test_lru_eviction_spares_known_ids(self):
+        table = TrackerTable(capacity=3, idle_s=None, protected=[0x100])
+        for t, key in enumerate([0x100, 0x700, 0x701, 0x702]):
+            assert table.admit(key, float(t)) == []
+            table.put(key, f"tracker-{key:x}", float(t))
+        table.lookup(0x700, 4.0)            # 0x701 is now least recently seen
+        assert table.admit(0x703, 5.0) == [(0x701, "tracker-701")]
+        table.put(0x703, "tracker-703", 5.0)
+        assert sorted(table) == [0x100, 0x700, 0x702, 0x703]
+        assert table.lookup(0x100) == "tracker-100" and table.evicted == 1
+
+    def test_idle_entries_are_freed(self):
+        table = TrackerTable(capacity=10, idle_s=5.0, protected=[])
+        for key, t in ((("can0", 0x700), 0.0), (("can0", 0x701), 4.0)):
+            table.admit(key, t)
+            table.put(key, object(), t)
+        table.admit(("can0", 0x702), 7.0)
+        assert ("can0", 0x700) not in table and ("can0", 0x701) in table
+
+    def test_fuzzer_is_bounded_and_raises_one_flood(self):
+        from detection import track_batch
+        table = TrackerTable(capacity=32, protected=[0x100], flood_threshold=20, flood_window_s=1.0)
+        rng = np.random.default_rng(3)
+        fuzz = rng.choice(2**29, size=5000, replace=False).astype(np.uint32)
+        can_ids = np.insert(fuzz, np.arange(0, 5000, 50), 0x100)
+        ts_ns = 10**18 + np.arange(len(can_ids), dtype=np.int64) * 100_000
+        for a in range(0, len(can_ids), 64):
+            track_batch(table, can_ids[a:a + 64], ts_ns[a:a + 64], "scalar", "can0")
+        stats = table.stats()
+        assert stats["tracked"] <= 32 and stats["protected"] == 1
+        assert table.floods == 1 and table.flooding
+        assert table.lookup(("can0", 0x100)).update_count == 99
+
+    def test_bank_reuses_evicted_slots_and_refuses_overfull_batches(self):
+        bank = DriftTrackerBank(capacity=4, table=TrackerTable(capacity=4, idle_s=None, protected=[],
+                                                               pin_batches=True))
+        ts = 10**18 + np.arange(2, dtype=np.int64) * 10_000_000
+        bank.update_batch_from_can_socket_ns(bank.slots_for(np.array([1, 1]), now=0.0), ts)
+        for can_id in range(2, 8):
+            bank.slots_for(np.array([can_id]), now=0.0)
+        assert len(bank) == 4 and bank.capacity == 4 and 1 not in bank
+        # A reused slot starts from scratch
+        assert bank.update_count[bank.slots[7]] == 0
+        # Five new IDs in one batch: the table cannot evict this batch's own slots
+        slots = bank.slots_for(np.arange(10, 15), now=1.0)
+        assert (slots == -1).sum() == 1 and bank.table.refused == 1
+        residuals, _, counts = bank.update_batch_from_can_socket_ns(slots, ts[0] + np.arange(5))
+        assert counts[slots == -1].tolist() == [0] and residuals[slots == -1].tolist() == [0.0]
+
+
+class TestOverloadController:
+    def test_hysteresis_and_hold_time(self):
+        from overload import OverloadController
+        ctl = OverloadController(enter_lag=100, exit_lag=10, hold_s=1.0)
+        assert not ctl.update(99, now=0.0)
+        assert ctl.update(100, now=0.1)
+        assert ctl.update(50, now=0.5) and ctl.update(5, now=0.9)    # held
+        assert not ctl.update(5, now=1.2)
+        assert ctl.stats()["episodes"] == 1 and ctl.max_lag == 100
+
+    def test_backlog_is_age_times_arrival_rate(self):
+        from overload import BacklogEstimator
+        est = BacklogEstimator()
+        ts = np.arange(20, dtype=np.int64) * 1000         # one frame per µs
+        assert est.update(ts[:10], now_ns=9000) == 0        # no rate yet
+        # Oldest frame of the batch is 1 ms + 9 µs old: ~1009 frames arrived since
+        assert est.update(ts[10:], now_ns=1_019_000) == 1009
+        assert est.update(ts[:0]) == 0
+
+    @pytest.mark.parametrize("engine", ["scalar", "bank"])
+    def test_degraded_mode_samples_only_non_critical_ids(self, engine, capsys):
+        from frame_ring import RingBatch
+        from live_sentinel import _Monitor
+        monitor = _Monitor(engine, None, False)
+        ctl = monitor.overload
+        ctl.enter_lag, ctl.exit_lag, ctl.hold_s, ctl.sample_every = 100, 10, 0.0, 8
+
+        can_ids = np.tile(np.array([0x100, 0x200], dtype=np.uint32), 200)
+        ts_ns = 10**18 + np.arange(400, dtype=np.int64) * 5_000_000 + np.tile([0, 1_000_000], 200)
+        zeros = np.zeros(len(can_ids), dtype=np.uint8)
+
+        def feed(a, b):
+            n = b - a
+            monitor.process("can0", RingBatch(can_ids[a:b], ts_ns[a:b], zeros[:n],
+                                              zeros[:n].astype(np.uint16), np.zeros(n, dtype=np.uint32)))
+
+        def count(can_id):
+            key = ("can0", can_id)
+            if engine == "bank":
+                return int(monitor.trackers.update_count[monitor.trackers.slots[key]])
+            return monitor.trackers.lookup(key).update_count
+
+        feed(0, 64)
+        ctl.update(1000)
+        for a in range(64, 320, 64):
+            feed(a, a + 64)
+        # 128 frames per ID while degraded: 0x100 tracked in full, 0x200 keeps
+        # 16 pairs and scores their second frame (the first pair follows a tracked frame)
+        assert count(0x100) == 159 and count(0x200) == 31 + 17
+        assert ctl.skipped_frames == 128 - 32
+        ctl.update(0)
+        feed(320, 400)
+        # First frame after the skipped ones re-anchors, the rest are scored again
+        assert count(0x200) == 31 + 17 + 39
+        assert monitor.alerts.anomalies == 0
+        capsys.readouterr()
+
+
+class TestLatencyHistogram:
+    def test_buckets_are_monotonic_and_vectorized(self):
+        from latency import _bucket, _buckets, _upper_bound
+        values = np.unique(np.r_[np.arange(4096), np.geomspace(4096, 2**39, 5000).astype(np.int64)])
+        scalar = np.array([_bucket(int(v)) for v in values])
+        assert np.array_equal(scalar, _buckets(values))
+        assert np.all(np.diff(scalar) >= 0)
+        # Every value is within its bucket, and buckets are at most 1/64 wide
+        upper = np.array([_upper_bound(int(b)) for b in scalar])
+        assert np.all(upper >= values) and np.all(upper - values <= values / 64 + 1)
+
+    def test_percentiles_match_numpy(self):
+        from latency import LatencyHistogram
+        rng = np.random.default_rng(2)
+        values = rng.lognormal(mean=11, sigma=1.2, size=200_000).astype(np.int64)
+        hist = LatencyHistogram()
+        hist.record_many(values[:100_000])
+        for v in values[100_000:100_100].tolist():
+            hist.record(v)
+        hist.record(int(values[100_100]), count=len(values) - 100_101 + 1)
+        assert hist.total == len(values)
+        sample = np.r_[values[:100_100], np.full(len(values) - 100_100, values[100_100])]
+        for q in (50, 99, 99.9):
+            assert hist.percentile(q) == pytest.approx(np.percentile(sample, q), rel=0.02)
+
+    def test_monitor_records_every_stage(self, capsys):
+        import time
+        from frame_ring import RingBatch
+        from latency import LatencyStats
+        from live_sentinel import _Monitor
+        monitor = _Monitor("scalar", None, False, latency=LatencyStats())
+        n = 32
+        ts_ns = time.time_ns() - 2_000_000 + np.arange(n, dtype=np.int64) * 1000
+        monitor.process("can0", RingBatch(np.full(n, 0x100, dtype=np.uint32), ts_ns,
+                                          np.ones(n, dtype=np.uint8), np.zeros(n, dtype=np.uint16),
+                                          np.zeros(n, dtype=np.uint32)))
+        capsys.readouterr()
+        summary = monitor.latency.summary()
+        assert all(summary[stage]["count"] == n for stage in LatencyStats.STAGES)
+        assert 1900 < summary["receive"]["p50_us"] <= summary["verdict"]["p50_us"] < 10**6
+        assert 0 < summary["track"]["p99_us"] <= summary["track"]["max_us"]
+
+
+class TestMetricsEndpoint:
+    def test_scrape_reports_monitor_state(self, capsys):
+        import time
+        import urllib.error
+        import urllib.request
+        from frame_ring import RingBatch
+        from latency import LatencyStats
+        from live_sentinel import _Monitor
+        from metrics import FrameCounters, MetricsServer, render_metrics
+
+        monitor = _Monitor("scalar", None, False, latency=LatencyStats())
+        monitor.counters = FrameCounters()
+        ring = FrameRing(16)
+        can_ids = np.array([0x100, 0x200, 0x100, 0x18DAF110], dtype=np.uint32)
+        ts_ns = time.time_ns() - 1_000_000 + np.arange(4, dtype=np.int64) * 10_000
+        monitor.process("can0", RingBatch(can_ids, ts_ns, np.ones(4, dtype=np.uint8),
+                                          np.zeros(4, dtype=np.uint16), np.zeros(4, dtype=np.uint32)))
+        capsys.readouterr()
+
+        server = MetricsServer(lambda: render_metrics(monitor, ring=ring), host="127.0.0.1", port=0).start()
+        try:
+            url = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(url + "/metrics", timeout=5) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                body = response.read().decode()
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/other", timeout=5)
+        finally:
+            server.stop()
+
+        lines = body.splitlines()
+        assert 'sentinel_frames_total{bus="can0",can_id="0x100"} 2' in lines
+        assert 'sentinel_frames_total{bus="can0",can_id="extended"} 1' in lines
+        assert 'sentinel_bus_frames_total{bus="can0"} 4' in lines
+        assert 'sentinel_trackers{kind="protected"} 2' in lines
+        assert 'sentinel_stage_latency_seconds_bucket{stage="receive",le="+Inf"} 4' in lines
+        assert 'sentinel_stage_latency_seconds_bucket{stage="receive",le="0.0005"} 0' in lines
+        assert 'sentinel_ring_lag 0' in lines and "sentinel_degraded 0" in lines
+        assert "# TYPE sentinel_anomalies_total counter" in lines
+
+
+class TestQueuedLogging:
+    def test_stalled_writer_never_blocks_logging(self, monkeypatch):
+        import logging
+        import threading
+        import time
+        import logger as sentinel_logger
+        log = sentinel_logger.get_logger("tests.burst")
+        listener = sentinel_logger._listener
+        gate = threading.Event()
+
+        class Stall(logging.Handler):
+            def emit(self, record):
+                gate.wait(5.0)
+
+        # Only the stalling sink: the burst must not reach the console or LOG_FILE
+        monkeypatch.setattr(listener, "handlers", (Stall(),))
+        monkeypatch.setattr(log, "propagate", False)
+        before = sentinel_logger.log_stats()["dropped"]
+        start = time.perf_counter()
+        for i in range(sentinel_logger._queue.maxsize + 500):
+            log.warning("burst %d", i)
+        elapsed = time.perf_counter() - start
+        dropped = sentinel_logger.log_stats()["dropped"] - before
+        gate.set()
+        sentinel_logger.flush_logs(5.0)
+
+        # The writer holds one record; the queue the rest, up to its bound
+        assert 490 <= dropped <= 500 and elapsed < 2.0
+        assert sentinel_logger.log_stats()["queued"] == 0
+
+
+class TestShardedDetection:
+    def _traffic(self, seed=5, n_ids=12, rounds=150):
+        rng = np.random.default_rng(seed)
+        can_ids = np.tile(np.arange(0x100, 0x100 + n_ids, dtype=np.uint32), rounds)
+        ts_ns = 10**18 + np.cumsum(rng.integers(800_000, 850_000, size=len(can_ids)))
+        ts_ns[[300, 301, 900]] += 700_000      # injected frames on three IDs
+        dropped = np.zeros(len(can_ids), dtype=np.uint32)
+        dropped[[500, 1200]] = [3, 1]
+        return can_ids, ts_ns, dropped
+
+    def test_split_drops_keeps_every_lost_frame(self):
+        from sharding import _split_drops
+        dropped = np.array([0, 2, 0, 1, 0, 4], dtype=np.uint32)
+        counts, carry = _split_drops(dropped, np.array([2, 3]), carry=5)
+        assert counts.tolist() == [7, 1] and carry == 4
+        counts, carry = _split_drops(dropped, np.array([], dtype=np.intp), carry=1)
+        assert len(counts) == 0 and carry == 8
+
+    def test_shared_ring_crosses_processes(self):
+        import multiprocessing as mp
+        from sharding import SharedFrameRing
+        ring = SharedFrameRing(16)
+        try:
+            child = mp.get_context().Process(
+                target=ring.push, args=(np.arange(5, dtype=np.uint32), np.arange(5) * 10, 0, 2, 1))
+            child.start()
+            child.join(10)
+            assert ring.wait(1.0) and ring.lag == 5
+            batch = ring.pop()
+            assert batch.can_id.tolist() == [0, 1, 2, 3, 4]
+            assert batch.bus.tolist() == [2] * 5 and batch.dropped.tolist() == [1] * 5
+        finally:
+            ring.close()
+
+    @pytest.mark.parametrize("engine", ["scalar", "bank"])
+    def test_sharded_incidents_match_single_process(self, engine, capsys):
+        from frame_ring import RingBatch
+        from live_sentinel import _Monitor
+        from sharding import ShardedDetector
+        can_ids, ts_ns, dropped = self._traffic()
+
+        single = _Monitor(engine, None, False)
+        detector = ShardedDetector(["can0"], workers=3, engine=engine, ring_capacity=64).start()
+        for a in range(0, len(can_ids), 50):
+            b = a + 50
+            single.process("can0", RingBatch(can_ids[a:b], ts_ns[a:b], np.zeros(b - a, dtype=np.uint8),
+                                             np.zeros(b - a, dtype=np.uint16), dropped[a:b]))
+            detector.submit("can0", can_ids[a:b], ts_ns[a:b], dropped[a:b], block=True)
+        detector.close()
+        single.alerts.close_all()
+        capsys.readouterr()
+
+        def incidents(manager):
+            return sorted((i.can_id, i.opened_ns, i.frames) for i in manager.closed)
+        assert detector.alerts.anomalies == single.alerts.anomalies > 0
+        assert incidents(detector.alerts) == incidents(single.alerts)
+        # Every frame was tracked by exactly one worker
+        assert sum(s["consumed"] for s in detector.ring_stats) == len(can_ids)
+        assert all(s["consumed"] > 0 for s in detector.ring_stats)
+
+    def test_blocking_submit_returns_every_event(self, monkeypatch):
+        from sharding import ShardedDetector
+        can_ids, ts_ns, dropped = self._traffic()
+        detector = ShardedDetector(["can0"], workers=2, engine="scalar", ring_capacity=16)
+        emitted = []
+        emit = detector.alerts._emit
+        monkeypatch.setattr(detector.alerts, "_emit", lambda event: emitted.append(event) or emit(event))
+        detector.start()
+        returned = []
+        # Whole-capture submits overflow the 16-frame rings: most merging
+        # happens while the producer waits for room
+        for a in range(0, len(can_ids), 600):
+            returned += detector.submit("can0", can_ids[a:a + 600], ts_ns[a:a + 600],
+                                        dropped[a:a + 600], block=True)
+        returned += detector.close()
+        assert detector.alerts.incidents_opened > 0
+        assert returned == emitted
+
+
+class TestCANFilters:
+    def _rules(self, packed):
+        return [CAN_FILTER.unpack_from(packed, off) for off in range(0, len(packed), CAN_FILTER.size)]
+
+    def test_one_rule_per_monitored_id(self):
+        rules = self._rules(can_filters(MONITORED_ECU_IDS))
+        assert [can_id for can_id, _ in rules] == MONITORED_ECU_IDS
+        for can_id, mask in rules:
+            assert mask & socket.CAN_SFF_MASK == socket.CAN_SFF_MASK
+            assert mask & socket.CAN_EFF_FLAG and mask & socket.CAN_RTR_FLAG
+
+    def test_extended_ids_use_eff_rule(self):
+        (can_id, mask), = self._rules(can_filters([0x18DAF110]))
+        assert can_id == 0x18DAF110 | socket.CAN_EFF_FLAG
+        assert mask & socket.CAN_EFF_MASK == socket.CAN_EFF_MASK
+
+    def test_catch_unknown_appends_match_all_rule(self):
+        rules = self._rules(can_filters([0x100], catch_unknown=True))
+        assert rules[-1] == (0, 0)
+        assert len(self._rules(can_filters([0x100]))) == 1
+
+
+class TestLiveBatchTracking:
+    def test_bank_engine_matches_per_id_engine(self):
+        from detection import track_batch
+        rng = np.random.default_rng(11)
+        can_ids = rng.choice([0x100, 0x101, 0x200], size=400).astype(np.uint32)
+        ts_ns = 10**18 + np.cumsum(rng.integers(3_000_000, 3_100_000, size=400))
+
+        bank = DriftTrackerBank()
+        trackers = TrackerTable()
+        for a, b in ((0, 64), (64, 128), (128, 400)):
+            bank_out = track_batch(bank, can_ids[a:b], ts_ns[a:b], "bank")
+            dict_out = track_batch(trackers, can_ids[a:b], ts_ns[a:b], "scalar")
+            for got, want in zip(bank_out, dict_out):
+                assert np.array_equal(np.asarray(got), np.asarray(want))
+        assert sorted(trackers) == sorted(bank.ids)
+
+    @pytest.mark.parametrize("engine", ["bank", "scalar"])
+    def test_same_id_on_two_buses_tracked_separately(self, engine):
+        from detection import track_batch
+        trackers = DriftTrackerBank() if engine == "bank" else TrackerTable()
+        can_ids = np.full(5, 0x100, dtype=np.uint32)
+        fast = 10**18 + np.arange(5, dtype=np.int64) * 10_000_000
+        slow = 10**18 + np.arange(5, dtype=np.int64) * 20_000_000
+        _, _, counts_a = track_batch(trackers, can_ids, fast, engine, "can0")
+        _, _, counts_b = track_batch(trackers, can_ids, slow, engine, "can1")
+        keys = trackers.ids if engine == "bank" else list(trackers)
+        assert sorted(keys) == [("can0", 0x100), ("can1", 0x100)]
+        assert list(counts_a) == list(counts_b)
+
+    @pytest.mark.parametrize("engine", ["scalar", "bank"])
+    def test_empty_batch_is_a_no_op(self, engine):
+        from frame_ring import RingBatch
+        from live_sentinel import _Monitor
+        monitor = _Monitor(engine, [0x100], True)
+        empty = RingBatch(np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8),
+                          np.zeros(0, dtype=np.uint16), np.zeros(0, dtype=np.uint32))
+        assert monitor.process("can0", empty) == []
+        assert monitor.ts_sources == {}
+
+    @pytest.mark.parametrize("engine", ["scalar", "bank"])
+    def test_clock_change_resyncs_instead_of_scoring(self, engine, monkeypatch):
+        import detection
+        from frame_ring import RingBatch
+        from live_sentinel import _Monitor
+        monkeypatch.setattr(detection, "WARMUP_PACKETS", 0)
+        monitor = _Monitor(engine, None, False, dashboard=Dashboard(stream=io.StringIO()))
+        # Two IDs at 100 Hz; the hardware and software clocks are ~1.7e18 ns apart
+        n = 80
+        can_ids = np.tile(np.array([0x100, 0x200], dtype=np.uint32), n // 2)
+        offsets = np.arange(n, dtype=np.int64) // 2 * 10_000_000 + np.arange(n) % 2 * 3_000_000
+        sources = np.full(n, TS_SOURCE_HARDWARE, dtype=np.uint8)
+        sources[30:50] = TS_SOURCE_SOFTWARE     # fallback mid-batch, then back
+        ts_ns = np.where(sources == TS_SOURCE_HARDWARE, 5 * 10**9, 1_700_000_000 * 10**9) + offsets
+        seen = []
+        record = monitor.dashboard.record
+        monkeypatch.setattr(monitor.dashboard, "record", lambda bus, ids, res, drift, states:
+                            seen.append(states.copy()) or record(bus, ids, res, drift, states))
+        for a in (0, 40):
+            monitor.process("can0", RingBatch(can_ids[a:a + 40], ts_ns[a:a + 40], sources[a:a + 40],
+                                              np.zeros(40, dtype=np.uint16), np.zeros(40, dtype=np.uint32)))
+        states = np.concatenate(seen)
+        assert not (states == STATE_ANOMALY).any()
+        # The first frame of each ID after every switch is only re-anchored
+        assert np.flatnonzero(states == STATE_RESYNC).tolist() == [30, 31, 50, 51]
+        assert monitor.ts_sources["can0"] == TS_SOURCE_HARDWARE
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SentinelGenerator unit tests
 # ─────────────────────────────────────────────────────────────────────────────
@@ -176,7 +1446,7 @@ class TestDetectionCapability:
 
     def _mean_residual_us(self, intervals: np.ndarray) -> float:
         dt = DriftTracker()
-        residuals, _ = dt.process_stream(intervals)
+        residuals, _ = dt.process_stream(intervals, steady_state=True)
         # Exclude warmup
         post_warmup = np.abs(residuals[WARMUP_PACKETS:])
         return float(np.mean(post_warmup) * 1e6)
@@ -228,3 +1498,106 @@ class TestDetectionCapability:
 
         snr = mean_smart / mean_ecu if mean_ecu > 0 else float("inf")
         assert snr > 1.0, f"SNR {snr:.2f} is below 1.0 – detection not viable"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# AutomotiveCANGenerator unit tests
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestAutomotiveCANGenerator:
+    def test_ar1_filter_matches_recursion(self):
+        from dataset_generator import _ar1_filter
+        noise = np.random.default_rng(4).normal(size=1000) * 1e-5
+        expected, x = [], 2e-5
+        for e in noise.tolist():
+            x = 0.85 * x + e
+            expected.append(x)
+        assert np.allclose(_ar1_filter(noise, 0.85, x0=2e-5), expected, rtol=1e-10, atol=1e-20)
+
+    def test_ecu_traffic_timing_and_labels(self):
+        from dataset_generator import AutomotiveCANGenerator
+        np.random.seed(0)
+        gen = AutomotiveCANGenerator(duration_seconds=30)
+        steering = gen.ecus[0]
+        batch = gen._generate_ecu_traffic(steering, attack_window=(10, 20))
+        ts = batch.timestamp
+        intervals = np.diff(ts)
+        # The last message is sent while the previous one was before the end
+        assert ts[-2] < 30 <= ts[-1]
+        assert abs(len(ts) - 30 / steering["interval"]) < 10
+        assert abs(intervals.mean() - steering["interval"]) < 1e-5
+        assert intervals.std() < 1e-4
+        attack = batch.label == ATTACK
+        assert ts[attack].min() > 10 and ts[attack].max() <= 20 + 2 * steering["interval"]
+
+    def test_dataset_is_columnar_and_time_ordered(self):
+        from dataset_generator import AutomotiveCANGenerator
+        np.random.seed(1)
+        gen = AutomotiveCANGenerator(duration_seconds=10)
+        batch = gen.generate_batch({"type": "injection", "target_id": 0x100, "start_time": 2, "end_time": 4})
+        assert np.all(np.diff(batch.timestamp) >= 0)
+        assert batch.data.dtype == PAYLOAD_DTYPE and batch.can_id.dtype == np.uint32
+        injected = batch.ecu == ECU_NAMES.index("ATTACKER")
+        # 10 ms steps from 2 s while before 4 s; the accumulated float may land just short of 4 s
+        assert injected.sum() in (200, 201)
+        assert np.all(batch.data[injected] == b"DEADBEEF") and np.all(batch.label[injected] == ATTACK)
+
+        # The CSV round trip keeps every column, codes included
+        df = to_frame(batch)
+        assert list(df["label"].cat.categories) == list(LABELS)
+        buf = io.StringIO()
+        df.to_csv(buf, index=False)
+        buf.seek(0)
+        back = from_frame(pd.read_csv(buf, dtype={"data": str}))
+        for name in ("can_id", "dlc", "data", "ecu", "label"):
+            assert np.array_equal(getattr(back, name), getattr(batch, name))
+        assert np.allclose(back.timestamp, batch.timestamp)
+
+    def test_merge_and_chunked_write(self, tmp_path):
+        from dataset_generator import AutomotiveCANGenerator
+        np.random.seed(2)
+        gen = AutomotiveCANGenerator(duration_seconds=20)
+        streams = gen._streams({"type": "fuzzing", "target_id": 0x666, "start_time": 5, "end_time": 7})
+        merged = merge_batches(streams)
+        assert np.all(np.diff(merged.timestamp) >= 0)
+        assert len(merged.timestamp) == sum(len(s.timestamp) for s in streams)
+
+        # Written in slices of uneven size, read back whole
+        with BatchWriter(tmp_path / "merged.csv", chunk_rows=1000) as writer:
+            for i in range(0, len(merged.timestamp), 2500):
+                writer.write(take(merged, slice(i, i + 2500)))
+        assert writer.rows == len(merged.timestamp)
+        back = read_csv(tmp_path / "merged.csv")
+        assert np.array_equal(back.can_id, merged.can_id) and np.array_equal(back.data, merged.data)
+        assert np.allclose(back.timestamp, merged.timestamp)
+
+    def test_chunked_generation_carries_state(self, tmp_path):
+        from dataset_generator import AutomotiveCANGenerator
+        np.random.seed(3)
+        gen = AutomotiveCANGenerator(duration_seconds=30)
+        # The attack window spans the chunk boundaries at 10 s and 20 s
+        scenario = {"type": "injection", "target_id": 0x100, "start_time": 8, "end_time": 21}
+        chunks = list(gen.iter_chunks(scenario, chunk_s=10))
+        for k, chunk in enumerate(chunks[:3]):
+            assert chunk.timestamp.min() >= 10 * k and chunk.timestamp.max() < 10 * (k + 1)
+        timestamps = np.concatenate([chunk.timestamp for chunk in chunks])
+        assert np.all(np.diff(timestamps) >= 0)
+
+        batch = merge_batches(chunks)
+        steering = (batch.can_id == 0x100) & (batch.ecu == ECU_NAMES.index("Steering_Angle"))
+        # No gap or double send where the chunks join: the O-U and thermal state carried over
+        intervals = np.diff(batch.timestamp[steering])
+        assert abs(intervals - 0.010).max() < 2e-4
+        assert abs(steering.sum() - 3000) < 5
+        injected = batch.ecu == ECU_NAMES.index("ATTACKER")
+        assert abs(injected.sum() - 1300) <= 1
+        assert np.all(np.diff(batch.timestamp[injected]) > 0.0099)
+        labelled = batch.timestamp[steering & (batch.label == ATTACK)]
+        assert 8 < labelled.min() < 8.02 and 21 < labelled.max() < 21.02
+
+        rows = gen.write_dataset(tmp_path / "chunked.csv", scenario, chunk_s=10)
+        assert rows == len(read_csv(tmp_path / "chunked.csv").timestamp) > 0
+
+    def test_hex_payloads(self):
+        assert hex_payloads([0, 0x32 << 24, 0xDEADBEEF, -90]).tolist() == [
+            b"00000000", b"32000000", b"DEADBEEF", b"FFFFFFA6"]
@@ -0,0 +1,161 @@
+"""
+Sentinel-T Tracker Table
+Bounds the number of per-ID trackers. Every new CAN ID used to get a
+tracker that was never freed, so an ID fuzzer (up to 2**29 extended IDs)
+could exhaust memory. The table keeps known ECUs in protected entries and
+every other ID in an LRU: idle entries are freed, and at capacity the least
+recently seen one makes room. A burst of new unknown IDs raises an
+ID-flood alert.
+"""
+
+from collections import OrderedDict
+
+from config import (
+    ID_FLOOD_THRESHOLD,
+    ID_FLOOD_WINDOW_S,
+    MONITORED_ECU_IDS,
+    TRACKER_CAPACITY,
+    TRACKER_IDLE_S,
+)
+from logger import get_logger
+
+log = get_logger(__name__)
+
+
+def _can_id(key):
+    """Keys are CAN IDs or (bus, CAN ID) pairs."""
+    return key[1] if isinstance(key, tuple) else key
+
+
+class TrackerTable:
+    """
+    Key -> value map (a tracker, or a DriftTrackerBank slot) with bounded
+    size. Times are in seconds on the caller's clock (frame timestamps), so
+    replayed captures age entries exactly like live traffic.
+
+    Keys whose CAN ID is in `protected` are never evicted and do not count
+    against `capacity`. Other keys live in an LRU of at most `capacity`
+    entries; admit() first frees the ones idle for more than idle_s, then,
+    if still full, the least recently seen one. With pin_batches, entries
+    touched since the last begin_batch() are never evicted (a bank assigns
+    all slots of a batch before updating them); if only such entries are
+    left, the new key is refused and goes untracked.
+
+    More than flood_threshold new unprotected keys within flood_window_s
+    starts an ID flood: logged once, counted in `floods`, and `flooding`
+    stays set until a window passes below the threshold.
+    """
+    def __init__(self, capacity=TRACKER_CAPACITY, idle_s=TRACKER_IDLE_S, protected=MONITORED_ECU_IDS,
+                 flood_threshold=ID_FLOOD_THRESHOLD, flood_window_s=ID_FLOOD_WINDOW_S,
+                 pin_batches=False):
+        self.capacity = max(1, capacity)
+        self.idle_s = idle_s
+        self.protected_ids = frozenset(protected or ())
+        self.flood_threshold = flood_threshold
+        self.flood_window_s = flood_window_s
+        self.pin_batches = pin_batches
+        self.protected = {}             # key -> value, never evicted
+        self.lru = OrderedDict()        # key -> [value, last_seen, batch], oldest first
+        self.batch = 0
+        self.created = 0                # unprotected entries ever admitted
+        self.evicted = 0
+        self.refused = 0                # keys that could not get an entry
+        self.floods = 0
+        self.flooding = False
+        self._window_start = None
+        self._window_new = 0
+
+    def __len__(self):
+        return len(self.protected) + len(self.lru)
+
+    def __contains__(self, key):
+        return key in self.protected or key in self.lru
+
+    def __iter__(self):
+        yield from self.protected
+        yield from self.lru
+
+    def begin_batch(self):
+        self.batch += 1
+
+    def lookup(self, key, now=None):
+        """The value for key (None if absent), marking it as just seen."""
+        value = self.protected.get(key)
+        if value is not None:
+            return value
+        entry = self.lru.get(key)
+        if entry is None:
+            return None
+        self.lru.move_to_end(key)
+        if now is not None:
+            entry[1] = now
+        entry[2] = self.batch
+        return entry[0]
+
+    def admit(self, key, now=None):
+        """
+        Make room for a new key. Returns the (key, value) pairs evicted to
+        do so, or None if the key is refused; follow with put().
+        """
+        if _can_id(key) in self.protected_ids:
+            return []
+        self._note_new(now)
+        evicted = self.evict_idle(now)
+        if len(self.lru) >= self.capacity:
+            oldest = next(iter(self.lru))
+            if self.pin_batches and self.lru[oldest][2] == self.batch:
+                self.refused += 1
+                return None
+            evicted.append(self._evict(oldest))
+        self.created += 1
+        return evicted
+
+    def put(self, key, value, now=None):
+        if _can_id(key) in self.protected_ids:
+            self.protected[key] = value
+        else:
+            self.lru[key] = [value, now, self.batch]
+
+    def evict_idle(self, now):
+        """Free unprotected entries not seen for idle_s; returns the (key, value) pairs."""
+        evicted = []
+        if now is None or self.idle_s is None:
+            return evicted
+        horizon = now - self.idle_s
+        while self.lru:
+            oldest, (_, last_seen, batch) = next(iter(self.lru.items()))
+            if last_seen is None or last_seen >= horizon or (self.pin_batches and batch == self.batch):
+                break
+            evicted.append(self._evict(oldest))
+        return evicted
+
+    def _evict(self, key):
+        self.evicted += 1
+        return key, self.lru.pop(key)[0]
+
+    def _note_new(self, now):
+        if now is None:
+            return
+        if self._window_start is None or now - self._window_start >= self.flood_window_s:
+            if self.flooding and self._window_new <= self.flood_threshold:
+                self.flooding = False
+                log.warning("ID flood over: %d unknown-ID trackers evicted so far", self.evicted)
+            self._window_start, self._window_new = now, 0
+        self._window_new += 1
+        if self._window_new > self.flood_threshold and not self.flooding:
+            self.flooding = True
+            self.floods += 1
+            log.warning("UNKNOWN-ID FLOOD: more than %d new CAN IDs within %.1f s "
+                        "(tracker table %d/%d, %d evicted)", self.flood_threshold,
+                        self.flood_window_s, len(self.lru), self.capacity, self.evicted)
+
+    def stats(self):
+        return {
+            "protected": len(self.protected),
+            "tracked": len(self.lru),
+            "capacity": self.capacity,
+            "created": self.created,
+            "evicted": self.evicted,
+            "refused": self.refused,
+            "floods": self.floods,
+        }